@@ -2,13 +2,18 @@ import streamlit as st
 import pandas as pd
 import os
 import io
+import json
 import sys
 from contextlib import contextmanager
 
 # Import the core functions from your existing script
 # This assumes 'json_to_snowflake.py' and 'config.py' are in the same directory
 try:
-    from Json_Parser.json_to_snowflake import list_files_in_stage, process_json_from_stage_to_snowflake
+    from Json_Parser.json_to_snowflake import (
+        list_files_in_stage, process_json_from_stage_to_snowflake,
+        process_stage_files_to_snowflake, process_json_pushdown_to_snowflake,
+        process_json_streaming_to_snowflake
+    )
     # from config import SNOWFLAKE_CONFIG
 except ImportError as e:
     st.error(f"""
@@ -44,7 +49,7 @@ class JsonToSnowflakeApp:
     def __init__(self):
         self.STATE_KEYS = [
             'files_in_stage', 'selected_file', 'process_logs',
-            'final_results', 'error_message'
+            'final_results', 'error_message', 'batch_label'
         ]
 
         self.init_session_state()
@@ -100,27 +105,67 @@ class JsonToSnowflakeApp:
                     files = list_files_in_stage(stage_name, config)
                     st.session_state.files_in_stage = [os.path.basename(f) for f in files]
                     if not st.session_state.files_in_stage:
-                        st.warning(f"No JSON files (.json, .jsonl, .ndjson) found in stage `{stage_name}`.")
+                        st.warning(f"No JSON files (.json, .jsonl, .ndjson, optionally .gz/.bz2/.zst compressed) found in stage `{stage_name}`.")
             except Exception as e:
                 st.session_state.error_message = f"Failed to list files: {e}"
 
 
-    def process_file(self, stage_name, selected_file, append_log,config:dict):
+    def process_file(self, stage_name, selected_file, append_log,config:dict, incremental=False, pushdown=False, json_schema=None, dedup=False, streaming=False):
         st.session_state.process_logs = ""
         st.session_state.final_results = None
         st.session_state.error_message = ""
+        st.session_state.batch_label = None
         try:
             with st.spinner("Processing file... This may take a moment. See logs below for progress."):
                 with st_capture(append_log):
-                    results = process_json_from_stage_to_snowflake(
+                    if pushdown:
+                        results = process_json_pushdown_to_snowflake(
+                            stage_name=stage_name,
+                            file_path_in_stage=selected_file,
+                            config=config
+                        )
+                    elif streaming:
+                        results = process_json_streaming_to_snowflake(
+                            stage_name=stage_name,
+                            file_path_in_stage=selected_file,
+                            config=config,
+                            dedup=dedup
+                        )
+                    else:
+                        results = process_json_from_stage_to_snowflake(
+                            stage_name=stage_name,
+                            file_path_in_stage=selected_file, 
+                            config=config,
+                            incremental=incremental,
+                            json_schema=json_schema,
+                            dedup=dedup
+                        )
+                    st.session_state.final_results = results
+        except Exception as e:
+            append_log(f"\n--- FATAL ERROR ---\n{e}")
+            st.session_state.error_message = f"An error occurred during processing: {e}"
+
+    def process_batch(self, stage_name, pattern, root_name, append_log, config:dict, incremental=False, json_schema=None, dedup=False):
+        st.session_state.process_logs = ""
+        st.session_state.final_results = None
+        st.session_state.error_message = ""
+        st.session_state.batch_label = f"all files matching '{pattern or '*'}'"
+        try:
+            with st.spinner("Processing files in batch... See logs below for progress."):
+                with st_capture(append_log):
+                    results = process_stage_files_to_snowflake(
                         stage_name=stage_name,
-                        file_path_in_stage=selected_file, 
-                        config=config  
+                        config=config,
+                        pattern=pattern or None,
+                        root_name=root_name or None,
+                        incremental=incremental,
+                        json_schema=json_schema,
+                        dedup=dedup,
                     )
                     st.session_state.final_results = results
         except Exception as e:
             append_log(f"\n--- FATAL ERROR ---\n{e}")
-            st.session_state.error_message = f"An error occurred during processing: {e}"
+            st.session_state.error_message = f"An error occurred during batch processing: {e}"
 
 
     def show_results(self):
@@ -128,7 +173,8 @@ class JsonToSnowflakeApp:
             st.error(st.session_state.error_message)
 
         if st.session_state.final_results is not None:
-            st.success(f"Successfully processed **{st.session_state.selected_file}**!")
+            processed = st.session_state.batch_label or st.session_state.selected_file
+            st.success(f"Successfully processed **{processed}**!")
             st.subheader("Process Summary")
 
             if not st.session_state.final_results:
@@ -176,9 +222,44 @@ class JsonToSnowflakeApp:
                 index=0
             )
 
+            incremental = st.checkbox(
+                "Incremental mode (append, skip files already loaded)",
+                help="Appends to existing tables instead of replacing them. Loaded files are recorded with their md5 and size in JSON_LOAD_MANIFEST and skipped on later runs."
+            )
+            schema_file = st.file_uploader(
+                "Optional JSON Schema for this feed", type=["json"],
+                help="With a schema of one record, tables and column types come from the schema (stable DDL, no type inference). Unexpected keys go to an _OVERFLOW VARIANT column."
+            )
+            dedup = st.checkbox(
+                "Deduplicate repeated nested objects",
+                help="Identical nested objects (e.g. the same address) are stored once; the parent row references them through a <CHILD>_ID column. Not available with a JSON Schema."
+            )
+            json_schema = None
+            if schema_file is not None:
+                try:
+                    json_schema = json.loads(schema_file.getvalue().decode("utf-8"))
+                except ValueError as e:
+                    st.error(f"Invalid JSON Schema file: {e}")
+
             if st.session_state.selected_file and st.session_state.selected_file != "-- Select a file --":
                 st.subheader("Step 2: Start the Process")
                 st.info(f"Ready to process: **{st.session_state.selected_file}**")
+                engine = st.radio(
+                    "Normalization engine",
+                    ("Client-side (Python)", "Client-side streaming (large files)", "Server-side pushdown (Snowflake)"),
+                    horizontal=True,
+                    help="Streaming infers the tables from the first records and loads in batches while parsing, widening column types when later records need it. "
+                         "Pushdown samples the file to discover the tables, then normalizes it inside Snowflake with LATERAL FLATTEN. Both always replace the tables."
+                )
+                # Streaming only deduplicates; pushdown takes none of the options above
+                ignored = [option for option, chosen, supported in (
+                    ("incremental mode", incremental, engine.startswith("Client-side (Python)")),
+                    ("a JSON Schema", json_schema is not None, engine.startswith("Client-side (Python)")),
+                    ("deduplication", dedup, not engine.startswith("Server-side")),
+                ) if chosen and not supported]
+                if ignored:
+                    st.warning(f"The {engine} engine does not support {', '.join(ignored)}; "
+                               f"it will ignore {'them' if len(ignored) > 1 else 'it'} and replace the tables.")
 
                 if st.button(f"Normalize and Load '{st.session_state.selected_file}'", type="primary"):
                     log_container = st.expander("Live Process Log", expanded=True)
@@ -188,7 +269,23 @@ class JsonToSnowflakeApp:
                         st.session_state.process_logs += log_text
                         log_placeholder.code(st.session_state.process_logs, language='log')
 
-                    self.process_file(stage_name, st.session_state.selected_file, append_log, config)
+                    self.process_file(stage_name, st.session_state.selected_file, append_log, config, incremental,
+                                      pushdown=engine.startswith("Server-side"), json_schema=json_schema, dedup=dedup,
+                                      streaming=engine.startswith("Client-side streaming"))
+
+            st.subheader("Batch Mode: Process Many Files")
+            st.caption("Normalizes every matching file in parallel and loads each table once, with IDs continuing across files.")
+            batch_pattern = st.text_input("File name pattern", value="*.json", help="Glob applied to file names, e.g. 'orders_*.json'")
+            batch_root = st.text_input("Root table name", value=stage_name.lstrip('@').split('.')[-1])
+            if st.button("Normalize and Load All Matching Files"):
+                log_container = st.expander("Live Process Log", expanded=True)
+                log_placeholder = log_container.empty()
+
+                def append_batch_log(log_text):
+                    st.session_state.process_logs += log_text
+                    log_placeholder.code(st.session_state.process_logs, language='log')
+
+                self.process_batch(stage_name, batch_pattern, batch_root, append_batch_log, config, incremental, json_schema, dedup)
 
         self.show_results()
         self.start_over_button()
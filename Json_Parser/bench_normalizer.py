@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+bench_normalizer.py
+
+Micro-benchmark for the Normalizer hot path on a deeply nested synthetic corpus.
+Prints records per second, so runs before and after a change can be compared.
+
+Usage:
+  python -m Json_Parser.bench_normalizer --records 2000 --depth 12 --fanout 3
+  python -m Json_Parser.bench_normalizer --baseline # also time the original recursive Normalizer, loaded from git
+  python -m Json_Parser.bench_normalizer --schema   # also time the SchemaNormalizer fast path
+  python -m Json_Parser.bench_normalizer --decoders # parse + normalize from files with each JSON decoder
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+import types
+
+from Json_Parser.json_to_snowflake import (
+    JSON_DECODERS, Normalizer, SchemaNormalizer, infer_json_schema, iter_json_records,
+)
+
+
+BASELINE_REV = "e95f3c6^"  # the last commit with the recursive Normalizer
+
+
+def load_baseline(rev: str = BASELINE_REV) -> types.ModuleType:
+    """
+    json_to_snowflake.py as of `rev`, read with `git show` and executed as a throwaway module,
+    so --baseline times the original code rather than a copy of it.
+    """
+    path = "Json_Parser/json_to_snowflake.py"
+    source = subprocess.run(["git", "show", f"{rev}:{path}"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    module = types.ModuleType(f"json_to_snowflake_{re.sub(r'[^0-9a-zA-Z_]', '_', rev)}")
+    exec(compile(source, f"{rev}:{path}", "exec"), module.__dict__)
+    return module
+
+
+def make_record(i: int, depth: int, fanout: int) -> dict:
+    """One record nested `depth` levels deep, with a small array of objects per level."""
+    node = {"id": i, "name": f"leaf-{i}", "active": i % 2 == 0, "score": i * 0.5, "created-at": "2024-01-01"}
+    for level in range(depth):
+        node = {
+            "level": level,
+            "tag": f"l{level}",
+            "child": node,
+            "items": [{"k": j, "v": f"x{j}", "tags": ["a", "b"]} for j in range(fanout)],
+        }
+    return node
+
+
+def make_corpus(records: int, depth: int, fanout: int) -> list:
+    return [make_record(i, depth, fanout) for i in range(records)]
+
+
+def bench(records: list, repeat: int, make_normalizer=lambda: Normalizer(root_name="BENCH")) -> float:
+    """Best-of-`repeat` throughput in records per second."""
+    best = float('inf')
+    for _ in range(repeat):
+        norm = make_normalizer()
+        start = time.perf_counter()
+        norm.process(records)
+        best = min(best, time.perf_counter() - start)
+    return len(records) / best
+
+
+def bench_file(path: str, decoder: str, records: int, repeat: int, normalize: bool = True) -> float:
+    """Best-of-`repeat` throughput of reading `path` with `decoder` (and normalizing it)."""
+    best = float('inf')
+    for _ in range(repeat):
+        norm = Normalizer(root_name="BENCH")
+        start = time.perf_counter()
+        if normalize:
+            norm.process(iter_json_records(path, decoder))
+        else:
+            for _ in iter_json_records(path, decoder):
+                pass
+        best = min(best, time.perf_counter() - start)
+    return records / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--depth", type=int, default=12)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", action="store_true", help="Also benchmark the Normalizer of --baseline-rev")
+    parser.add_argument("--baseline-rev", default=BASELINE_REV, help=f"git revision of the baseline (default: {BASELINE_REV})")
+    parser.add_argument("--schema", action="store_true", help="Also benchmark SchemaNormalizer with a schema inferred from the corpus")
+    parser.add_argument("--decoders", action="store_true", help="Also benchmark file parsing + normalizing with each installed JSON decoder")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.records, args.depth, args.fanout)
+    rps = bench(corpus, args.repeat)
+    print(f"records={args.records} depth={args.depth} fanout={args.fanout}: {rps:,.0f} records/s")
+    if args.baseline:
+        baseline_module = load_baseline(args.baseline_rev)
+        try:
+            baseline = bench(corpus, args.repeat, lambda: baseline_module.Normalizer(root_name="BENCH"))
+            print(f"  baseline Normalizer ({args.baseline_rev}): {baseline:,.0f} records/s ({rps / baseline:.2f}x)")
+        except RecursionError:
+            print(f"  baseline Normalizer ({args.baseline_rev}): RecursionError at this depth")
+    if args.schema:
+        schema = infer_json_schema(corpus)
+        rps = bench(corpus, args.repeat, lambda: SchemaNormalizer(schema, root_name="BENCH"))
+        print(f"  with JSON Schema plan: {rps:,.0f} records/s")
+    if args.decoders:
+        with tempfile.TemporaryDirectory() as tmp:
+            files = {"array": os.path.join(tmp, "bench.json"), "ndjson": os.path.join(tmp, "bench.jsonl")}
+            with open(files["array"], "w") as f:
+                json.dump(corpus, f)
+            with open(files["ndjson"], "w") as f:
+                f.writelines(json.dumps(r) + "\n" for r in corpus)
+            for shape, path in files.items():
+                for decoder in JSON_DECODERS:
+                    parse = bench_file(path, decoder, len(corpus), args.repeat, normalize=False)
+                    rps = bench_file(path, decoder, len(corpus), args.repeat)
+                    print(f"  {shape:<6} file, {decoder:<8} decoder: parse {parse:,.0f} records/s, "
+                          f"parse + normalize {rps:,.0f} records/s")
+
+
+if __name__ == "__main__":
+    main()
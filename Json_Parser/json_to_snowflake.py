@@ -5,28 +5,51 @@ json_to_snowflake.py
 Parses a JSON file from a Snowflake internal stage, normalizes it into a
 relational schema, and creates/loads corresponding tables in Snowflake.
 
-Main entry point:
+Main entry points:
   process_json_from_stage_to_snowflake(conn_params, database, schema, stage_name, file_path)
+  process_stage_files_to_snowflake(stage_name, config, pattern, root_name)  # batch mode
+  process_json_streaming_to_snowflake(stage_name, file_path, config)  # huge files, loaded in batches
 """
 
+import bz2
+import fnmatch
+import gzip
+import hashlib
+import io
 import json
+import mmap
 import os
 import re
 import tempfile
 from collections import defaultdict
-from typing import Any, Dict, List, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Tuple, Union
 # from config import SNOWFLAKE_CONFIG
 import pandas as pd
 import snowflake.connector
 from snowflake.connector.pandas_tools import write_pandas
 import pathlib
+try:
+    import zstandard  # optional: only needed for .zst inputs
+except ImportError:
+    zstandard = None
+try:
+    import orjson  # optional: faster JSON decoding straight from bytes
+except ImportError:
+    orjson = None
+try:
+    import simdjson  # optional: pysimdjson, used when orjson is not installed
+except ImportError:
+    simdjson = None
 # -----------------------
 # Helpers (mostly unchanged)
 # -----------------------
+# Any run of non-alphanumerics (underscores included) collapses to a single underscore
+_NON_ALNUM_RUN = re.compile(r'[^0-9a-zA-Z]+')
+
 def sanitize_name(name: str) -> str:
     """Make a safe table/column name: uppercase, alnum + underscore"""
-    name = re.sub(r'[^0-9a-zA-Z_]', '_', name)
-    name = re.sub(r'__+', '_', name)
+    name = _NON_ALNUM_RUN.sub('_', name)
     name = name.strip('_').upper() # Use uppercase for Snowflake convention
     if not name:
         return 'COL'
@@ -34,124 +57,450 @@ def sanitize_name(name: str) -> str:
         name = '_' + name
     return name
 
-def load_json_from_local_file(path: str) -> List[Any]:
+JSON_EXTENSIONS = ('.json', '.jsonl', '.ndjson')
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.zst')
+_READ_CHUNK = 1 << 20  # characters of decompressed text read at a time
+
+def is_json_file(name: str) -> bool:
+    """True for .json/.jsonl/.ndjson files, plain or compressed (.gz, .bz2, .zst)."""
+    name = name.lower()
+    if name.endswith(COMPRESSED_EXTENSIONS):
+        name = os.path.splitext(name)[0]
+    return name.endswith(JSON_EXTENSIONS)
+
+def json_file_stem(name: str) -> str:
+    """File name without its JSON and compression extensions: 'orders.jsonl.gz' -> 'orders'."""
+    base = os.path.basename(name)
+    if base.lower().endswith(COMPRESSED_EXTENSIONS):
+        base = os.path.splitext(base)[0]
+    if base.lower().endswith(JSON_EXTENSIONS):
+        base = os.path.splitext(base)[0]
+    return base
+
+def open_json_stream(path: str) -> BinaryIO:
+    """Opens a local JSON file as a binary stream, decompressing .gz/.bz2/.zst on the fly."""
+    path = str(path)
+    lower = path.lower()
+    if lower.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if lower.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if lower.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("Reading .zst files requires the optional 'zstandard' package (pip install zstandard).")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader)
+    return open(path, 'rb')
+
+# Decoders take bytes-like input (bytes or a memoryview over an mmap) and return Python objects.
+# Preference order for 'auto' is the order of insertion below; stdlib is always available.
+JSON_DECODERS: Dict[str, Callable[[Any], Any]] = {}
+if orjson is not None:
+    JSON_DECODERS['orjson'] = orjson.loads
+if simdjson is not None:
+    JSON_DECODERS['simdjson'] = lambda data: simdjson.loads(bytes(data))
+JSON_DECODERS['stdlib'] = lambda data: json.loads(bytes(data))
+
+def get_json_decoder(name: str = 'auto') -> Tuple[str, Callable[[Any], Any]]:
+    """Returns (name, loads) for the requested decoder; 'auto' picks the fastest one installed."""
+    if name == 'auto':
+        name = next(iter(JSON_DECODERS))
+    if name not in JSON_DECODERS:
+        raise ValueError(f"JSON decoder '{name}' is not available. Installed: {', '.join(JSON_DECODERS)}")
+    return name, JSON_DECODERS[name]
+
+_WHITESPACE_BYTES = b' \t\r\n'
+
+def iter_json_records(path: str, decoder: str = 'auto') -> Iterator[Any]:
     """
-    Load JSON from a local file path.
-    Handles both standard JSON arrays and NDJSON (newline-delimited).
-    Returns: list of top-level records
+    Streams the top-level records of a local JSON file.
+    Handles standard JSON arrays (one record per element), NDJSON and single objects.
+
+    With a fast decoder (orjson/simdjson), NDJSON lines and single documents are parsed
+    from bytes (a memory map for plain files) without decoding to str first.
+    The stdlib decoder, and top-level JSON arrays, use the incremental text reader so
+    only the current record is held in memory.
     """
-    with open(path, 'r', encoding='utf-8') as f:
-        text = f.read().strip()
-        if not text:
-            return []
-        # Try NDJSON/line-by-line first
-        lines = text.splitlines()
-        if len(lines) > 1:
+    name, loads = get_json_decoder(decoder)
+    if name == 'stdlib':
+        yield from _iter_text_records(path)
+    elif str(path).lower().endswith(COMPRESSED_EXTENSIONS):
+        yield from _iter_compressed_lines(path, loads)
+    else:
+        yield from _iter_mmap_records(path, loads)
+
+def _iter_mmap_records(path: str, loads: Callable[[Any], Any]) -> Iterator[Any]:
+    """Fast-decoder reader for plain files: per-line for NDJSON, whole-document parse otherwise."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            size, pos = len(mm), 0
+            while pos < size and mm[pos] in _WHITESPACE_BYTES:
+                pos += 1
+            if pos == size:
+                return
+            in_array = mm[pos] == ord('[')
+            if not in_array:
+                first = True
+                while pos < size:
+                    start, end = pos, mm.find(b'\n', pos)
+                    if end == -1:
+                        end = size
+                    pos = end + 1
+                    try:
+                        with view[start:end] as line:
+                            obj = loads(line)
+                    except ValueError:
+                        if not mm[start:end].strip():
+                            continue  # blank line
+                        if not first:
+                            raise
+                        # First line is not a complete value: one pretty-printed document
+                        yield loads(view)
+                        return
+                    first = False
+                    yield obj
+    if in_array:
+        # Materializing a whole top-level array costs more (allocation + GC over the
+        # full result) than the decoder saves; stream its elements instead.
+        yield from _iter_text_records(path)
+
+def _iter_compressed_lines(path: str, loads: Callable[[Any], Any]) -> Iterator[Any]:
+    """Fast-decoder reader for compressed NDJSON; anything else goes to the incremental text reader."""
+    with open_json_stream(path) as stream:
+        head = stream.peek(1 << 12).lstrip(_WHITESPACE_BYTES)
+        if head[:1] in (b'', b'['):
+            ndjson = False
+        else:
+            first = stream.readline()
             try:
-                records = [json.loads(line) for line in lines if line.strip()]
-                return records
+                obj = loads(first)
+                ndjson = True
+            except ValueError:
+                ndjson = False
+        if ndjson:
+            yield obj
+            for line in stream:
+                if line.strip():
+                    yield loads(line)
+            return
+    # Arrays and pretty-printed documents need incremental parsing across lines
+    yield from _iter_text_records(path)
+
+def _iter_text_records(path: str) -> Iterator[Any]:
+    """
+    Incremental reader over the decompressed text, holding only the current
+    record(s) in memory. Works with the stdlib decoder for any input shape.
+
+    A top-level array is streamed element by element. While it has not yet spanned a
+    line break its elements are held back: a one-line array followed by more values is
+    NDJSON whose records are arrays (`[1,2]\n[3,4]`), and is yielded as one record.
+    """
+    decoder = json.JSONDecoder()
+    with io.TextIOWrapper(open_json_stream(path), encoding='utf-8') as text:
+        buf, pos, eof = '', 0, False
+        in_array = None  # decided by the first non-whitespace character
+        held = None  # elements of a top-level array still on its first line
+        read_size = _READ_CHUNK
+        while True:
+            # Skip whitespace, and the commas between elements of the top-level array
+            start = pos
+            while pos < len(buf) and (buf[pos] in ' \t\r\n' or (in_array and buf[pos] == ',')):
+                pos += 1
+            if held is not None and in_array and '\n' in buf[start:pos]:
+                yield from held  # spans lines: one array document, not an NDJSON record
+                held = None
+            if pos == len(buf):
+                if eof:
+                    if held is not None:
+                        yield from held  # a one-line array document
+                    return
+                buf, pos = text.read(read_size), 0
+                eof = not buf
+                continue
+
+            if in_array is None:
+                in_array = buf[pos] == '['
+                if in_array:
+                    pos += 1
+                    held = []
+                    continue
+            if in_array and buf[pos] == ']':
+                in_array = False
+                pos += 1
+                continue
+            if held is not None and not in_array:
+                yield held  # more values follow the one-line array: it was the first NDJSON record
+                held = None
+
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                # A value ending exactly at the buffer end may be a cut-off number
+                complete = end < len(buf) or eof
             except json.JSONDecodeError:
-                # If NDJSON fails, fall back to parsing the whole file
-                pass
-        # Parse as a single JSON array or object
-        obj = json.loads(text)
-        return obj if isinstance(obj, list) else [obj]
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                more = text.read(read_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                read_size *= 2  # records bigger than a chunk: read ahead faster
+                continue
+            read_size = _READ_CHUNK
+            if held is not None:
+                if '\n' not in buf[pos:end]:
+                    held.append(obj)
+                    pos = end
+                    continue
+                yield from held
+                held = None
+            pos = end
+            yield obj
+
+def load_json_from_local_file(path: str, decoder: str = 'auto') -> List[Any]:
+    """
+    Load JSON from a local file path (plain or .gz/.bz2/.zst compressed).
+    Handles both standard JSON arrays and NDJSON (newline-delimited).
+    Returns: list of top-level records
+    """
+    return list(iter_json_records(path, decoder))
 
 # -----------------------
-# Core normalizer (unchanged, but column names are now uppercased by sanitize_name)
+# Core normalizer (column names are uppercased by sanitize_name)
 # -----------------------
+_PRIMITIVE_TYPES = (str, int, float, bool)
+_END = object()
+
 class Normalizer:
-    def __init__(self, root_name: str = "ROOT"):
+    """
+    Flattens nested JSON records into parent/child tables with generated IDs.
+
+    With `dedup=True`, nested objects are content-hashed per child table and identical
+    ones share a single row: the child table becomes a dimension table without a parent
+    FK, and the parent row references it through a "<CHILD>_ID" column instead.
+    Array elements keep one row per occurrence (they are one-to-many by nature).
+    """
+    def __init__(self, root_name: str = "ROOT", dedup: bool = False):
         self.root_name = sanitize_name(root_name)
+        self.dedup = dedup
         self.tables: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
         self.id_counters: Dict[str, int] = defaultdict(int)
+        # child table -> parent table, i.e. the table its "<PARENT>_ID" column points at
+        self.parents: Dict[str, str] = {}
+        # Memoized names: JSON key -> column, (parent table, key) -> child table
+        self._columns: Dict[str, str] = {}
+        self._object_tables: Dict[Tuple[str, str], str] = {}
+        self._array_tables: Dict[Tuple[str, str], str] = {}
+        # Dedup mode: tables referenced from their parent, and content digest -> ID per table
+        self.dimensions: set = set()
+        self._digests: Dict[str, Dict[bytes, int]] = defaultdict(dict)
 
     def _next_id(self, table: str) -> int:
         self.id_counters[table] += 1
         return self.id_counters[table]
 
     def _is_primitive(self, v: Any) -> bool:
-        return v is None or isinstance(v, (str, int, float, bool))
+        return v is None or isinstance(v, _PRIMITIVE_TYPES)
+
+    def _column(self, key: str) -> str:
+        col = self._columns[key] = sanitize_name(key)
+        return col
 
-    def _record_primitives(self, table: str, row: Dict[str, Any]):
-        self.tables[table].append(row)
+    def _object_table(self, table: str, key: str) -> str:
+        child = self._object_tables[(table, key)] = f"{table}_{self._columns.get(key) or self._column(key)}"
+        self.parents.setdefault(child, table)
+        return child
+
+    def _array_table(self, table: str, key: str) -> str:
+        child = self._array_tables[(table, key)] = sanitize_name(f"{table}_{self._columns.get(key) or self._column(key)}")
+        self.parents.setdefault(child, table)
+        return child
 
     def process(self, records: List[Any]):
+        root_table = self.root_name
+        counters = self.id_counters
+        columns = self._columns
         for rec in records:
-            root_table = self.root_name
-            root_id = self._next_id(root_table)
+            counters[root_table] += 1
+            root_id = counters[root_table]
             row = {'ID': root_id} # Use uppercase for Snowflake convention
-            if self._is_primitive(rec):
+            if rec is None or isinstance(rec, _PRIMITIVE_TYPES):
                 row['VALUE'] = rec
-                self._record_primitives(root_table, row)
             elif isinstance(rec, dict):
                 for k, v in rec.items():
-                    col = sanitize_name(k)
-                    if self._is_primitive(v):
-                        row[col] = v
-                    elif isinstance(v, dict):
-                        child_table = f"{root_table}_{sanitize_name(k)}"
-                        child_id = self._next_id(child_table)
-                        child_row = {'ID': child_id, f"{root_table}_ID": root_id}
-                        for ck, cv in v.items():
-                            if self._is_primitive(cv):
-                                child_row[sanitize_name(ck)] = cv
-                        self.tables[child_table].append(child_row)
-                        self._recurse_object(v, child_table, child_row['ID'], parent_table=root_table)
-                    elif isinstance(v, list):
-                        arr_table = f"{root_table}_{sanitize_name(k)}"
-                        self._process_array(v, arr_table, root_table_id=root_id, parent_table=root_table)
-                    else:
-                        row[col] = str(v)
-                self._record_primitives(root_table, row)
+                    if v is None or isinstance(v, _PRIMITIVE_TYPES):
+                        row[columns.get(k) or self._column(k)] = v
+                    elif not isinstance(v, (dict, list)):
+                        row[columns.get(k) or self._column(k)] = str(v)
+                self._walk([(False, iter(rec.items()), root_table, root_id, f"{root_table}_ID", row)])
             elif isinstance(rec, list):
                 # This case is for a top-level array of arrays, less common
-                arr_table = f"{root_table}_ARRAY"
-                self._process_array(rec, arr_table, root_table_id=root_id, parent_table=root_table)
-                self._record_primitives(root_table, row)
+                arr_table = self._array_tables.get((root_table, 'ARRAY')) or self._array_table(root_table, 'ARRAY')
+                self._walk([(True, iter(rec), arr_table, root_id, f"{root_table}_ID", None)])
             else:
                 row['VALUE'] = str(rec)
-                self._record_primitives(root_table, row)
+            self.tables[root_table].append(row)
 
-    def _recurse_object(self, obj: dict, table: str, parent_id: int, parent_table: str):
-        for k, v in obj.items():
-            if self._is_primitive(v):
+    def _walk(self, stack: List[tuple]):
+        """
+        Depth-first traversal with an explicit stack, so nesting depth is not bound by
+        the recursion limit. Rows and IDs come out in the same pre-order as a recursive walk.
+
+        Frames are (is_array, iterator, table, owner_id, fk_col, owner_row):
+          - object frame: iterates the items of an object whose row (`owner_id`, `owner_row`)
+            is already in `table`; nested objects/arrays become child tables pointing back
+            via `fk_col` (in dedup mode, nested objects are referenced from `owner_row`).
+          - array frame: iterates the elements of an array whose rows go to `table`, each
+            pointing at `owner_id` of the parent table via `fk_col`.
+        """
+        tables = self.tables
+        counters = self.id_counters
+        columns = self._columns
+        object_tables = self._object_tables
+        array_tables = self._array_tables
+        dedup = self.dedup
+        while stack:
+            is_array, it, table, owner_id, fk_col, owner_row = stack[-1]
+            item = next(it, _END)
+            if item is _END:
+                stack.pop()
                 continue
-            col_name = sanitize_name(k)
+
+            if is_array:
+                counters[table] += 1
+                row_id = counters[table]
+                row = {'ID': row_id, fk_col: owner_id}
+                if item is None or isinstance(item, _PRIMITIVE_TYPES):
+                    row['VALUE'] = item
+                    tables[table].append(row)
+                elif isinstance(item, dict):
+                    for k, v in item.items():
+                        if v is None or isinstance(v, _PRIMITIVE_TYPES):
+                            row[columns.get(k) or self._column(k)] = v
+                    tables[table].append(row)
+                    stack.append((False, iter(item.items()), table, row_id, f"{table}_ID", row))
+                elif isinstance(item, list):
+                    # Nested arrays go to an _ITEM table; the outer element gets an ID but no row
+                    child = array_tables.get((table, 'ITEM')) or self._array_table(table, 'ITEM')
+                    stack.append((True, iter(item), child, row_id, f"{table}_ID", None))
+                else:
+                    row['VALUE'] = str(item)
+                    tables[table].append(row)
+                continue
+
+            k, v = item
             if isinstance(v, dict):
-                child_table = f"{table}_{col_name}"
-                child_id = self._next_id(child_table)
-                child_row = {'ID': child_id, f"{table}_ID": parent_id}
+                child = object_tables.get((table, k)) or self._object_table(table, k)
+                if dedup:
+                    # The digest covers the whole sub-document, so a hit shares its subtree too
+                    digest = hashlib.blake2b(json.dumps(v, default=str, separators=(',', ':')).encode(),
+                                             digest_size=16).digest()
+                    seen = self._digests[child]
+                    if digest in seen:
+                        owner_row[f"{child}_ID"] = seen[digest]
+                        continue
+                    self.dimensions.add(child)
+                counters[child] += 1
+                child_id = counters[child]
+                if dedup:
+                    seen[digest] = child_id
+                    owner_row[f"{child}_ID"] = child_id
+                    child_row = {'ID': child_id}
+                else:
+                    child_row = {'ID': child_id, fk_col: owner_id}
                 for ck, cv in v.items():
-                    if self._is_primitive(cv):
-                        child_row[sanitize_name(ck)] = cv
-                self.tables[child_table].append(child_row)
-                self._recurse_object(v, child_table, child_row['ID'], parent_table=table)
+                    if cv is None or isinstance(cv, _PRIMITIVE_TYPES):
+                        child_row[columns.get(ck) or self._column(ck)] = cv
+                tables[child].append(child_row)
+                stack.append((False, iter(v.items()), child, child_id, f"{child}_ID", child_row))
             elif isinstance(v, list):
-                arr_table = f"{table}_{col_name}"
-                self._process_array(v, arr_table, root_table_id=parent_id, parent_table=table)
+                child = array_tables.get((table, k)) or self._array_table(table, k)
+                stack.append((True, iter(v), child, owner_id, fk_col, None))
 
-    def _process_array(self, arr: list, arr_table: str, root_table_id: int, parent_table: str):
-        arr_table = sanitize_name(arr_table)
-        for elem in arr:
-            row_id = self._next_id(arr_table)
-            row = {'ID': row_id, f"{parent_table}_ID": root_table_id}
-            if self._is_primitive(elem):
-                row['VALUE'] = elem
-                self.tables[arr_table].append(row)
-            elif isinstance(elem, dict):
-                for k, v in elem.items():
-                    if self._is_primitive(v):
-                        row[sanitize_name(k)] = v
-                self.tables[arr_table].append(row)
-                self._recurse_object(elem, arr_table, parent_id=row_id, parent_table=parent_table)
-            elif isinstance(elem, list):
-                # Handle nested arrays
-                child_table = f"{arr_table}_ITEM"
-                self._process_array(elem, child_table, root_table_id=row_id, parent_table=arr_table)
-            else:
-                row['VALUE'] = str(elem)
-                self.tables[arr_table].append(row)
+    def merge(self, other: "Normalizer"):
+        """
+        Append the tables of another Normalizer, shifting its IDs (and the
+        parent FKs pointing at them) past the IDs already held here, so that
+        sequences stay consistent across files. `other` is consumed.
+
+        Dimension rows (dedup mode) whose content is already held here are not
+        copied: references to them are redirected to the existing row, and the
+        rows under them (their one-to-many children) are dropped as duplicates.
+        """
+        offsets = {table: self.id_counters[table] for table in other.id_counters}
+        # Per table: IDs in `other` of rows not copied -> ID here (None when simply dropped)
+        replaced: Dict[str, Dict[int, Any]] = {}
+        referenced = defaultdict(list)  # table -> dimension tables its rows reference
+        for dim in other.dimensions:
+            referenced[other.parents[dim]].append(dim)
+
+        for table in (self._merge_order(other) if other.dimensions else list(other.tables)):
+            rows = other.tables.get(table, [])
+            offset = offsets.get(table, 0)
+            parent = other.parents.get(table)
+            fk_col = f"{parent}_ID" if parent else None
+            fk_offset = offsets.get(parent, 0)
+            parent_replaced = replaced.get(parent)
+            seen = self._digests[table] if table in other.dimensions else None
+            digest_of = {row_id: digest for digest, row_id in other._digests[table].items()} if seen is not None else {}
+            gone = {}
+            kept = []
+            for row in rows:
+                if parent_replaced and row.get(fk_col) in parent_replaced:
+                    gone[row['ID']] = None
+                    continue
+                digest = digest_of.get(row['ID'])
+                if digest is not None:
+                    if digest in seen:
+                        gone[row['ID']] = seen[digest]
+                        continue
+                    seen[digest] = row['ID'] + offset
+                for dim in referenced.get(table, ()):
+                    ref_col = f"{dim}_ID"
+                    if ref_col in row:
+                        old = row[ref_col]
+                        dim_replaced = replaced.get(dim, {})
+                        row[ref_col] = dim_replaced[old] if old in dim_replaced else old + offsets.get(dim, 0)
+                row['ID'] += offset
+                if fk_col in row:
+                    row[fk_col] += fk_offset
+                kept.append(row)
+            replaced[table] = gone
+            self.tables[table].extend(kept)
+        for table, parent in other.parents.items():
+            self.parents.setdefault(table, parent)
+        for table, count in other.id_counters.items():
+            self.id_counters[table] += count
+        self.dimensions |= other.dimensions
+
+    @staticmethod
+    def _merge_order(other: "Normalizer") -> List[str]:
+        """
+        Tables of `other` ordered so that dimension tables come before the tables
+        referencing them, and FK parents before their children (Kahn's algorithm).
+        """
+        tables = list(dict.fromkeys([*other.tables, *other.id_counters, *other.parents, *other.parents.values()]))
+        after = defaultdict(list)
+        pending = dict.fromkeys(tables, 0)
+        for child, parent in other.parents.items():
+            first, then = (child, parent) if child in other.dimensions else (parent, child)
+            after[first].append(then)
+            pending[then] += 1
+        ready = [t for t in tables if not pending[t]]
+        order = []
+        while ready:
+            table = ready.pop()
+            order.append(table)
+            for nxt in after[table]:
+                pending[nxt] -= 1
+                if not pending[nxt]:
+                    ready.append(nxt)
+        # A key holding objects in some records and arrays in others makes a table both a
+        # dimension and an FK child, which can form a cycle; merge those tables last
+        placed = set(order)
+        return order + [t for t in tables if t not in placed]
 
 # -----------------------
 # Type inference & DDL (unchanged, types are compatible with Snowflake)
@@ -167,8 +516,17 @@ def infer_column_type(values: List[Any]) -> str:
         return 'TIMESTAMP_NTZ'
     return 'VARCHAR'
 
-def generate_ddl(table: str, rows: List[Dict[str, Any]]) -> str:
-    all_cols = set().union(*(d.keys() for d in rows))
+def widen_column_type(current: str, seen: str) -> str:
+    """Narrowest type holding values of both types: NUMBER + FLOAT -> FLOAT, other mixes -> VARCHAR."""
+    if current == seen:
+        return current
+    if {current, seen} == {'NUMBER', 'FLOAT'}:
+        return 'FLOAT'
+    return 'VARCHAR'
+
+def _column_order(all_cols: set) -> List[str]:
+    """DDL column order: ID, then FKs, then the rest sorted."""
+    all_cols = set(all_cols)
     cols_order = []
     if 'ID' in all_cols:
         cols_order.append('ID')
@@ -176,19 +534,288 @@ def generate_ddl(table: str, rows: List[Dict[str, Any]]) -> str:
     fks = sorted([c for c in all_cols if c.endswith('_ID')])
     cols_order.extend(fks)
     cols_order.extend(sorted(all_cols - set(fks)))
+    return cols_order
+
+def column_types(rows: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Returns (column, Snowflake type) pairs in DDL order: ID, then FKs, then the rest sorted."""
+    all_cols = set().union(*(d.keys() for d in rows))
+    return [(c, infer_column_type([r.get(c) for r in rows])) for c in _column_order(all_cols)]
+
+def create_table_sql(table: str, cols: List[Tuple[str, str]]) -> str:
+    col_lines = [f'  "{c}" {col_type}' for c, col_type in cols]
+    return f'CREATE OR REPLACE TABLE "{table}" (\n' + ",\n".join(col_lines) + "\n);"
+
+def generate_ddl(table: str, rows: List[Dict[str, Any]]) -> str:
+    return create_table_sql(table, column_types(rows))
+
+# -----------------------
+# JSON Schema fast path: fixed table plan instead of dynamic key discovery
+# -----------------------
+OVERFLOW_COLUMN = '_OVERFLOW'  # sanitize_name never yields a leading underscore before a letter
+_DATE_PREFIX = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+def _resolve_ref(node: dict, root: dict, seen: Tuple[str, ...] = ()) -> dict:
+    """Follows local '#/...' $refs (e.g. '#/definitions/address')."""
+    while isinstance(node, dict) and '$ref' in node:
+        ref = node['$ref']
+        if not ref.startswith('#/') or ref in seen:
+            raise ValueError(f"Unsupported or recursive $ref in JSON Schema: {ref}")
+        seen = seen + (ref,)
+        node = root
+        for part in ref[2:].split('/'):
+            node = node[part]
+    return node
+
+def _schema_kind(node: dict) -> Tuple[str, str]:
+    """Returns ('object' | 'array' | 'scalar', Snowflake type for scalars) of a schema node."""
+    types = node.get('type')
+    if types is None:
+        types = ['object'] if 'properties' in node else ['array'] if 'items' in node else []
+    elif isinstance(types, str):
+        types = [types]
+    types = [t for t in types if t != 'null']
+    if types == ['object']:
+        return 'object', 'VARIANT'
+    if types == ['array']:
+        return 'array', 'VARIANT'
+    if not types:
+        return 'scalar', 'VARCHAR' if 'type' in node else 'VARIANT'
+    if set(types) <= {'integer', 'number'}:
+        return 'scalar', 'NUMBER' if types == ['integer'] else 'FLOAT'
+    if types == ['boolean']:
+        return 'scalar', 'BOOLEAN'
+    if types == ['string']:
+        return 'scalar', 'TIMESTAMP_NTZ' if node.get('format') in ('date', 'date-time') else 'VARCHAR'
+    # Mixed types (or object/array mixed with scalars) are kept as VARIANT
+    return 'scalar', 'VARIANT'
+
+def compile_schema_plan(schema: dict, root_name: str = "ROOT") -> Dict[str, Any]:
+    """
+    Compiles a JSON Schema (of one record) into a fixed plan of table builders, named
+    exactly as the Normalizer would name them. Each plan node is a dict with:
+      'table', 'fk' (parent FK column or None), 'columns' ([(column, type)] in DDL order),
+      'scalars' ([(key, column, is_variant)]), 'objects'/'arrays' ([(key, child node)]),
+      'known' (keys covered by the schema), and for array tables 'item_kind'
+      ('object' | 'scalar' | 'array'), 'value_variant' and 'item' (nested array node).
+    """
+    def object_node(node, table, parent, fk_table):
+        plan = {'table': table, 'fk': f"{fk_table}_ID" if fk_table else None, 'parent': parent,
+                'scalars': [], 'objects': [], 'arrays': [], 'item_kind': 'object'}
+        types = {}
+        for key, prop in (node.get('properties') or {}).items():
+            prop = _resolve_ref(prop, schema)
+            kind, col_type = _schema_kind(prop)
+            col = sanitize_name(key)
+            if kind == 'object':
+                plan['objects'].append((key, object_node(prop, f"{table}_{col}", table, table)))
+            elif kind == 'array':
+                plan['arrays'].append((key, array_node(prop, sanitize_name(f"{table}_{col}"), table)))
+            else:
+                plan['scalars'].append((key, col, col_type == 'VARIANT'))
+                types[col] = col_type
+        plan['known'] = frozenset(node.get('properties') or ())
+        plan['columns'] = finish_columns(plan, types)
+        return plan
+
+    def array_node(node, table, parent):
+        items = _resolve_ref(node.get('items') or {}, schema)
+        kind, col_type = _schema_kind(items)
+        if kind == 'object':
+            plan = object_node(items, table, parent, parent)
+        else:
+            plan = {'table': table, 'fk': f"{parent}_ID", 'parent': parent, 'scalars': [], 'objects': [],
+                    'arrays': [], 'known': frozenset(), 'item_kind': kind, 'value_variant': col_type == 'VARIANT'}
+            if kind == 'array':
+                plan['item'] = array_node(items, sanitize_name(f"{table}_ITEM"), table)
+            plan['columns'] = finish_columns(plan, {} if kind == 'array' else {'VALUE': col_type})
+        return plan
+
+    def finish_columns(plan, types):
+        # A JSON key that sanitizes to ID or the FK overwrites it, as in the Normalizer
+        types = dict(types)
+        types.setdefault('ID', 'NUMBER')
+        if plan['fk']:
+            types.setdefault(plan['fk'], 'NUMBER')
+        types[OVERFLOW_COLUMN] = 'VARIANT'
+        return [(c, types[c]) for c in _column_order(types)]
+
+    root = _resolve_ref(schema, schema)
+    return object_node(root, sanitize_name(root_name), None, None)
+
+def _plan_nodes(plan: Dict[str, Any]):
+    """Yields every node of a compiled plan, parents first."""
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(child for _, child in reversed(node['arrays']))
+        stack.extend(child for _, child in reversed(node['objects']))
+        if node.get('item'):
+            stack.append(node['item'])
+
+def infer_json_schema(records: List[Any]) -> Dict[str, Any]:
+    """
+    Infers a JSON Schema from (sample) records, typed the way infer_column_type types
+    columns. Saved alongside a feed, it pins the layout for SchemaNormalizer across runs.
+    """
+    def merge(acc, value):
+        if value is None:
+            acc['types'].add('null')
+        elif isinstance(value, bool):
+            acc['types'].add('boolean')
+        elif isinstance(value, int):
+            acc['types'].add('integer')
+        elif isinstance(value, float):
+            acc['types'].add('number')
+        elif isinstance(value, str):
+            acc['types'].add('string')
+            acc['dates'] = acc['dates'] and bool(_DATE_PREFIX.match(value))
+        elif isinstance(value, dict):
+            acc['types'].add('object')
+            for k, v in value.items():
+                merge(acc['properties'].setdefault(k, new_acc()), v)
+        elif isinstance(value, list):
+            acc['types'].add('array')
+            for v in value:
+                if acc['items'] is None:
+                    acc['items'] = new_acc()
+                merge(acc['items'], v)
+
+    def new_acc():
+        return {'types': set(), 'properties': {}, 'items': None, 'dates': True}
+
+    def emit(acc):
+        types = acc['types'] - {'null'}
+        if types == {'integer', 'number'}:
+            types = {'number'}
+        if not types:
+            return {'type': ['string', 'null']}
+        if len(types) > 1:
+            return {}  # mixed -> VARIANT
+        (kind,) = types
+        node = {'type': [kind, 'null']} if 'null' in acc['types'] else {'type': kind}
+        if kind == 'object':
+            node['properties'] = {k: emit(v) for k, v in acc['properties'].items()}
+        elif kind == 'array':
+            node['items'] = emit(acc['items']) if acc['items'] else {}
+        elif kind == 'string' and acc['dates']:
+            node['format'] = 'date-time'
+        return node
 
-    col_lines = []
-    for c in cols_order:
-        vals = [r.get(c) for r in rows]
-        col_type = infer_column_type(vals)
-        col_lines.append(f'  "{c}" {col_type}')
+    root = new_acc()
+    for rec in records:
+        if isinstance(rec, dict):
+            merge(root, rec)
+    return emit(root) if root['types'] else {'type': 'object', 'properties': {}}
 
-    ddl = f'CREATE OR REPLACE TABLE "{table}" (\n' + ",\n".join(col_lines) + "\n);"
-    return ddl
+class SchemaNormalizer(Normalizer):
+    """
+    Normalizer fast path for feeds with a known shape. The JSON Schema is compiled once
+    into a fixed plan (compile_schema_plan), so records are mapped slot by slot with no
+    key discovery, name sanitizing or type inference. Keys the schema does not cover, and
+    values of the wrong shape, go as JSON to the row's _OVERFLOW VARIANT column.
+
+    Produces the same tables, IDs and FKs as Normalizer for conforming data; the DDL
+    comes from the schema (`table_columns`), so it is identical on every run.
+    """
+    def __init__(self, schema: Dict[str, Any], root_name: str = "ROOT"):
+        super().__init__(root_name)
+        self.plan = compile_schema_plan(schema, self.root_name)
+        self.table_columns: Dict[str, List[Tuple[str, str]]] = {}
+        for node in _plan_nodes(self.plan):
+            self.table_columns[node['table']] = node['columns']
+            self.tables[node['table']]  # every planned table exists, even when empty
+            if node['parent']:
+                self.parents.setdefault(node['table'], node['parent'])
+
+    def process(self, records: List[Any]):
+        plan = self.plan
+        root_table = plan['table']
+        counters = self.id_counters
+        for rec in records:
+            counters[root_table] += 1
+            root_id = counters[root_table]
+            if isinstance(rec, dict):
+                self._fill_object(plan, rec, {'ID': root_id}, root_id)
+            else:
+                self.tables[root_table].append({'ID': root_id, OVERFLOW_COLUMN: json.dumps(rec, default=str)})
+
+    def _fill_object(self, node: Dict[str, Any], obj: dict, row: Dict[str, Any], row_id: int):
+        for key, col, variant in node['scalars']:
+            v = obj.get(key)
+            row[col] = json.dumps(v, default=str) if variant and v is not None else v
+        extra = obj.keys() - node['known']
+        overflow = {k: obj[k] for k in extra} if extra else None
+
+        counters = self.id_counters
+        for key, child in node['objects']:
+            v = obj.get(key)
+            if isinstance(v, dict):
+                table = child['table']
+                counters[table] += 1
+                child_id = counters[table]
+                self._fill_object(child, v, {'ID': child_id, child['fk']: row_id}, child_id)
+            elif v is not None:
+                overflow = overflow or {}
+                overflow[key] = v
+        for key, child in node['arrays']:
+            v = obj.get(key)
+            if isinstance(v, list):
+                self._fill_array(child, v, row_id)
+            elif v is not None:
+                overflow = overflow or {}
+                overflow[key] = v
+
+        if overflow:
+            row[OVERFLOW_COLUMN] = json.dumps(overflow, default=str)
+        self.tables[node['table']].append(row)
+
+    def _fill_array(self, node: Dict[str, Any], arr: list, owner_id: int):
+        table, fk, kind = node['table'], node['fk'], node['item_kind']
+        rows = self.tables[table]
+        counters = self.id_counters
+        for elem in arr:
+            counters[table] += 1
+            row_id = counters[table]
+            row = {'ID': row_id, fk: owner_id}
+            if kind == 'object' and isinstance(elem, dict):
+                self._fill_object(node, elem, row, row_id)
+            elif kind == 'array' and isinstance(elem, list):
+                # Like the Normalizer: the outer element gets an ID but no row
+                self._fill_array(node['item'], elem, row_id)
+            elif kind == 'scalar' and not isinstance(elem, (dict, list)):
+                row['VALUE'] = json.dumps(elem, default=str) if node['value_variant'] and elem is not None else elem
+                rows.append(row)
+            else:
+                row[OVERFLOW_COLUMN] = json.dumps(elem, default=str)
+                rows.append(row)
+
+MANIFEST_TABLE = 'JSON_LOAD_MANIFEST'
+ID_COUNTER_TABLE = 'JSON_LOAD_ID_COUNTERS'
+
+def _list_stage_files(cur, stage_name: str, pattern: str = None) -> List[Dict[str, Any]]:
+    """
+    Runs LIST on an open cursor and keeps the JSON files, optionally filtered by a filename glob.
+    Returns one dict per file with the name, size and md5 reported by LIST.
+    """
+    cur.execute(f"LIST {stage_name}")
+    # LIST returns name, size, md5, last_modified
+    files = [{"name": row[0], "size": row[1], "md5": row[2]} for row in cur.fetchall()]
+
+    # Filter for common JSON extensions for cleaner lists
+    json_files = [f for f in files if is_json_file(f["name"])]
+    if pattern:
+        json_files = [f for f in json_files if fnmatch.fnmatch(os.path.basename(f["name"]), pattern)]
+    return json_files
+
+def _list_json_files(cur, stage_name: str, pattern: str = None) -> List[str]:
+    """Same as _list_stage_files, but only the file paths."""
+    return [f["name"] for f in _list_stage_files(cur, stage_name, pattern)]
 
-def list_files_in_stage(stage_name: str, config:dict) -> List[str]:
+def list_files_in_stage(stage_name: str, config:dict, pattern: str = None) -> List[str]:
     """
     Executes a LIST command and returns a list of file paths in the stage.
+    If `pattern` is given (e.g. 'orders_*.json'), only matching file names are returned.
     """
     print(f"Listing files in stage '{stage_name}'...")
     SNOWFLAKE_CONFIG = config.get('SNOWFLAKE_CONFIG')
@@ -198,13 +825,7 @@ def list_files_in_stage(stage_name: str, config:dict) -> List[str]:
         cur = conn.cursor()
         cur.execute(f'USE DATABASE "{SNOWFLAKE_CONFIG["database"]}"')
         cur.execute(f'USE SCHEMA "{SNOWFLAKE_CONFIG["schema"]}"')
-        cur.execute(f"LIST {stage_name}")
-        
-        # The file path is the first column of the result set
-        files = [row[0] for row in cur.fetchall()]
-        
-        # Filter for common JSON extensions for cleaner lists
-        json_files = [f for f in files if f.lower().endswith(('.json', '.jsonl', '.ndjson'))]
+        json_files = _list_json_files(cur, stage_name, pattern)
         print(f"Found {len(json_files)} JSON file(s).")
         return json_files
     finally:
@@ -212,12 +833,292 @@ def list_files_in_stage(stage_name: str, config:dict) -> List[str]:
             cur.close()
 
 
+# -----------------------
+# Local download cache for stage files
+# -----------------------
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'json_to_snowflake_cache')
+DEFAULT_CACHE_MAX_BYTES = 2 << 30  # 2 GiB
+
+def _get_stage_file(cur, stage_name: str, file_path_in_stage: str, download_dir: pathlib.Path) -> pathlib.Path:
+    """
+    GETs one stage file into `download_dir`, under the file's own subfolders so same-named
+    files from different stage folders do not overwrite each other, and returns its local path.
+    """
+    target_dir = (download_dir / os.path.dirname(file_path_in_stage)).resolve()
+    target_dir.mkdir(parents=True, exist_ok=True)
+    cur.execute(f"GET {stage_name}/{file_path_in_stage} file://{target_dir.as_posix()}")
+    return target_dir / os.path.basename(file_path_in_stage)
+
+def _stage_root(stage_name: str) -> str:
+    """'@DB.SCHEMA.STAGE/some/prefix' -> '@DB.SCHEMA.STAGE'."""
+    return stage_name.split('/', 1)[0]
+
+def _stage_relative_path(stage_name: str, listed_name: str) -> str:
+    """
+    Path of a LIST result relative to the stage root. LIST on a named internal stage prefixes
+    every file with the stage's (lowercase) name: 'json_stage/2024/orders.json' -> '2024/orders.json'.
+    """
+    stage = _stage_root(stage_name).lstrip('@').split('.')[-1].strip('"').lower()
+    first, _, rest = listed_name.partition('/')
+    return rest if rest and first.lower() == stage else listed_name
+
+def _stage_file_path(stage_name: str, file_path_in_stage: str) -> str:
+    """
+    '@STAGE/<path>' of one stage file, subfolders included, given relative to `stage_name` or
+    as LIST names it: 'json_stage/2024/01/x.json' -> '@JSON_STAGE/2024/01/x.json'.
+    """
+    relative = _stage_relative_path(stage_name, file_path_in_stage)
+    if relative != file_path_in_stage:
+        return f"{_stage_root(stage_name)}/{relative}"
+    return f"{stage_name.rstrip('/')}/{file_path_in_stage.lstrip('/')}"
+
+class StageFileCache:
+    """
+    Content-addressed local copies of stage files, keyed by the md5 LIST reports, so
+    re-processing an unchanged file skips the GET. Entries live in
+    `<cache_dir>/<md5>_<size>/<file name>`, where size is that of the downloaded file (LIST
+    reports the stored size, which for internal stages is the compressed, encrypted one);
+    an entry of another size is a partial or damaged copy and is downloaded again. A hit
+    refreshes the entry's mtime and the least recently used entries are evicted once the
+    cache grows past `max_bytes`.
+    Files handed out by this instance are never evicted by it, so a batch larger than
+    the cap can overshoot it until the next run.
+    """
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.pinned = set()  # entries returned by fetch() during this run
+
+    def fetch(self, cur, stage_name: str, file_path_in_stage: str, md5: str,
+              fallback_dir: pathlib.Path) -> pathlib.Path:
+        """Local path of the stage file, downloading it only on a cache miss."""
+        if not md5:
+            # Without a content hash from LIST there is nothing safe to key on
+            return _get_stage_file(cur, stage_name, file_path_in_stage, fallback_dir)
+        file_name = os.path.basename(file_path_in_stage)
+        for entry_dir in self.cache_dir.glob(f"{md5}_*"):
+            entry = entry_dir / file_name
+            try:
+                if entry.stat().st_size == int(entry_dir.name.rpartition('_')[2]):
+                    os.utime(entry)
+                    self.pinned.add(entry)
+                    print(f"Using cached copy of '{entry.name}'.")
+                    return entry
+            except (OSError, ValueError):
+                continue  # not cached under this name, evicted meanwhile, or not an entry of ours
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Download next to the entry and rename, so concurrent runs never see a partial file
+        with tempfile.TemporaryDirectory(dir=self.cache_dir, prefix='.get-') as tmp:
+            downloaded = _get_stage_file(cur, stage_name, file_path_in_stage, pathlib.Path(tmp))
+            entry = self.cache_dir / f"{md5}_{downloaded.stat().st_size}" / file_name
+            entry.parent.mkdir(exist_ok=True)
+            os.replace(downloaded, entry)
+        os.utime(entry)  # GET may keep the stage timestamp; recency is what eviction needs
+        self.pinned.add(entry)
+        self.evict()
+        return entry
+
+    def evict(self):
+        """Deletes least recently used entries (other than pinned ones) until the cache fits in max_bytes."""
+        entries = []
+        for path in self.cache_dir.glob('*/*'):
+            if path.parent.name.startswith('.'):
+                continue  # a download still in progress
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # evicted by a concurrent run
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if path in self.pinned:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass  # evicted by a concurrent run, which freed the space all the same
+            except OSError:
+                continue  # still on disk, so it still counts
+            total -= size
+            try:
+                path.parent.rmdir()
+            except OSError:
+                pass  # the directory still holds another name for the same content
+
+def _download_cache(config: dict) -> Union[StageFileCache, None]:
+    """
+    The cache described by config['DOWNLOAD_CACHE'] ({'dir': ..., 'max_bytes': ...}, both optional).
+    Set max_bytes to 0 to disable caching and download into a temporary directory every run.
+    """
+    settings = config.get('DOWNLOAD_CACHE') or {}
+    max_bytes = settings.get('max_bytes', DEFAULT_CACHE_MAX_BYTES)
+    if not max_bytes:
+        return None
+    return StageFileCache(settings.get('dir', DEFAULT_CACHE_DIR), max_bytes)
+
+
+def _load_tables(conn, cur, tables: Dict[str, List[Dict[str, Any]]],
+                 existing_columns: Dict[str, set] = None,
+                 table_columns: Dict[str, List[Tuple[str, str]]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Creates one table per normalized table and loads its rows with a single write_pandas call.
+
+    By default every table is replaced. When `existing_columns` (table -> column names) is
+    given, the tables it lists are appended to instead, after adding any new columns.
+    Tables listed in `table_columns` (table -> [(column, type)], e.g. from a SchemaNormalizer)
+    use that fixed layout instead of types inferred from the rows, and are created even when
+    empty; their VARIANT columns arrive as JSON text and are parsed with PARSE_JSON.
+    """
+    results = {}
+    for table_name, rows in tables.items():
+        print(f"\nProcessing table: {table_name}")
+        fixed_cols = (table_columns or {}).get(table_name)
+        if not rows and not fixed_cols:
+            print(f" -> No data for table '{table_name}'. Skipping.")
+            continue
+        cols = fixed_cols or column_types(rows)
+
+        if existing_columns is not None and table_name in existing_columns:
+            known = existing_columns[table_name]
+            for col, col_type in cols:
+                if col not in known:
+                    alter_sql = f'ALTER TABLE "{table_name}" ADD COLUMN "{col}" {col_type}'
+                    print(f" -> New key found. Executing: {alter_sql}")
+                    cur.execute(alter_sql)
+        else:
+            ddl = create_table_sql(table_name, cols)
+            print(f" -> Executing DDL:\n{ddl}")
+            cur.execute(ddl)
+        ddl_cols = [c for c, _ in cols]
+        if not rows:
+            print(f" -> No data for table '{table_name}'. Table created empty.")
+            results[table_name] = {"rows_loaded": 0, "columns": len(ddl_cols)}
+            continue
+
+        df = pd.DataFrame(rows, columns=ddl_cols)
+        variant_cols = [c for c, col_type in cols if col_type == 'VARIANT'] if fixed_cols else []
+        load_table = f"{table_name}_LOAD" if variant_cols else table_name
+        if variant_cols:
+            # write_pandas would store the JSON text as a VARIANT string, so go through a
+            # temporary table and PARSE_JSON into the target
+            cur.execute(create_table_sql(load_table, [(c, 'VARCHAR' if t == 'VARIANT' else t) for c, t in cols])
+                        .replace('CREATE OR REPLACE TABLE', 'CREATE OR REPLACE TEMPORARY TABLE', 1))
+
+        print(f" -> Loading {len(df)} rows into '{table_name}'...")
+        success, nchunks, nrows, _ = write_pandas(
+            conn,
+            df,
+            load_table,
+            auto_create_table=False,
+            overwrite=existing_columns is None and not variant_cols,
+        )
+        if success and variant_cols:
+            select = ", ".join(f'PARSE_JSON("{c}")' if c in variant_cols else f'"{c}"' for c in ddl_cols)
+            col_list = ", ".join(f'"{c}"' for c in ddl_cols)
+            cur.execute(f'INSERT INTO "{table_name}" ({col_list}) SELECT {select} FROM "{load_table}"')
+            cur.execute(f'DROP TABLE IF EXISTS "{load_table}"')
+        if success:
+            print(f" -> Successfully loaded {nrows} rows.")
+            results[table_name] = {"rows_loaded": nrows, "columns": len(df.columns)}
+        else:
+            print(f" -> FAILED to load data into {table_name}.")
+            results[table_name] = {"rows_loaded": 0, "error": "write_pandas failed"}
+    return results
+
+
+def _ensure_manifest(cur):
+    """Creates the processed-files manifest and the ID counter table if they do not exist yet."""
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{MANIFEST_TABLE}" (
+          "STAGE_NAME" VARCHAR,
+          "FILE_NAME" VARCHAR,
+          "FILE_MD5" VARCHAR,
+          "FILE_SIZE" NUMBER,
+          "ROOT_TABLE" VARCHAR,
+          "LOADED_AT" TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+        )""")
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{ID_COUNTER_TABLE}" (
+          "TABLE_NAME" VARCHAR,
+          "LAST_ID" NUMBER,
+          "UPDATED_AT" TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+        )""")
+
+def _processed_files(cur, stage_name: str, root_table: str) -> set:
+    """Returns (file name, md5, size) of every file already loaded from this stage into this root table."""
+    cur.execute(
+        f'SELECT "FILE_NAME", "FILE_MD5", "FILE_SIZE" FROM "{MANIFEST_TABLE}" WHERE "STAGE_NAME" = %s AND "ROOT_TABLE" = %s',
+        (stage_name, root_table),
+    )
+    return {(name, md5, int(size)) for name, md5, size in cur.fetchall()}
+
+def _record_processed_files(cur, stage_name: str, root_table: str, files: List[Dict[str, Any]]):
+    cur.executemany(
+        f'INSERT INTO "{MANIFEST_TABLE}" ("STAGE_NAME", "FILE_NAME", "FILE_MD5", "FILE_SIZE", "ROOT_TABLE") VALUES (%s, %s, %s, %s, %s)',
+        [(stage_name, f["name"], f["md5"], f["size"], root_table) for f in files],
+    )
+
+def _id_counters(cur, table_names: List[str]) -> Dict[str, int]:
+    """
+    The last ID earlier incremental runs handed out per table. It can be above the table's
+    MAX(ID): a nested array takes an ID in its array table but has no row there, only _ITEM
+    rows pointing at it, so counting on from MAX(ID) would hand that ID out again.
+    """
+    if not table_names:
+        return {}
+    placeholders = ", ".join(["%s"] * len(table_names))
+    cur.execute(f'SELECT "TABLE_NAME", "LAST_ID" FROM "{ID_COUNTER_TABLE}" WHERE "TABLE_NAME" IN ({placeholders})', tuple(table_names))
+    return {table: int(last_id) for table, last_id in cur.fetchall()}
+
+def _save_id_counters(cur, counters: Dict[str, int]):
+    if not counters:
+        return
+    cur.execute(f"""
+        MERGE INTO "{ID_COUNTER_TABLE}" c
+        USING (SELECT column1 AS "TABLE_NAME", column2 AS "LAST_ID" FROM VALUES {", ".join(["(%s, %s)"] * len(counters))}) v
+        ON c."TABLE_NAME" = v."TABLE_NAME"
+        WHEN MATCHED THEN UPDATE SET c."LAST_ID" = v."LAST_ID", c."UPDATED_AT" = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT ("TABLE_NAME", "LAST_ID") VALUES (v."TABLE_NAME", v."LAST_ID")""",
+        tuple(x for item in counters.items() for x in item))
+
+def _existing_tables(cur, schema: str, table_names: List[str]) -> Tuple[Dict[str, set], Dict[str, int]]:
+    """
+    Looks up which of the given tables already exist, returning their columns and
+    their current MAX(ID) so that appended rows continue the ID sequence.
+    """
+    if not table_names:
+        return {}, {}
+    placeholders = ", ".join(["%s"] * len(table_names))
+    cur.execute(
+        f"SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders})",
+        (schema, *table_names),
+    )
+    existing_columns: Dict[str, set] = defaultdict(set)
+    for table, col in cur.fetchall():
+        existing_columns[table].add(col)
+    max_ids = {}
+    if existing_columns:
+        cur.execute(" UNION ALL ".join(
+            f"SELECT '{table}', COALESCE(MAX(\"ID\"), 0) FROM \"{table}\"" for table in existing_columns
+        ))
+        max_ids = {table: int(max_id) for table, max_id in cur.fetchall()}
+    return dict(existing_columns), max_ids
+
+
 def process_json_from_stage_to_snowflake(
     stage_name: str,
-    file_path_in_stage: str, config:dict
+    file_path_in_stage: str, config:dict,
+    incremental: bool = False,
+    json_schema: Dict[str, Any] = None,
+    dedup: bool = False,
 ) -> Dict[str, Dict[str, Any]]:
     """
     Downloads a JSON file from a stage, normalizes it, and loads it into Snowflake tables.
+    With `incremental=True` the file goes through the manifest-tracked append path of
+    process_stage_files_to_snowflake instead of replacing the tables.
 
     Args:
         conn_params: Dictionary of connection parameters for Snowflake.
@@ -225,10 +1126,24 @@ def process_json_from_stage_to_snowflake(
         schema: The target schema.
         stage_name: The internal stage name (e.g., '@MY_STAGE').
         file_path_in_stage: The relative path to the JSON file in the stage.
+        incremental: Append to the existing tables, skipping the file if already loaded.
+        json_schema: Optional JSON Schema of one record; enables the SchemaNormalizer fast path.
+        dedup: Store identical nested objects once, referenced from their parent rows.
 
     Returns:
         A dictionary with results for each table created.
     """
+    if incremental:
+        return process_stage_files_to_snowflake(
+            stage_name, config,
+            file_paths=[file_path_in_stage],
+            root_name=json_file_stem(file_path_in_stage),
+            max_workers=1,
+            incremental=True,
+            json_schema=json_schema,
+            dedup=dedup,
+        )
+
     results = {}
     with tempfile.TemporaryDirectory() as temp_dir:
         # --- FIX STARTS HERE ---
@@ -247,78 +1162,566 @@ def process_json_from_stage_to_snowflake(
 
             cur.execute(f'USE DATABASE "{SNOWFLAKE_CONFIG["database"]}"')
             cur.execute(f'USE SCHEMA "{SNOWFLAKE_CONFIG["schema"]}"')
-            print(f"Using database '{SNOWFLAKE_CONFIG["database"]}' and schema '{SNOWFLAKE_CONFIG["schema"]}'.")
+            print(f"Using database '{SNOWFLAKE_CONFIG['database']}' and schema '{SNOWFLAKE_CONFIG['schema']}'.")
+
+
+            print(f"Downloading '{os.path.basename(file_path_in_stage)}' from stage '{stage_name}'...")
+            cache = _download_cache(config)
+            listed = []
+            if cache:
+                # LIST on the file's own path gives the md5 the cache is keyed on
+                listed = [f for f in _list_stage_files(cur, f"{stage_name}/{file_path_in_stage}")
+                          if os.path.basename(f["name"]) == os.path.basename(file_path_in_stage)]
+            if listed:
+                local_file_path = cache.fetch(cur, stage_name, file_path_in_stage, listed[0]["md5"],
+                                              pathlib.Path(temp_dir))
+            else:
+                local_file_path = _get_stage_file(cur, stage_name, file_path_in_stage, pathlib.Path(temp_dir))
+
+            # 2. Stream, decompress and normalize the JSON data
+            root_name = sanitize_name(json_file_stem(file_path_in_stage))
+            norm = _make_normalizer(root_name, json_schema, dedup)
+            norm.process(iter_json_records(local_file_path))
+            if not norm.id_counters.get(root_name):
+                print("JSON file is empty. Nothing to process.")
+                return {}
+            print(f"Normalized JSON into {len(norm.tables)} tables.")
+
+            # 3. Create tables and load data into Snowflake
+            results = _load_tables(conn, cur, norm.tables, table_columns=getattr(norm, 'table_columns', None))
+
+        except snowflake.connector.Error as e:
+            print(f"Snowflake Error: {e}")
+            raise
+        finally:
+            if 'cur' in locals() and cur: cur.close()
+            if conn: conn.close()
+            print("Snowflake connection closed.")
+
+    return results
 
+# -----------------------
+# Streaming loader: types inferred from a sample, widened as later batches need it
+# -----------------------
+class StreamingTableLoader:
+    """
+    Loads normalized rows batch by batch into tables whose layout comes from the first
+    batch (the sample). Later batches append to the tables; columns seen for the first
+    time are added with ALTER TABLE ADD COLUMN, and a column whose values no longer fit
+    its type is widened (see widen_column_type).
 
-            temp_path_obj = pathlib.Path(temp_dir).resolve()
-            
-            # 2. Convert to a POSIX-style path for the GET command.
-            download_dir_for_snowflake = temp_path_obj.as_posix()
-            
-            local_file_path = temp_path_obj / os.path.basename(file_path_in_stage)
+    Snowflake's ALTER COLUMN ... SET DATA TYPE cannot change the type family
+    (NUMBER -> FLOAT, anything -> VARCHAR), so a widened column is swapped: a new column
+    is added, filled with the cast values, and renamed over the old one.
+    Columns that are NULL in every row so far get a type only once a value shows up
+    (or VARCHAR in finish(), like the non-streaming path).
 
-            # 3. Construct the GET command
-            get_sql = f"GET {stage_name}/{file_path_in_stage} file://{download_dir_for_snowflake}"
+    load_batch() may run on a worker thread, so progress messages are collected in
+    `log` and printed by the caller (see flush_log).
+    """
+    def __init__(self, conn, cur):
+        self.conn = conn
+        self.cur = cur
+        self.layout: Dict[str, Dict[str, str]] = {}  # table -> column -> type, as created
+        self.null_columns: Dict[str, set] = defaultdict(set)
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.log: List[str] = []
 
-            # # 4. !! CRITICAL DEBUG STEP !! Print the exact command before executing it.
-            # print("\n" + "="*20 + " DEBUGGING " + "="*20)
-            # print(f"Temporary directory created: {temp_dir}")
-            # print(f"Resolved path for Snowflake: {download_dir_for_snowflake}")
-            # print(f"Executing SQL command: {get_sql}")
-            # print("="*53 + "\n")
+    def load_batch(self, tables: Dict[str, List[Dict[str, Any]]]):
+        for table_name, rows in tables.items():
+            if rows:
+                self._sync_layout(table_name, rows)
+                self._append(table_name, rows)
 
-            print(f"Downloading '{os.path.basename(file_path_in_stage)}' from stage '{stage_name}'...")
-            cur.execute(get_sql) 
+    def finish(self) -> Dict[str, Dict[str, Any]]:
+        """Adds the columns that never held a value, as VARCHAR, and returns the per-table results."""
+        for table_name, cols in self.null_columns.items():
+            for col in sorted(cols - self.layout[table_name].keys()):
+                self._execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{col}" VARCHAR')
+                self.layout[table_name][col] = 'VARCHAR'
+        for table_name, info in self.results.items():
+            info["columns"] = len(self.layout[table_name])
+        self.flush_log()
+        return self.results
 
-            # print(f"Downloaded to temporary file: {local_file_path}")
+    def flush_log(self):
+        for line in self.log:
+            print(line)
+        self.log = []
 
+    def _execute(self, sql: str):
+        self.log.append(f" -> Executing: {sql}")
+        self.cur.execute(sql)
 
-            # 2. Load and normalize the JSON data
-            records = load_json_from_local_file(local_file_path)
-            if not records:
+    def _sync_layout(self, table_name: str, rows: List[Dict[str, Any]]):
+        batch_types = {}
+        for col in set().union(*(r.keys() for r in rows)):
+            values = [v for v in (r.get(col) for r in rows) if v is not None]
+            if values:
+                batch_types[col] = infer_column_type(values)
+            else:
+                self.null_columns[table_name].add(col)
+
+        layout = self.layout.get(table_name)
+        if layout is None:
+            cols = [(c, batch_types[c]) for c in _column_order(batch_types)]
+            ddl = create_table_sql(table_name, cols)
+            self.log.append(f"\nProcessing table: {table_name}\n -> Executing DDL (inferred from sample):\n{ddl}")
+            self.cur.execute(ddl)
+            self.layout[table_name] = dict(cols)
+            return
+
+        for col in _column_order(batch_types):
+            seen = batch_types[col]
+            current = layout.get(col)
+            if current is None:
+                self.log.append(f" -> New key found in '{table_name}'.")
+                self._execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{col}" {seen}')
+                layout[col] = seen
+                continue
+            wider = widen_column_type(current, seen)
+            if wider != current:
+                self.log.append(f" -> Widening '{table_name}.{col}' from {current} to {wider}.")
+                swap = f"{col}__WIDEN"
+                self._execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{swap}" {wider}')
+                self._execute(f'UPDATE "{table_name}" SET "{swap}" = "{col}"::{wider}')
+                self._execute(f'ALTER TABLE "{table_name}" DROP COLUMN "{col}"')
+                self._execute(f'ALTER TABLE "{table_name}" RENAME COLUMN "{swap}" TO "{col}"')
+                layout[col] = wider
+
+    def _append(self, table_name: str, rows: List[Dict[str, Any]]):
+        df = pd.DataFrame(rows, columns=list(self.layout[table_name]))
+        self.log.append(f" -> Loading {len(df)} rows into '{table_name}'...")
+        success, nchunks, nrows, _ = write_pandas(self.conn, df, table_name, auto_create_table=False, overwrite=False)
+        info = self.results.setdefault(table_name, {"rows_loaded": 0})
+        if success:
+            info["rows_loaded"] += nrows
+        else:
+            self.log.append(f" -> FAILED to load data into {table_name}.")
+            info["error"] = "write_pandas failed"
+
+def _iter_batches(records: Iterable[Any], first: int, size: int) -> Iterator[List[Any]]:
+    """Chunks `records` into lists: `first` records, then `size` at a time."""
+    batch, limit = [], first
+    for rec in records:
+        batch.append(rec)
+        if len(batch) == limit:
+            yield batch
+            batch, limit = [], size
+    if batch:
+        yield batch
+
+def process_json_streaming_to_snowflake(
+    stage_name: str,
+    file_path_in_stage: str,
+    config: dict,
+    sample_records: int = 10_000,
+    batch_records: int = 50_000,
+    dedup: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Like process_json_from_stage_to_snowflake, for files too big to normalize in one go:
+    the table layout is inferred from the first `sample_records` records and loading
+    starts right away, `batch_records` at a time. Each batch is loaded on a background
+    thread while the next one is parsed and normalized, so at most two batches of rows
+    are held in memory. IDs and FKs continue across batches; the tables are replaced.
+
+    Args:
+        stage_name: The internal stage name (e.g., '@MY_STAGE').
+        file_path_in_stage: The relative path to the JSON file in the stage.
+        config: App config holding 'SNOWFLAKE_CONFIG'.
+        sample_records: Records in the first batch, from which the DDL is inferred.
+        batch_records: Records per later batch.
+        dedup: Store identical nested objects once, referenced from their parent rows.
+
+    Returns:
+        A dictionary with results for each table created.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        conn = None
+        cur = None
+        try:
+            SNOWFLAKE_CONFIG = config.get('SNOWFLAKE_CONFIG')
+            conn = snowflake.connector.connect(**SNOWFLAKE_CONFIG)
+            cur = conn.cursor()
+            print("Successfully connected to Snowflake.")
+
+            cur.execute(f'USE DATABASE "{SNOWFLAKE_CONFIG["database"]}"')
+            cur.execute(f'USE SCHEMA "{SNOWFLAKE_CONFIG["schema"]}"')
+
+            print(f"Downloading '{os.path.basename(file_path_in_stage)}' from stage '{stage_name}'...")
+            cache = _download_cache(config)
+            listed = []
+            if cache:
+                listed = [f for f in _list_stage_files(cur, f"{stage_name}/{file_path_in_stage}")
+                          if os.path.basename(f["name"]) == os.path.basename(file_path_in_stage)]
+            if listed:
+                local_file_path = cache.fetch(cur, stage_name, file_path_in_stage, listed[0]["md5"],
+                                              pathlib.Path(temp_dir))
+            else:
+                local_file_path = _get_stage_file(cur, stage_name, file_path_in_stage, pathlib.Path(temp_dir))
+
+            root_name = sanitize_name(json_file_stem(file_path_in_stage))
+            norm = _make_normalizer(root_name, dedup=dedup)
+            loader = StreamingTableLoader(conn, cur)
+            pending = None
+            with ThreadPoolExecutor(max_workers=1) as load_thread:
+                for n, batch in enumerate(_iter_batches(iter_json_records(local_file_path), sample_records, batch_records), 1):
+                    norm.process(batch)
+                    tables, norm.tables = norm.tables, defaultdict(list)
+                    if pending:
+                        pending.result()  # keeps DDL in order and memory at two batches
+                        loader.flush_log()
+                    print(f"Batch {n}: normalized {len(batch)} records into {len(tables)} tables.")
+                    pending = load_thread.submit(loader.load_batch, tables)
+                if pending:
+                    pending.result()
+                    loader.flush_log()
+
+            if not norm.id_counters.get(root_name):
                 print("JSON file is empty. Nothing to process.")
                 return {}
+            return loader.finish()
 
-            root_name = sanitize_name(os.path.splitext(os.path.basename(file_path_in_stage))[0])
-            norm = Normalizer(root_name=root_name)
-            norm.process(records)
-            print(f"Normalized JSON into {len(norm.tables)} tables.")
+        except snowflake.connector.Error as e:
+            print(f"Snowflake Error: {e}")
+            raise
+        finally:
+            if cur: cur.close()
+            if conn: conn.close()
+            print("Snowflake connection closed.")
 
-            # 3. Create tables and load data into Snowflake
-            for table_name, rows in norm.tables.items():
-                print(f"\nProcessing table: {table_name}")
-                if not rows:
-                    print(f" -> No data for table '{table_name}'. Skipping.")
-                    continue
-                
-                ddl = generate_ddl(table_name, rows)
-                print(f" -> Executing DDL:\n{ddl}")
-                cur.execute(ddl)
-                
-                df = pd.DataFrame(rows)
-                ddl_cols = [c.strip().split()[0].strip('"') for c in ddl.splitlines()[1:-1]]
-                df = df[ddl_cols]
-                
-                print(f" -> Loading {len(df)} rows into '{table_name}'...")
-                success, nchunks, nrows, _ = write_pandas(
-                    conn,
-                    df,
-                    table_name,
-                    auto_create_table=False,
-                    overwrite=True,
-                )
-                if success:
-                    print(f" -> Successfully loaded {nrows} rows.")
-                    results[table_name] = {"rows_loaded": nrows, "columns": len(df.columns)}
+# -----------------------
+# Server-side pushdown engine: same tables as the Normalizer, built inside Snowflake
+# -----------------------
+PUSHDOWN_FILE_FORMAT = 'JSON_PUSHDOWN_FORMAT'
+PUSHDOWN_LANDING_TABLE = '_PD_LANDING'
+
+def discover_pushdown_layout(records: List[Any], root_name: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Walks (sample) records with the same naming rules as the Normalizer and returns, per
+    table and parents first, how its rows are reached from the rows of its parent table:
+
+      {'parent': parent table or None,
+       'kind': 'root' | 'object' | 'array',
+       'key': JSON key holding the object/array (None = the parent value itself),
+       'columns': {column: JSON key of a primitive value},
+       'value': True if primitive elements land in a VALUE column}
+    """
+    root_name = sanitize_name(root_name)
+    layout: Dict[str, Dict[str, Any]] = {}
+
+    def node(table, parent, kind, key):
+        return layout.setdefault(table, {'parent': parent, 'kind': kind, 'key': key, 'columns': {}, 'value': False})
+
+    def add_columns(entry, obj):
+        for k, v in obj.items():
+            if v is None or isinstance(v, (str, int, float, bool)):
+                entry['columns'].setdefault(sanitize_name(k), k)
+
+    def walk_object(obj, table):
+        for k, v in obj.items():
+            if isinstance(v, dict):
+                child = f"{table}_{sanitize_name(k)}"
+                add_columns(node(child, table, 'object', k), v)
+                walk_object(v, child)
+            elif isinstance(v, list):
+                walk_array(v, sanitize_name(f"{table}_{sanitize_name(k)}"), table, k)
+
+    def walk_array(arr, table, parent, key):
+        entry = node(table, parent, 'array', key)
+        for elem in arr:
+            if isinstance(elem, dict):
+                add_columns(entry, elem)
+                walk_object(elem, table)
+            elif isinstance(elem, list):
+                walk_array(elem, sanitize_name(f"{table}_ITEM"), table, None)
+            else:
+                entry['value'] = True
+
+    root = node(root_name, None, 'root', None)
+    for rec in records:
+        if isinstance(rec, dict):
+            add_columns(root, rec)
+            walk_object(rec, root_name)
+        elif isinstance(rec, list):
+            walk_array(rec, sanitize_name(f"{root_name}_ARRAY"), root_name, None)
+        else:
+            root['value'] = True
+    return layout
+
+def _variant_get(expr: str, key: str) -> str:
+    return expr if key is None else f"GET({expr}, '{key.replace(chr(39), chr(39) * 2)}')"
+
+def _scalar(expr: str, col_type: str) -> str:
+    # The Normalizer only keeps primitives in a row; nested values become child tables
+    return f"IFF(IS_OBJECT({expr}) OR IS_ARRAY({expr}), NULL, {expr})::{col_type}"
+
+def generate_pushdown_sql(layout: Dict[str, Dict[str, Any]], stage_file: str,
+                          table_columns: Dict[str, List[Tuple[str, str]]]) -> List[str]:
+    """
+    Generates the statements that rebuild the Normalizer output inside Snowflake:
+    COPY the file into a VARIANT landing table, derive one temporary work table
+    (ID, PARENT_ID, V) per layout table with ROW_NUMBER() IDs and LATERAL FLATTEN for
+    arrays, then CREATE and INSERT ... SELECT each target table.
+
+    IDs are numbered in parent-ID then array-index order, which is the order the
+    Normalizer assigns them in. `table_columns` holds the (column, type) pairs of
+    each target table, as returned by column_types().
+    """
+    def work(table):
+        return f'"_PD_{table}"'
+
+    statements = [
+        f'CREATE OR REPLACE TEMPORARY TABLE "{PUSHDOWN_LANDING_TABLE}" ("SEQ" NUMBER, "V" VARIANT)',
+        f'COPY INTO "{PUSHDOWN_LANDING_TABLE}" ("SEQ", "V") '
+        f'FROM (SELECT METADATA$FILE_ROW_NUMBER, $1 FROM {stage_file}) '
+        f"FILE_FORMAT = (FORMAT_NAME = '{PUSHDOWN_FILE_FORMAT}') FORCE = TRUE",
+    ]
+    for table, entry in layout.items():
+        if entry['kind'] == 'root':
+            select = (f'SELECT ROW_NUMBER() OVER (ORDER BY "SEQ") AS "ID", NULL AS "PARENT_ID", "V" '
+                      f'FROM "{PUSHDOWN_LANDING_TABLE}"')
+        elif entry['kind'] == 'object':
+            value = _variant_get('p."V"', entry['key'])
+            select = (f'SELECT ROW_NUMBER() OVER (ORDER BY p."ID") AS "ID", p."ID" AS "PARENT_ID", {value} AS "V" '
+                      f'FROM {work(entry["parent"])} p WHERE IS_OBJECT({value})')
+        else:
+            value = _variant_get('p."V"', entry['key'])
+            select = (f'SELECT ROW_NUMBER() OVER (ORDER BY p."ID", f."INDEX") AS "ID", p."ID" AS "PARENT_ID", f."VALUE" AS "V" '
+                      f'FROM {work(entry["parent"])} p, LATERAL FLATTEN(INPUT => IFF(IS_ARRAY({value}), {value}, NULL)) f')
+        statements.append(f"CREATE OR REPLACE TEMPORARY TABLE {work(table)} AS {select}")
+
+    for table, cols in table_columns.items():
+        entry = layout[table]
+        fk_col = f"{entry['parent']}_ID" if entry['parent'] else None
+        exprs = []
+        for col, col_type in cols:
+            if col == 'ID':
+                exprs.append('"ID"')
+            elif col == fk_col:
+                exprs.append('"PARENT_ID"')
+            elif col in entry['columns']:
+                exprs.append(_scalar(_variant_get('"V"', entry['columns'][col]), col_type))
+            elif col == 'VALUE' and entry['value']:
+                exprs.append(_scalar('"V"', col_type))
+            else:
+                exprs.append(f'NULL::{col_type}')
+        col_list = ", ".join(f'"{c}"' for c, _ in cols)
+        # Nested arrays have no row of their own in the array table, only in its _ITEM table
+        where = ' WHERE NOT IS_ARRAY("V")' if entry['kind'] == 'array' else ''
+        statements.append(create_table_sql(table, cols))
+        statements.append(f'INSERT INTO "{table}" ({col_list}) SELECT {", ".join(exprs)} FROM {work(table)}{where}')
+    return statements
+
+def process_json_pushdown_to_snowflake(
+    stage_name: str,
+    file_path_in_stage: str,
+    config: dict,
+    sample_size: int = 1000,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Server-side alternative to process_json_from_stage_to_snowflake for very large files.
+
+    Only the first `sample_size` records are pulled to the client, to discover the tables
+    and column types the Normalizer would produce. The full file is then loaded into a
+    VARIANT landing table and normalized inside Snowflake with LATERAL FLATTEN, giving the
+    same tables, columns, IDs and parent FKs as the client-side engine. Keys that never
+    appear in the sample are not loaded, so the sample must cover the feed's shape.
+
+    Returns:
+        A dictionary with results for each table created.
+    """
+    results = {}
+    conn = None
+    cur = None
+    try:
+        SNOWFLAKE_CONFIG = config.get('SNOWFLAKE_CONFIG')
+        conn = snowflake.connector.connect(**SNOWFLAKE_CONFIG)
+        cur = conn.cursor()
+        print("Successfully connected to Snowflake.")
+
+        cur.execute(f'USE DATABASE "{SNOWFLAKE_CONFIG["database"]}"')
+        cur.execute(f'USE SCHEMA "{SNOWFLAKE_CONFIG["schema"]}"')
+        cur.execute(f"CREATE OR REPLACE TEMPORARY FILE FORMAT {PUSHDOWN_FILE_FORMAT} TYPE = JSON STRIP_OUTER_ARRAY = TRUE")
+
+        stage_file = _stage_file_path(stage_name, file_path_in_stage)
+        print(f"Sampling up to {sample_size} records of '{stage_file}'...")
+        cur.execute(f"SELECT $1 FROM {stage_file} (FILE_FORMAT => '{PUSHDOWN_FILE_FORMAT}') LIMIT {int(sample_size)}")
+        records = [json.loads(row[0]) for row in cur.fetchall()]
+        if not records:
+            print("JSON file is empty. Nothing to process.")
+            return {}
+
+        root_name = sanitize_name(json_file_stem(file_path_in_stage))
+        norm = Normalizer(root_name=root_name)
+        norm.process(records)
+        layout = discover_pushdown_layout(records, root_name)
+        table_columns = {t: column_types(rows) for t, rows in norm.tables.items() if rows}
+        print(f"Sample maps to {len(table_columns)} tables. Normalizing inside Snowflake...")
+
+        for sql in generate_pushdown_sql(layout, stage_file, table_columns):
+            print(f" -> Executing: {sql}")
+            cur.execute(sql)
+            if sql.startswith('INSERT INTO'):
+                table_name = sql.split('"')[1]
+                print(f" -> Loaded {cur.rowcount} rows into '{table_name}'.")
+                results[table_name] = {"rows_loaded": cur.rowcount, "columns": len(table_columns[table_name])}
+
+        for table in [PUSHDOWN_LANDING_TABLE] + [f"_PD_{t}" for t in layout]:
+            cur.execute(f'DROP TABLE IF EXISTS "{table}"')
+
+    except snowflake.connector.Error as e:
+        print(f"Snowflake Error: {e}")
+        raise
+    finally:
+        if cur: cur.close()
+        if conn: conn.close()
+        print("Snowflake connection closed.")
+
+    return results
+
+
+def _make_normalizer(root_name: str, json_schema: Dict[str, Any] = None, dedup: bool = False) -> Normalizer:
+    if json_schema and dedup:
+        raise ValueError("Deduplicating nested objects is not supported together with a JSON Schema plan.")
+    return SchemaNormalizer(json_schema, root_name=root_name) if json_schema else Normalizer(root_name=root_name, dedup=dedup)
+
+def _normalize_local_file(local_path: str, root_name: str, json_schema: Dict[str, Any] = None,
+                          dedup: bool = False) -> Normalizer:
+    """Process-pool worker: parses and normalizes one downloaded file."""
+    norm = _make_normalizer(root_name, json_schema, dedup)
+    norm.process(iter_json_records(local_path))
+    return norm
+
+
+def process_stage_files_to_snowflake(
+    stage_name: str,
+    config: dict,
+    pattern: str = None,
+    root_name: str = None,
+    max_workers: int = None,
+    incremental: bool = False,
+    json_schema: Dict[str, Any] = None,
+    dedup: bool = False,
+    file_paths: List[str] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Batch mode: downloads every JSON file in the stage (or those matching `pattern`, or the
+    `file_paths`),
+    normalizes them in parallel in a process pool, and loads the merged result with
+    one load per table.
+
+    All files share one root table (`root_name`, defaulting to the stage name) and one
+    ID sequence per table: each file is normalized on its own, then merged in LIST
+    order with its IDs shifted past those of the previous files.
+
+    With `incremental=True` the tables are appended to instead of replaced: files
+    already recorded in the JSON_LOAD_MANIFEST table with the same LIST md5 and size
+    are skipped, IDs continue from the last ID of each table recorded in JSON_LOAD_ID_COUNTERS
+    (or its MAX(ID), if higher), new keys are added with ALTER TABLE ADD COLUMN, and the
+    loaded files and the new last IDs are recorded.
+
+    With `dedup=True` identical nested objects are stored once across the whole batch
+    (see Normalizer); in incremental mode they are not matched against rows loaded by
+    earlier runs.
+
+    Args:
+        stage_name: The internal stage name (e.g., '@MY_STAGE').
+        config: App config holding 'SNOWFLAKE_CONFIG'.
+        pattern: Optional filename glob, e.g. 'orders_*.json'.
+        root_name: Name of the shared root table.
+        max_workers: Process pool size (defaults to the CPU count).
+        incremental: Append only the files not loaded yet instead of replacing the tables.
+        json_schema: Optional JSON Schema of one record; enables the SchemaNormalizer fast path.
+        dedup: Store identical nested objects once, referenced from their parent rows.
+        file_paths: Only these files, given relative to the stage or as LIST names them.
+
+    Returns:
+        A dictionary with results for each table created.
+    """
+    results = {}
+    root_name = sanitize_name(root_name or stage_name.split('.')[-1])
+    with tempfile.TemporaryDirectory() as temp_dir:
+        conn = None
+        cur = None
+        try:
+            SNOWFLAKE_CONFIG = config.get('SNOWFLAKE_CONFIG')
+            conn = snowflake.connector.connect(**SNOWFLAKE_CONFIG)
+            cur = conn.cursor()
+            print("Successfully connected to Snowflake.")
+
+            cur.execute(f'USE DATABASE "{SNOWFLAKE_CONFIG["database"]}"')
+            cur.execute(f'USE SCHEMA "{SNOWFLAKE_CONFIG["schema"]}"')
+
+            stage_files = _list_stage_files(cur, stage_name, pattern)
+            if file_paths is not None:
+                # Whole paths: the same file name can sit in several folders of the stage
+                wanted = {_stage_file_path(stage_name, path) for path in file_paths}
+                stage_files = [f for f in stage_files if _stage_file_path(stage_name, f["name"]) in wanted]
+            if incremental:
+                _ensure_manifest(cur)
+                processed = _processed_files(cur, stage_name, root_name)
+                stage_files = [f for f in stage_files if (f["name"], f["md5"], int(f["size"])) not in processed]
+            if not stage_files:
+                print(f"No {'new ' if incremental else ''}JSON files matching '{pattern or '*'}' in stage '{stage_name}'. Nothing to process.")
+                return {}
+            # Paths relative to the stage root, so files of different subfolders stay apart
+            file_names = [_stage_relative_path(stage_name, f["name"]) for f in stage_files]
+            print(f"Found {len(file_names)} JSON file(s) to process into root table '{root_name}'.")
+
+            cache = _download_cache(config)
+            local_paths = []
+            stage_root = _stage_root(stage_name)
+            for f, file_name in zip(stage_files, file_names):
+                print(f"Downloading '{file_name}' from stage '{stage_name}'...")
+                if cache:
+                    local_paths.append(str(cache.fetch(cur, stage_root, file_name, f["md5"], pathlib.Path(temp_dir))))
                 else:
-                    print(f" -> FAILED to load data into {table_name}.")
-                    results[table_name] = {"rows_loaded": 0, "error": "write_pandas failed"}
+                    local_paths.append(str(_get_stage_file(cur, stage_root, file_name, pathlib.Path(temp_dir))))
+
+            # Normalization is CPU-bound, so it runs in worker processes; map() keeps
+            # the LIST order so the merged IDs are deterministic.
+            norm = _make_normalizer(root_name, json_schema, dedup)
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                file_norms = pool.map(_normalize_local_file, local_paths, [root_name] * len(local_paths),
+                                      [json_schema] * len(local_paths), [dedup] * len(local_paths))
+                for file_name, file_norm in zip(file_names, file_norms):
+                    print(f"Normalized '{file_name}' into {len(file_norm.tables)} tables.")
+                    norm.merge(file_norm)
+
+            print(f"Merged {len(file_names)} file(s) into {len(norm.tables)} tables.")
+            table_columns = getattr(norm, 'table_columns', None)
+
+            if not incremental:
+                if not any(norm.tables.values()):
+                    print("All JSON files are empty. Nothing to process.")
+                    return {}
+                results = _load_tables(conn, cur, norm.tables, table_columns=table_columns)
+            else:
+                table_names = list(dict.fromkeys([*norm.tables, *norm.id_counters]))
+                existing_columns, max_ids = _existing_tables(cur, SNOWFLAKE_CONFIG["schema"], table_names)
+                # MAX(ID) still counts for tables loaded before the counters were kept, or whose counters were not saved
+                last_ids = _id_counters(cur, table_names)
+                start_ids = {table: max(max_ids.get(table, 0), last_ids.get(table, 0)) for table in {*max_ids, *last_ids}}
+                for table, last_id in start_ids.items():
+                    print(f"Table '{table}' exists; new IDs continue after {last_id}.")
+                # Shift the whole batch past the IDs already handed out
+                appended = Normalizer(root_name=root_name)
+                appended.id_counters.update(start_ids)
+                appended.merge(norm)
+                results = _load_tables(conn, cur, appended.tables, existing_columns=existing_columns,
+                                       table_columns=table_columns)
+                if not any("error" in r for r in results.values()):
+                    _record_processed_files(cur, stage_name, root_name, stage_files)
+                    _save_id_counters(cur, dict(appended.id_counters))
+                    print(f"Recorded {len(stage_files)} file(s) in manifest '{MANIFEST_TABLE}' and the last IDs in '{ID_COUNTER_TABLE}'.")
 
         except snowflake.connector.Error as e:
             print(f"Snowflake Error: {e}")
             raise
         finally:
-            if 'cur' in locals() and cur: cur.close()
+            if cur: cur.close()
             if conn: conn.close()
             print("Snowflake connection closed.")
 
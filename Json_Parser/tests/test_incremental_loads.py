@@ -0,0 +1,101 @@
+import hashlib
+import json
+import re
+import shutil
+
+import pytest
+
+from Json_Parser import json_to_snowflake
+
+
+class SnowflakeCursor:
+    """Answers the statements of an incremental load from memory; the stage is a local directory."""
+
+    def __init__(self, stage_dir):
+        self.stage_dir = stage_dir
+        self.tables = {}
+        self.manifest = []
+        self.id_counters = {}
+        self.result = []
+
+    def execute(self, sql, params=()):
+        sql = sql.strip()
+        self.result = []
+        if sql.startswith("LIST"):
+            self.result = [(f"json_stage/{p.relative_to(self.stage_dir).as_posix()}", p.stat().st_size,
+                            hashlib.md5(p.read_bytes()).hexdigest(), None)
+                           for p in sorted(self.stage_dir.rglob("*.json"))]
+        elif sql.startswith("GET"):
+            path, target = re.match(r"GET @\w+/(\S+) file://(\S+)", sql).groups()
+            shutil.copy(self.stage_dir / path, target)
+        elif sql.startswith('SELECT "FILE_NAME"'):
+            self.result = [(name, md5, size) for stage, name, md5, size, root in self.manifest if (stage, root) == params]
+        elif sql.startswith("SELECT TABLE_NAME, COLUMN_NAME"):
+            self.result = [(table, col) for table in params[1:] for col in self.tables.get(table, [[]])[0]]
+        elif "COALESCE(MAX" in sql:
+            self.result = [(table, max(row["ID"] for row in self.tables[table]))
+                           for table in re.findall(r"FROM \"(\w+)\"", sql)]
+        elif sql.startswith('SELECT "TABLE_NAME", "LAST_ID"'):
+            self.result = [(table, self.id_counters[table]) for table in params if table in self.id_counters]
+        elif sql.startswith('MERGE INTO "JSON_LOAD_ID_COUNTERS"'):
+            self.id_counters.update(zip(params[::2], params[1::2]))
+
+    def executemany(self, sql, rows):
+        self.manifest.extend(rows)
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def snowflake(tmp_path, monkeypatch):
+    stage = tmp_path / "stage"
+    cur = SnowflakeCursor(stage)
+    connection = type("Connection", (), {"cursor": lambda self: cur, "close": lambda self: None})()
+    monkeypatch.setattr(json_to_snowflake.snowflake.connector, "connect", lambda **params: connection)
+
+    def load_tables(conn, cur, tables, existing_columns=None, table_columns=None):
+        for table, rows in tables.items():
+            cur.tables.setdefault(table, []).extend(rows)
+        return {table: {"rows": len(rows)} for table, rows in tables.items()}
+
+    monkeypatch.setattr(json_to_snowflake, "_load_tables", load_tables)
+    return stage, cur
+
+
+def load_file(path):
+    config = {"SNOWFLAKE_CONFIG": {"database": "DB", "schema": "SC"}, "DOWNLOAD_CACHE": {"max_bytes": 0}}
+    return json_to_snowflake.process_json_from_stage_to_snowflake("@JSON_STAGE", path, config, incremental=True)
+
+
+def test_single_file_mode_loads_only_the_file_of_its_own_folder(snowflake):
+    stage, cur = snowflake
+    for folder, order_id in (("a", 1), ("b", 2)):
+        (stage / folder).mkdir(parents=True)
+        (stage / folder / "orders.json").write_text(json.dumps({"order": order_id}))
+
+    load_file("json_stage/a/orders.json")
+    assert [row["ORDER"] for row in cur.tables["ORDERS"]] == [1]
+    assert [name for _, name, *_ in cur.manifest] == ["json_stage/a/orders.json"]
+
+    load_file("b/orders.json")
+    assert [row["ORDER"] for row in cur.tables["ORDERS"]] == [1, 2]
+
+
+def test_ids_of_nested_array_elements_are_not_handed_out_again(snowflake):
+    stage, cur = snowflake
+    for year, m in (("2024", [[1, 2], [3]]), ("2025", [[4]])):
+        (stage / year).mkdir(parents=True)
+        (stage / year / "orders.json").write_text(json.dumps({"m": m}))
+
+    # The outer elements of a nested array take ORDERS_M IDs but have no ORDERS_M row
+    load_file("2024/orders.json")
+    assert "ORDERS_M" not in cur.tables
+    assert cur.id_counters["ORDERS_M"] == 2
+
+    load_file("2025/orders.json")
+    assert [row["ORDERS_M_ID"] for row in cur.tables["ORDERS_M_ITEM"]] == [1, 1, 2, 3]
+    assert cur.id_counters == {"ORDERS": 2, "ORDERS_M": 3, "ORDERS_M_ITEM": 4}
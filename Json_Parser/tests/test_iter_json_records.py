@@ -0,0 +1,43 @@
+import gzip
+import json
+
+import pytest
+
+from Json_Parser.json_to_snowflake import JSON_DECODERS, iter_json_records
+
+
+@pytest.fixture(params=list(JSON_DECODERS))
+def decoder(request):
+    return request.param
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    if name.endswith('.gz'):
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('name', ['rows.jsonl', 'rows.jsonl.gz'])
+def test_ndjson_of_arrays_yields_one_record_per_line(tmp_path, decoder, name):
+    path = write(tmp_path, name, '[1,2]\n[3,4]\n')
+    assert list(iter_json_records(path, decoder)) == [[1, 2], [3, 4]]
+
+
+@pytest.mark.parametrize('text', ['[{"a":1},{"a":2}]', '[\n  {"a": 1},\n  {"a": 2}\n]\n', '[{"a":1},\n{"a":2}]'])
+def test_top_level_array_yields_its_elements(tmp_path, decoder, text):
+    path = write(tmp_path, 'rows.json', text)
+    assert list(iter_json_records(path, decoder)) == [{"a": 1}, {"a": 2}]
+
+
+def test_ndjson_of_objects(tmp_path, decoder):
+    path = write(tmp_path, 'rows.jsonl', '\n'.join(json.dumps({"a": i}) for i in range(3)))
+    assert list(iter_json_records(path, decoder)) == [{"a": 0}, {"a": 1}, {"a": 2}]
+
+
+def test_empty_array_then_ndjson_arrays(tmp_path, decoder):
+    path = write(tmp_path, 'rows.jsonl', '[]\n[1]\n')
+    assert list(iter_json_records(path, decoder)) == [[], [1]]
@@ -0,0 +1,116 @@
+import json
+import os
+import pathlib
+import re
+import shutil
+
+from Json_Parser import json_to_snowflake
+from Json_Parser.json_to_snowflake import StageFileCache, _get_stage_file, _stage_file_path, _stage_relative_path
+
+
+def test_stage_relative_path_strips_the_stage_prefix():
+    assert _stage_relative_path('@JSON_STAGE', 'json_stage/2024/orders.json') == '2024/orders.json'
+    assert _stage_relative_path('@DB.SC."JSON_STAGE"/2024', 'json_stage/2024/orders.json') == '2024/orders.json'
+    assert _stage_relative_path('@~', 'orders.json') == 'orders.json'
+
+
+class GetCursor:
+    """Answers GET from a local directory standing in for the stage."""
+
+    def __init__(self, stage_dir):
+        self.stage_dir = stage_dir
+
+    def execute(self, sql):
+        path, target = re.match(r"GET @\w+/(\S+) file://(\S+)", sql).groups()
+        shutil.copy(self.stage_dir / path, target)
+
+
+def test_same_file_name_in_two_folders_is_downloaded_twice(tmp_path):
+    stage = tmp_path / 'stage'
+    for folder in ('a', 'b'):
+        (stage / folder).mkdir(parents=True)
+        (stage / folder / 'orders.json').write_text(json.dumps({"folder": folder}))
+    downloads = tmp_path / 'downloads'
+    cur = GetCursor(stage)
+    paths = [_get_stage_file(cur, '@JSON_STAGE', f'{folder}/orders.json', downloads) for folder in ('a', 'b')]
+    assert paths[0] != paths[1]
+    assert [json.loads(pathlib.Path(p).read_text())["folder"] for p in paths] == ['a', 'b']
+
+
+def test_stage_file_path_keeps_subfolders():
+    assert _stage_file_path('@JSON_STAGE', 'json_stage/2024/01/x.json') == '@JSON_STAGE/2024/01/x.json'
+    assert _stage_file_path('@JSON_STAGE', '2024/01/x.json') == '@JSON_STAGE/2024/01/x.json'
+    assert _stage_file_path('@JSON_STAGE/2024', '01/x.json') == '@JSON_STAGE/2024/01/x.json'
+
+
+class PushdownCursor:
+    """Answers the pushdown engine's sample query and records every statement."""
+
+    def __init__(self):
+        self.statements = []
+        self.rowcount = 1
+
+    def execute(self, sql):
+        self.statements.append(sql)
+
+    def fetchall(self):
+        return [(json.dumps({"id": 1, "items": [{"sku": "a"}]}),)]
+
+    def close(self):
+        pass
+
+
+def test_pushdown_reads_the_file_from_its_stage_subfolder(monkeypatch):
+    cur = PushdownCursor()
+    connection = type("Connection", (), {"cursor": lambda self: cur, "close": lambda self: None})()
+    monkeypatch.setattr(json_to_snowflake.snowflake.connector, "connect", lambda **params: connection)
+    config = {'SNOWFLAKE_CONFIG': {'database': 'DB', 'schema': 'SC'}}
+    json_to_snowflake.process_json_pushdown_to_snowflake('@JSON_STAGE', 'json_stage/2024/01/orders.json', config)
+    reads = [sql for sql in cur.statements if 'orders.json' in sql]
+    assert reads and all('@JSON_STAGE/2024/01/orders.json' in sql for sql in reads)
+
+
+class CountingGetCursor(GetCursor):
+    def __init__(self, stage_dir):
+        super().__init__(stage_dir)
+        self.gets = 0
+
+    def execute(self, sql):
+        self.gets += 1
+        super().execute(sql)
+
+
+def test_cache_hit_does_not_depend_on_the_listed_size(tmp_path):
+    stage = tmp_path / 'stage'
+    stage.mkdir()
+    (stage / 'orders.json').write_text('{"id": 1}')
+    cur = CountingGetCursor(stage)
+    cache = StageFileCache(tmp_path / 'cache', max_bytes=1024)
+    # LIST reports md5 and size of the compressed, encrypted copy on an internal stage
+    paths = [cache.fetch(cur, '@JSON_STAGE', 'orders.json', 'abc123', tmp_path) for _ in range(2)]
+    assert cur.gets == 1 and paths[0] == paths[1]
+
+    paths[0].write_text('{"id"')  # a damaged entry no longer matches its recorded size
+    assert cache.fetch(cur, '@JSON_STAGE', 'orders.json', 'abc123', tmp_path).read_text() == '{"id": 1}'
+    assert cur.gets == 2
+
+
+def test_evict_keeps_counting_entries_it_could_not_delete(tmp_path, monkeypatch):
+    cache = StageFileCache(tmp_path, max_bytes=15)
+    entries = []
+    for age, md5 in enumerate(('c', 'b', 'a')):
+        entry = tmp_path / f'{md5}_10' / 'orders.json'
+        entry.parent.mkdir()
+        entry.write_text('x' * 10)
+        os.utime(entry, (age, age))
+        entries.append(entry)
+    unlink = pathlib.Path.unlink
+
+    def locked_oldest(path, *args, **kwargs):
+        if path == entries[0]:
+            raise PermissionError(path)
+        unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(pathlib.Path, 'unlink', locked_oldest)
+    cache.evict()
+    assert [entry.exists() for entry in entries] == [True, False, False]
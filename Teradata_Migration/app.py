@@ -12,6 +12,8 @@ import configparser
 # --- Local Module Imports ---
 import Teradata_Migration.migrator as migrator
 import Teradata_Migration.snowflake_operations_1 as sf_ops
+import Teradata_Migration.metrics as metrics
+import Teradata_Migration.runner as runner
 
 
 
@@ -65,69 +67,14 @@ class TeradataMigrationApp:
             return []
 
     @staticmethod
-    def connect_to_snowflake(config):
-        try:
-            sf_conn = snowflake.connector.connect(
-                user=config['SNOWFLAKE']['USER'],
-                password=config['SNOWFLAKE']['PASSWORD'],
-                account=config['SNOWFLAKE']['ACCOUNT'],
-                warehouse=config['SNOWFLAKE']['WAREHOUSE'],
-                database=config['SNOWFLAKE']['DATABASE'],
-                schema=config['SNOWFLAKE']['SCHEMA'],
-                role=config['SNOWFLAKE']['ROLE']
-            )
-            return sf_conn, sf_conn.cursor()
-        except Exception as e:
-            print(f"Failed to connect to Snowflake: {e}", file=sys.stderr)
-            return None, None
-
-    @staticmethod
-    def run_migration_for_table_wrapper(config, table_name, database_name, log_stream, migration_details, job_id):
+    def run_migration_for_table_wrapper(config, table_name, database_name, log_stream, migration_details, job_id, catalog=None, load_watcher=None,
+                                        control=None):
         def stream_log_func(message):
             log_stream.write(message + "\n")
 
-        log_stream.write(f"[{table_name}] Wrapper started.\n")
-
-        sf_conn, sf_cursor = None, None
-        audit_id = None
-        migration_result = {}
-        error_message = None
-
-        try:
-            sf_conn, sf_cursor = TeradataMigrationApp.connect_to_snowflake(config)
-            if not sf_conn:
-                raise Exception("Failed to establish Snowflake connection inside the thread.")
-
-            watermark_value = sf_ops.get_last_watermark(sf_cursor, table_name, stream_log_func) if migration_details['type'] == 'Delta Load (Incremental)' else None
-            audit_id = sf_ops.start_audit_log(sf_cursor, job_id, table_name, migration_details['type'], watermark_value)
-
-            migration_result = migrator.migrate_table(config, table_name, database_name, sf_cursor, log_func=stream_log_func, migration_details=migration_details)
-
-            success = migration_result.get("success", False)
-            log_stream.write(f"[{table_name}] Wrapper finished with success={success}.\n")
-            return table_name, success
-
-        except Exception as e:
-            error_message = str(e)
-            log_stream.write(f"[{table_name}] CRITICAL ERROR IN WRAPPER: {e}\n")
-            print(f"[{table_name}] Unhandled exception in wrapper: {e}", file=sys.stderr)
-            return table_name, False
-
-        finally:
-            final_status_for_audit = "SUCCESS" if migration_result.get("success", False) else "FAILED"
-            if sf_cursor:
-                sf_ops.finish_audit_log(
-                    sf_cursor,
-                    audit_id=audit_id,
-                    status=final_status_for_audit,
-                    rows_processed=migration_result.get("rows_processed", 0),
-                    watermark_end=None,
-                    error_message=error_message
-                )
-                sf_cursor.close()
-            if sf_conn:
-                sf_conn.close()
-            log_stream.write(f"[{table_name}] Snowflake connection closed.\n")
+        result = runner.run_table(config, table_name, database_name, stream_log_func, migration_details, job_id,
+                                  catalog=catalog, load_watcher=load_watcher, control=control)
+        return table_name, result["success"]
   
 
     def run(self, config:dict):
@@ -186,7 +133,16 @@ class TeradataMigrationApp:
             with st.sidebar:
                 st.subheader("4. Start Migration")
                 migration_type = st.radio("Select Migration Type", ('Full Load (Replaces table)', 'Delta Load (Incremental)'), key="migration_type_selector")
+                export_engine = st.radio("Export Engine", ('TPT (tbuild)', 'Python (teradatasql)'), key="export_engine_selector",
+                                         help="TPT is used when 'tbuild' is installed; otherwise the Python exporter is used.")
+                full_load_method = st.radio("Full Load Method", ('Snowpipe', 'Direct COPY INTO'), key="full_load_method_selector",
+                                            help="Direct COPY INTO loads synchronously without creating a pipe.") if migration_type == 'Full Load (Replaces table)' else 'Snowpipe'
                 primary_key_column = st.text_input("Enter primary key column name", key="pk_column_input").strip() if migration_type == 'Delta Load (Incremental)' else ""
+                append_only = st.checkbox("Append-only tables (INSERT instead of MERGE)", key="append_only_checkbox",
+                                          help="Skips the deduplicating MERGE for tables whose rows are never updated.") if migration_type == 'Delta Load (Incremental)' else False
+                validate = st.checkbox("Validate against Teradata after load", key="validate_checkbox",
+                                       value=config.getboolean('MIGRATOR', 'VALIDATION', fallback=False),
+                                       help="Compares row counts, column aggregates and key-bucket digests computed on both systems.") if migration_type == 'Full Load (Replaces table)' else False
                 if migration_type == 'Delta Load (Incremental)':
                     st.info("Delta loads require a primary key. Assumes a `last_updated` column exists for tracking.")
                 can_start = st.session_state.selected_tables and not st.session_state.migration_started
@@ -196,9 +152,24 @@ class TeradataMigrationApp:
                 if can_start:
                     if st.button("Start Migration Process", type="primary"):
                         st.session_state.migration_started, st.session_state.job_id = True, str(uuid.uuid4())
-                        st.session_state.migration_details = {"type": migration_type, "tracking_column": "last_updated", "primary_key_column": primary_key_column}
+                        st.session_state.migration_details = {"type": migration_type, "tracking_column": "last_updated", "primary_key_column": primary_key_column,
+                                                            "export_engine": "python" if export_engine.startswith("Python") else "tpt",
+                                                            "full_load_method": "copy" if full_load_method == 'Direct COPY INTO' else "pipe",
+                                                            "append_only": append_only, "validate": validate}
                         st.session_state.migration_logs = {table: StringIO() for table in st.session_state.selected_tables}
                         st.session_state.migration_status = {table: "Pending" for table in st.session_state.selected_tables}
+                        # One catalog snapshot for the whole job instead of a DBC query per table
+                        st.session_state.catalog = migrator.prefetch_teradata_catalog(config, st.session_state.selected_db, st.session_state.selected_tables)
+                        # One watcher polls the Snowpipe loads of all tables together
+                        st.session_state.load_watcher = sf_ops.PipeLoadWatcher(config, lambda: runner.connect_to_snowflake(config))
+                        metrics.start_metrics_server(config)
+                        # Watermarks and audit rows of the whole job go through one batching writer
+                        st.session_state.control = sf_ops.ControlPlaneWriter(config, lambda: runner.connect_to_snowflake(config))
+                        if migration_type == 'Delta Load (Incremental)':
+                            try:
+                                st.session_state.control.load_watermarks(st.session_state.selected_tables)
+                            except Exception as e:
+                                st.warning(f"Could not preload watermarks; they will be read per table: {e}")
                         max_workers = int(config.get('MIGRATOR', 'MAX_MIGRATION_WORKERS', fallback=5))
                         st.session_state.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
                         st.session_state.futures = []
@@ -221,7 +192,8 @@ class TeradataMigrationApp:
                     table_progress_trackers[table]["status_placeholder"].markdown(f"**{table}**: `{st.session_state.migration_status.get(table, 'Pending')}`")
         
                 if not st.session_state.futures and st.session_state.executor:
-                    for table in st.session_state.selected_tables:
+                    # Largest tables first by default; the export/upload/load stages have their own limits in migrator
+                    for table in migrator.schedule_tables(config, st.session_state.selected_tables, st.session_state.get('catalog')):
                         log_stream = st.session_state.migration_logs[table]
                         # --- CRITICAL FIX 2: Pass 'config' as the first argument to the wrapper ---
                         future = st.session_state.executor.submit(
@@ -231,7 +203,10 @@ class TeradataMigrationApp:
                             st.session_state.selected_db,
                             log_stream,
                             st.session_state.migration_details,
-                            st.session_state.job_id
+                            st.session_state.job_id,
+                            st.session_state.get('catalog'),
+                            st.session_state.get('load_watcher'),
+                            st.session_state.get('control')
                         )
                         st.session_state.futures.append((table, future))
         
@@ -264,6 +239,10 @@ class TeradataMigrationApp:
                     if st.session_state.executor:
                         st.session_state.executor.shutdown(wait=True)
                         st.session_state.executor, st.session_state.futures = None, []
+                    if st.session_state.get('control') is not None:
+                        if not st.session_state.control.close():
+                            st.error("Some audit/watermark updates could not be written to MIGRATION_CONTROL. Check the server log.")
+                        st.session_state.control = None
         
                  
                 else:
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+cli.py
+
+Headless runner for Teradata -> Snowflake migrations, for cron jobs and orchestrators.
+Uses the same config sections as the Streamlit app ([TERADATA], [SNOWFLAKE], [AZURE],
+[MIGRATOR]) from an ini file, the same worker pool, scheduling, load watcher and
+control-plane writer, and prints progress to stdout as JSON lines.
+
+Exit codes: 0 all tables migrated, 1 one or more tables (or the audit/watermark writes, or
+listing the tables) failed, 2 bad arguments, config or table selection.
+
+Usage:
+  python -m Teradata_Migration.cli config.ini --database SALES --tables ORDERS,CUSTOMERS
+  python -m Teradata_Migration.cli config.ini --database SALES --pattern 'FACT_*' --validate
+  python -m Teradata_Migration.cli config.ini --database SALES --pattern '*' --mode delta --primary-key ID
+"""
+
+import argparse
+import concurrent.futures
+import configparser
+import datetime
+import fnmatch
+import json
+import sys
+import threading
+import uuid
+
+import Teradata_Migration.metrics as metrics
+import Teradata_Migration.migrator as migrator
+import Teradata_Migration.runner as runner
+import Teradata_Migration.snowflake_operations_1 as sf_ops
+
+MIGRATION_TYPES = {"full": "Full Load (Replaces table)", "delta": "Delta Load (Incremental)"}
+
+_emit_lock = threading.Lock()
+
+
+def emit(event, **fields):
+    """Writes one progress event as a JSON line on stdout."""
+    record = {"ts": datetime.datetime.now(datetime.timezone.utc).isoformat(), "event": event, **fields}
+    with _emit_lock:
+        print(json.dumps(record, default=str), flush=True)
+
+
+def run_table(config, table_name, database_name, migration_details, job_id, catalog=None, load_watcher=None, control=None):
+    """Migrates one table through the shared runner, reporting through emit(). Returns (table_name, success)."""
+    emit("table_started", table=table_name)
+    result = runner.run_table(config, table_name, database_name, lambda message: emit("log", table=table_name, message=message),
+                              migration_details, job_id, catalog=catalog, load_watcher=load_watcher, control=control)
+    stage_timings = result.get("stage_timings")
+    emit("table_finished", table=table_name, status="SUCCESS" if result["success"] else "FAILED", rows=result.get("rows_processed", 0),
+         error=result["error_message"], timings=metrics.summarize_spans(stage_timings) if stage_timings else None,
+         validation=(result.get("validation") or {}).get("status"))
+    return table_name, result["success"]
+
+
+def select_tables(config, database, tables=None, patterns=None):
+    """
+    The explicit table names plus every Teradata table matching one of the glob patterns
+    (case-insensitive), deduplicated in order. Raises if the tables cannot be listed.
+    """
+    selected = [t.strip() for t in tables or [] if t.strip()]
+    if patterns:
+        available = migrator.list_teradata_tables(config, database, raise_errors=True)
+        selected += [t.strip() for t in available if any(fnmatch.fnmatchcase(t.strip().upper(), p.upper()) for p in patterns)]
+    return list(dict.fromkeys(selected))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("config", help="ini file with [TERADATA], [SNOWFLAKE], [AZURE] and optional [MIGRATOR] sections")
+    parser.add_argument("--database", required=True, help="Teradata source database")
+    parser.add_argument("--tables", type=lambda s: s.split(","), action="extend", default=[], help="Comma-separated table names (repeatable)")
+    parser.add_argument("--pattern", action="append", default=[], help="Glob matched against the database's tables, e.g. 'FACT_*' (repeatable)")
+    parser.add_argument("--mode", choices=MIGRATION_TYPES, default="full")
+    parser.add_argument("--primary-key", default="", help="Primary key column (required for --mode delta)")
+    parser.add_argument("--tracking-column", default="last_updated", help="Watermark column for delta loads")
+    parser.add_argument("--export-engine", choices=("tpt", "python"), default="tpt")
+    parser.add_argument("--full-load-method", choices=("pipe", "copy"), default="pipe")
+    parser.add_argument("--append-only", action="store_true", help="Delta loads INSERT instead of MERGE")
+    parser.add_argument("--validate", action="store_true", default=None, help="Validate full loads against Teradata (default: [MIGRATOR] VALIDATION)")
+    parser.add_argument("--workers", type=int, help="Tables migrated at once (default: [MIGRATOR] MAX_MIGRATION_WORKERS or 5)")
+    parser.add_argument("--job-id", default=None, help="Audit log job id (default: a new UUID)")
+    args = parser.parse_args(argv)
+    if not args.tables and not args.pattern:
+        parser.error("give --tables and/or --pattern")
+    if args.mode == "delta" and not args.primary_key:
+        parser.error("--mode delta requires --primary-key")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = configparser.ConfigParser()
+    if not config.read(args.config):
+        emit("job_failed", error=f"Cannot read config file {args.config}")
+        return 2
+    missing = [s for s in ('TERADATA', 'SNOWFLAKE', 'AZURE') if s not in config]
+    if missing:
+        emit("job_failed", error=f"Config file is missing section(s): {', '.join(missing)}")
+        return 2
+
+    try:
+        tables = select_tables(config, args.database, args.tables, args.pattern)
+    except Exception as e:  # Teradata unreachable: a runtime failure, not a bad selection
+        emit("job_failed", error=f"Could not list the tables of {args.database}: {e}")
+        return 1
+    if not tables:
+        emit("job_failed", error="No tables selected")
+        return 2
+
+    job_id = args.job_id or str(uuid.uuid4())
+    migration_details = {"type": MIGRATION_TYPES[args.mode], "tracking_column": args.tracking_column, "primary_key_column": args.primary_key,
+                         "export_engine": args.export_engine, "full_load_method": args.full_load_method, "append_only": args.append_only}
+    if args.validate is not None:
+        migration_details["validate"] = args.validate
+    emit("job_started", job_id=job_id, database=args.database, tables=tables, mode=args.mode)
+
+    catalog = migrator.prefetch_teradata_catalog(config, args.database, tables)
+    load_watcher = sf_ops.PipeLoadWatcher(config, lambda: runner.connect_to_snowflake(config))
+    metrics.start_metrics_server(config)
+    control = sf_ops.ControlPlaneWriter(config, lambda: runner.connect_to_snowflake(config))
+    if args.mode == "delta":
+        try:
+            control.load_watermarks(tables)
+        except Exception as e:
+            emit("log", message=f"Could not preload watermarks; they will be read per table: {e}")
+
+    results = {}
+    max_workers = args.workers or int(config.get('MIGRATOR', 'MAX_MIGRATION_WORKERS', fallback=5))
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run_table, config, table, args.database, migration_details, job_id, catalog, load_watcher, control): table
+                       for table in migrator.schedule_tables(config, tables, catalog)}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    _table_name, success = future.result()
+                except Exception as e:
+                    emit("table_finished", table=futures[future], status="FAILED", error=str(e))
+                    success = False
+                results[futures[future]] = success
+    finally:
+        load_watcher.join()
+        control_ok = control.close()
+        migrator.close_teradata_pools()
+
+    failed = sorted(t for t, ok in results.items() if not ok)
+    if not control_ok:
+        emit("log", message="Some audit/watermark updates could not be written to MIGRATION_CONTROL.")
+    emit("job_finished", job_id=job_id, succeeded=len(results) - len(failed), failed=failed, control_ok=control_ok)
+    return 1 if failed or not control_ok else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
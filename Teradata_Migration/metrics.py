@@ -0,0 +1,92 @@
+import datetime
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+except ImportError:  # metrics are optional; spans are still recorded for the audit log
+    Counter = Gauge = Histogram = start_http_server = None
+
+# Stages of a table migration, in pipeline order
+STAGES = ('count', 'export', 'upload', 'create', 'load_wait', 'merge', 'watermark', 'validate')
+
+if Histogram is not None:
+    STAGE_SECONDS = Histogram('teradata_migration_stage_seconds', 'Duration of one migration stage span', ['stage'],
+                              buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600))
+    STAGE_ROWS = Counter('teradata_migration_stage_rows', 'Rows handled by migration stage spans', ['stage'])
+    STAGE_BYTES = Counter('teradata_migration_stage_bytes', 'Bytes handled by migration stage spans', ['stage'])
+    STAGE_ROWS_PER_SECOND = Gauge('teradata_migration_stage_rows_per_second', 'Row throughput of the last span of a stage', ['stage', 'table'])
+    STAGE_BYTES_PER_SECOND = Gauge('teradata_migration_stage_bytes_per_second', 'Byte throughput of the last span of a stage', ['stage', 'table'])
+
+_server_lock = threading.Lock()
+_server_port = None
+
+
+def start_metrics_server(config):
+    """Serves the Prometheus metrics on [MIGRATOR] METRICS_PORT (0, the default, disables it). Safe to call repeatedly."""
+    global _server_port
+    port = int(config.get('MIGRATOR', 'METRICS_PORT', fallback=0))
+    if not port or start_http_server is None:
+        return None
+    with _server_lock:
+        if _server_port is None:
+            start_http_server(port, addr=config.get('MIGRATOR', 'METRICS_ADDR', fallback='127.0.0.1'))
+            _server_port = port
+    return _server_port
+
+
+class StageTimer:
+    """
+    Collects the per-stage spans of one table migration. Spans may be recorded from several
+    threads (e.g. parallel export parts); each is a dict with stage, start, seconds, rows,
+    bytes and optional detail, ready to be stored as JSON in the audit log.
+    """
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, detail=None):
+        """Times the `with` block as one span of `stage`; set span['rows'] / span['bytes'] inside it."""
+        span = {"stage": stage, "start": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "seconds": None, "rows": None, "bytes": None}
+        if detail is not None:
+            span["detail"] = detail
+        started = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span["seconds"] = round(time.perf_counter() - started, 3)
+            with self._lock:
+                self.spans.append(span)
+            self._observe(span)
+
+    def _observe(self, span):
+        if Histogram is None:
+            return
+        stage, seconds = span["stage"], span["seconds"]
+        STAGE_SECONDS.labels(stage).observe(seconds)
+        if span["rows"]:
+            STAGE_ROWS.labels(stage).inc(span["rows"])
+            if seconds:
+                STAGE_ROWS_PER_SECOND.labels(stage, self.table_name).set(span["rows"] / seconds)
+        if span["bytes"]:
+            STAGE_BYTES.labels(stage).inc(span["bytes"])
+            if seconds:
+                STAGE_BYTES_PER_SECOND.labels(stage, self.table_name).set(span["bytes"] / seconds)
+
+    def summary(self):
+        with self._lock:
+            return summarize_spans(list(self.spans))
+
+
+def summarize_spans(spans):
+    """One log line with the total seconds per stage, in pipeline order (parallel spans add up)."""
+    totals = {}
+    for span in spans:
+        totals[span["stage"]] = totals.get(span["stage"], 0) + (span["seconds"] or 0)
+    order = sorted(totals, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES))
+    return "[TIMING] " + ", ".join(f"{stage}={totals[stage]:.1f}s" for stage in order)
@@ -1,24 +1,210 @@
 import sys
 import uuid
 import os
+import re
+import base64
+import csv
+import datetime
+import glob
+import decimal
+import functools
+import hashlib
+import json
+import math
+import shutil
 import subprocess
-from io import StringIO
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from io import RawIOBase, StringIO
 import teradatasql
 from azure.storage.blob import BlobServiceClient
 
 # --- Local Module Imports ---
 import Teradata_Migration.snowflake_operations_1 as sf_ops
+from Teradata_Migration.metrics import StageTimer
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for [MIGRATOR] EXPORT_FORMAT = parquet
+    pa = pq = None
+
+
+class TeradataConnectionPool:
+    """
+    Thread-safe pool of Teradata sessions shared by the migration workers.
+
+    At most `max_size` sessions are open at once; a checkout waits up to `wait_timeout`
+    seconds for one to be returned. Idle sessions older than `idle_timeout` seconds are
+    closed instead of reused, and every reused session is validated with a cheap query
+    so a dropped session never reaches the caller.
+    """
+
+    def __init__(self, config, max_size=5, idle_timeout=300, wait_timeout=120):
+        self.config = config
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self._idle = []  # (connection, returned_at), most recently returned last
+        self._open = 0
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        return teradatasql.connect(
+            host=self.config['TERADATA']['HOST'],
+            user=self.config['TERADATA']['USER'],
+            password=self.config['TERADATA']['PASS']
+        )
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(conn):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+                cur.fetchall()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._open >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No Teradata connection became free within {self.wait_timeout}s (pool size {self.max_size}).")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                else:
+                    conn, returned_at = None, None
+                    self._open += 1  # reserve the slot before connecting outside the lock
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._discard(None)
+                    raise
+            if time.monotonic() - returned_at <= self.idle_timeout and self._is_alive(conn):
+                return conn
+            self._discard(conn)  # stale or broken: free its slot and try again
+
+    def _discard(self, conn):
+        if conn is not None:
+            self._close(conn)
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def _checkin(self, conn):
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Checks a session out for the duration of the `with` block."""
+        conn = self._checkout()
+        try:
+            yield conn
+        except teradatasql.OperationalError:
+            self._discard(conn)
+            raise
+        except BaseException:
+            self._checkin(conn)
+            raise
+        else:
+            self._checkin(conn)
+
+    def close_all(self):
+        """Closes the idle sessions; sessions checked out right now return to the (emptied) pool as usual."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_teradata_pool(config):
+    """Returns the pool shared by every caller using the same Teradata host and user."""
+    key = (config['TERADATA']['HOST'], config['TERADATA']['USER'])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = TeradataConnectionPool(
+                config,
+                max_size=int(config.get('MIGRATOR', 'TERADATA_POOL_SIZE', fallback=5)),
+                idle_timeout=float(config.get('MIGRATOR', 'TERADATA_POOL_IDLE_TIMEOUT', fallback=300)),
+            )
+        return pool
+
+
+def close_teradata_pools():
+    """Closes the idle sessions of every pool (e.g. at the end of a migration job)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
+# Job-wide concurrency limits per pipeline stage, so one table can export while others upload or load
+STAGE_LIMITS = {'export': ('MAX_CONCURRENT_EXPORTS', 4), 'upload': ('MAX_CONCURRENT_UPLOADS', 4), 'load': ('MAX_CONCURRENT_LOADS', 4)}
+_stage_semaphores = {}
+_stage_semaphores_lock = threading.Lock()
+
+
+@contextmanager
+def stage_slot(config, stage):
+    """
+    Holds one of the [MIGRATOR] MAX_CONCURRENT_<STAGE>S slots shared by all workers for the
+    duration of the `with` block: 'export' (Teradata export jobs/sessions), 'upload' (Azure
+    uploads) or 'load' (Snowflake COPY/pipe/merge).
+    """
+    option, default = STAGE_LIMITS[stage]
+    limit = int(config.get('MIGRATOR', option, fallback=default))
+    with _stage_semaphores_lock:
+        semaphore = _stage_semaphores.get((stage, limit))
+        if semaphore is None:
+            semaphore = _stage_semaphores[(stage, limit)] = threading.BoundedSemaphore(limit)
+    with semaphore:
+        yield
+
+
+def schedule_tables(config, tables, catalog=None):
+    """
+    Orders the tables of a job for submission by their DBC.TableSizeV size from the catalog,
+    per [MIGRATOR] SCHEDULE_ORDER: 'largest_first' (default; the long tables start early and
+    the small ones fill the gaps), 'smallest_first', or 'selection' to keep the given order.
+    Tables missing from the catalog count as size 0.
+    """
+    order = config.get('MIGRATOR', 'SCHEDULE_ORDER', fallback='largest_first').strip().lower()
+    if order == 'selection' or not catalog:
+        return list(tables)
+    size = lambda table: (catalog.get(table) or {}).get("size_bytes", 0)
+    return sorted(tables, key=size, reverse=(order != 'smallest_first'))
 
 
 def list_teradata_databases(config):
     """Fetch all databases from Teradata."""
     try:
-        with teradatasql.connect(
-            host=config['TERADATA']['HOST'],
-            user=config['TERADATA']['USER'],
-            password=config['TERADATA']['PASS']
-        ) as conn:
-            cur = conn.cursor()
+        with get_teradata_pool(config).connection() as conn, conn.cursor() as cur:
             cur.execute("SELECT DatabaseName FROM DBC.DatabasesV;")
             return [row[0] for row in cur.fetchall()]
     except Exception as e:
@@ -26,18 +212,15 @@ def list_teradata_databases(config):
         return []
 
 
-def list_teradata_tables(config, database):
-    """Fetch all tables from a given Teradata database."""
+def list_teradata_tables(config, database, raise_errors=False):
+    """Fetch all tables from a given Teradata database. Errors give [] unless `raise_errors`."""
     try:
-        with teradatasql.connect(
-            host=config['TERADATA']['HOST'],
-            user=config['TERADATA']['USER'],
-            password=config['TERADATA']['PASS']
-        ) as conn:
-            cur = conn.cursor()
+        with get_teradata_pool(config).connection() as conn, conn.cursor() as cur:
             cur.execute(f"SELECT TableName FROM DBC.TablesV WHERE DatabaseName='{database}';")
             return [row[0] for row in cur.fetchall()]
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"[ERROR] Could not connect to Teradata or list tables for {database}: {e}", file=sys.stderr)
         return []
 
@@ -45,12 +228,7 @@ def list_teradata_tables(config, database):
 def get_teradata_columns(config, database_name, table_name):
     """Fetches column names and their data types in order from the Teradata source."""
     try:
-        with teradatasql.connect(
-            host=config['TERADATA']['HOST'],
-            user=config['TERADATA']['USER'],
-            password=config['TERADATA']['PASS']
-        ) as conn:
-            cur = conn.cursor()
+        with get_teradata_pool(config).connection() as conn, conn.cursor() as cur:
             query = f"""
                 SELECT ColumnName, ColumnType
                 FROM DBC.ColumnsV
@@ -64,17 +242,64 @@ def get_teradata_columns(config, database_name, table_name):
         return []
 
 
+def prefetch_teradata_catalog(config, database_name, table_names):
+    """
+    Reads the catalog of all the given tables up front, in two queries, so the per-table
+    workers do not each query DBC again. Returns {table: {"columns", "primary_index", "size_bytes"}}
+    where "columns" holds (name, type, length, precision, scale, nullable) tuples in column order
+    and "primary_index" the primary index column names in index order.
+    """
+    if not table_names:
+        return {}
+    placeholders = ", ".join("?" * len(table_names))
+    columns_query = f"""
+        SELECT c.TableName, c.ColumnName, c.ColumnType, c.ColumnLength,
+               c.DecimalTotalDigits, c.DecimalFractionalDigits, c.Nullable, i.ColumnPosition
+        FROM DBC.ColumnsV c
+        LEFT JOIN DBC.IndicesV i
+          ON i.DatabaseName = c.DatabaseName AND i.TableName = c.TableName
+         AND i.ColumnName = c.ColumnName AND i.IndexType IN ('P', 'Q')
+        WHERE c.DatabaseName = ? AND c.TableName IN ({placeholders})
+        ORDER BY c.TableName, c.ColumnId;
+    """
+    size_query = f"""
+        SELECT TableName, SUM(CurrentPerm)
+        FROM DBC.TableSizeV
+        WHERE DatabaseName = ? AND TableName IN ({placeholders})
+        GROUP BY TableName;
+    """
+    params = [database_name, *table_names]
+    try:
+        with get_teradata_pool(config).connection() as conn, conn.cursor() as cur:
+            cur.execute(columns_query, params)
+            column_rows = cur.fetchall()
+            cur.execute(size_query, params)
+            size_rows = cur.fetchall()
+    except Exception as e:
+        print(f"[ERROR] Could not prefetch the catalog for {database_name}: {e}", file=sys.stderr)
+        return {}
+
+    catalog = {}
+    pi_positions = {}
+    for table, col, col_type, length, precision, scale, nullable, pi_position in column_rows:
+        entry = catalog.setdefault(table, {"columns": [], "primary_index": [], "size_bytes": 0})
+        entry["columns"].append((col, col_type, length, precision, scale, nullable))
+        if pi_position is not None:
+            pi_positions.setdefault(table, []).append((pi_position, col))
+    for table, positions in pi_positions.items():
+        catalog[table]["primary_index"] = [col for _, col in sorted(positions)]
+    for table, size in size_rows:
+        if table in catalog:
+            catalog[table]["size_bytes"] = int(size or 0)
+    return catalog
+
+
 def get_teradata_query_details(config, database_name, table_name, where_clause="", tracking_col=None):
     """Gets the row count and new max watermark for a given query from Teradata."""
     count_query = f"SELECT COUNT(*) FROM {database_name}.{table_name} {where_clause};"
     watermark_query = f"SELECT MAX({tracking_col}) FROM {database_name}.{table_name} {where_clause};" if tracking_col else None
     try:
-        with teradatasql.connect(
-            host=config['TERADATA']['HOST'],
-            user=config['TERADATA']['USER'],
-            password=config['TERADATA']['PASS']
-        ) as conn:
-            cur = conn.cursor()
+        with get_teradata_pool(config).connection() as conn, conn.cursor() as cur:
             cur.execute(count_query)
             row_count = cur.fetchone()[0]
             new_watermark = None
@@ -87,49 +312,76 @@ def get_teradata_query_details(config, database_name, table_name, where_clause="
         print(f"[ERROR] Could not get query details for {database_name}.{table_name}: {e}", file=sys.stderr)
         return 0, None
 
-def run_teradata_to_azure_tpt(config, table_name, database_name, log_func, migration_details, last_watermark=None):
-    """Exports Teradata data using TPT to a local file and uploads it to Azure."""
-    db_name_lower = database_name.lower()
-    table_name_lower = table_name.lower()
+_RANGE_KEY_TYPES = ('I1', 'I2', 'I', 'I8')
 
-    run_uuid = str(uuid.uuid4())
-    local_filename = f"{db_name_lower}_{table_name_lower}_{run_uuid}.csv"
-    tpt_script_filename = f"tpt_job_{run_uuid}.tpt"
-    tpt_log_filename = f"tpt_log_{run_uuid}.log"
-    azure_blob_name = f"{db_name_lower}/{table_name_lower}.csv"
 
-    log_func(f"[TPT] Starting export for table '{table_name}'")
+def plan_export_partitions(config, catalog_entry, rows_to_export=None):
+    """
+    Decides how many parts an export is split into: one per [MIGRATOR] EXPORT_PARTITION_GB
+    (default 10) of estimated data, at most EXPORT_MAX_PARTITIONS (default 8). A full export
+    (`rows_to_export` None) is estimated from the table's prefetched size; a delta of
+    `rows_to_export` rows from the declared column lengths, so a small delta of a large table
+    stays a single part. Returns (partitions, key_column): the parts are ranges of key_column,
+    the first primary index column when it is an integer, or None when the table has no such
+    column and the parts are the instances of one TPT job instead.
+    """
+    if not catalog_entry or not catalog_entry.get("columns"):
+        return 1, None
+    size_bytes = catalog_entry.get("size_bytes", 0)
+    if rows_to_export is not None:
+        row_bytes = sum(column[2] or 100 for column in catalog_entry["columns"])
+        size_bytes = min(size_bytes, rows_to_export * row_bytes)
+    part_bytes = float(config.get('MIGRATOR', 'EXPORT_PARTITION_GB', fallback=10)) * 1024 ** 3
+    max_parts = int(config.get('MIGRATOR', 'EXPORT_MAX_PARTITIONS', fallback=8))
+    partitions = max(1, min(max_parts, -(-size_bytes // int(part_bytes))))
+    primary_index = catalog_entry.get("primary_index") or [None]
+    for name, td_type, _length, _precision, scale, *_ in catalog_entry["columns"]:
+        if name == primary_index[0] and (td_type.strip() in _RANGE_KEY_TYPES or (td_type.strip() == 'D' and not scale)):
+            return partitions, name.strip()
+    return partitions, None
 
-    where_clause = ""
-    tracking_col = None
-    if migration_details['type'] == 'Delta Load (Incremental)' and last_watermark:
-        tracking_col = migration_details['tracking_column']
-        where_clause = f" WHERE {tracking_col} > '{last_watermark}'"
 
-    log_func("  [TD] Getting row count and new watermark...")
-    rows_to_export, potential_new_watermark = get_teradata_query_details(config, database_name, table_name, where_clause, tracking_col)
+def _plan_key_ranges(config, full_table_name, key_column, select_where, partitions):
+    """
+    Splits the rows of `select_where` into `partitions` ranges of equal width between the
+    key's MIN and MAX. Returns the inner boundaries (partitions - 1 values, fewer for a narrow
+    key), or [] when there is nothing to split.
+    """
+    with get_teradata_pool(config).connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT MIN({key_column}), MAX({key_column}) FROM {full_table_name}{select_where};")
+        low, high = cur.fetchone()
+    if low is None or high is None:
+        return []
+    low, high = int(low), int(high)
+    partitions = min(partitions, high - low + 1)
+    return sorted({low + (high - low + 1) * k // partitions for k in range(1, partitions)})
 
-    if rows_to_export == 0:
-        log_func("[SUCCESS] No new rows found to export. Task is complete.")
-        return True, last_watermark, 0
 
-    new_max_watermark = potential_new_watermark or last_watermark
-    log_func(f"  [TD] Found {rows_to_export} rows to export.")
+def _key_range_predicate(key_column, bounds, part):
+    """The predicate of part `part` of the ranges split at `bounds`; NULL keys go to the first part."""
+    if part == 0:
+        return f"({key_column} < {bounds[0]} OR {key_column} IS NULL)"
+    if part == len(bounds):
+        return f"{key_column} >= {bounds[-1]}"
+    return f"{key_column} >= {bounds[part - 1]} AND {key_column} < {bounds[part]}"
 
-    full_table_name = f"{database_name}.{table_name}"
-    tpt_script_content = f"""
-    DEFINE JOB EXPORT_{table_name_lower}
+
+def _tpt_export_script(config, job_name, full_table_name, select_where, local_filename, instances=1):
+    # With several instances the EXPORT operator still runs one SELECT (one table scan) and each
+    # file writer instance writes its own file; tbuild -C deals the rows out to them round-robin.
+    return f"""
+    DEFINE JOB EXPORT_{job_name}
     (
-        DEFINE SCHEMA S_{table_name_lower} FROM TABLE '{full_table_name}';
+        DEFINE SCHEMA S_{job_name} FROM TABLE '{full_table_name}';
         DEFINE OPERATOR EXPORT_OPERATOR
         TYPE EXPORT
-        SCHEMA S_{table_name_lower}
+        SCHEMA S_{job_name}
         ATTRIBUTES
         (
             VARCHAR TdpId          = '{config['TERADATA']['HOST']}',
             VARCHAR UserName       = '{config['TERADATA']['USER']}',
             VARCHAR UserPassword   = '{config['TERADATA']['PASS']}',
-            VARCHAR SelectStmt     = 'SELECT * FROM {full_table_name}{where_clause};'
+            VARCHAR SelectStmt     = 'SELECT * FROM {full_table_name}{select_where};'
         );
         DEFINE OPERATOR FILE_WRITER
         TYPE DATACONNECTOR CONSUMER
@@ -142,62 +394,608 @@ def run_teradata_to_azure_tpt(config, table_name, database_name, log_func, migra
             VARCHAR TextDelimiter  = ',',
             VARCHAR IndicatorMode  = 'N'
         );
-        APPLY TO OPERATOR (FILE_WRITER)
-        SELECT * FROM OPERATOR (EXPORT_OPERATOR);
+        APPLY TO OPERATOR (FILE_WRITER[{instances}])
+        SELECT * FROM OPERATOR (EXPORT_OPERATOR[{instances}]);
     );
     """
 
+
+class _GzipStream(RawIOBase):
+    """Readable stream of the gzip-compressed contents of `source`, compressed as it is read."""
+
+    def __init__(self, source, level=6, read_size=4 * 1024 * 1024):
+        self._source = source
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+        self._read_size = read_size
+        self._buffer = bytearray()
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while len(self._buffer) < len(b) and not self._eof:
+            chunk = self._source.read(self._read_size)
+            if chunk:
+                self._buffer += self._compressor.compress(chunk)
+            else:
+                self._buffer += self._compressor.flush()
+                self._eof = True
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        del self._buffer[:n]
+        return n
+
+
+def _remove_stale_export_blobs(container_client, database_name, table_name, keep, log_func):
+    """Deletes earlier export files of this table (e.g. parts of a run with more partitions)."""
+    prefix = f"{database_name.lower()}/"
+    pattern = re.compile(sf_ops.export_file_regex(database_name, table_name))
+    for blob in container_client.list_blobs(name_starts_with=f"{prefix}{table_name.lower()}"):
+        if blob.name not in keep and pattern.fullmatch(blob.name):
+            log_func(f"  [AZ] Removing stale export file '{blob.name}'")
+            container_client.delete_blob(blob.name)
+
+
+def _upload_export_file(config, container_client, local_filename, azure_blob_name, log_func, timer, after_upload=None):
+    """
+    Uploads one export file (gzip-compressed on the fly for '.gz' blobs), then deletes it locally
+    and calls `after_upload`, e.g. to checkpoint it.
+    """
+    compress = azure_blob_name.endswith('.gz')
+    max_concurrency = int(config.get('AZURE', 'UPLOAD_MAX_CONCURRENCY', fallback=4))
+    log_func(f"  [AZ] Uploading '{local_filename}' to blob '{azure_blob_name}'"
+             f"{' (gzip on the fly)' if compress else ''} with {max_concurrency} parallel block uploads...")
+    with stage_slot(config, 'upload'), timer.span('upload', azure_blob_name) as span, open(local_filename, "rb") as data:
+        span['bytes'] = os.path.getsize(local_filename)
+        container_client.upload_blob(azure_blob_name, _GzipStream(data) if compress else data,
+                                     overwrite=True, max_concurrency=max_concurrency)
+    os.remove(local_filename)  # free the disk right away; the other parts may still be running
+    if after_upload is not None:
+        after_upload()
+
+
+def _tpt_instance_number(local_filename, path):
+    """Instance number of a TPT output file: instances after the first append theirs to FileName."""
+    number = re.search(r'[0-9]+$', path[len(local_filename):])
+    return int(number.group()) if number else 0
+
+
+def _count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(4 * 1024 * 1024), b''))
+
+
+def _export_and_upload_part(config, container_client, table_name, full_table_name, select_where,
+                            local_filename, blob_prefix, suffix, run_uuid, log_func, timer, instances=1, on_uploaded=None):
+    """
+    Runs one TPT export job with `instances` export/file-writer instances and uploads the files
+    they write in parallel: '<blob_prefix><suffix>' for a single file, otherwise
+    '<blob_prefix>_partNNNN<suffix>'. After each upload, `on_uploaded(file number, blob name,
+    rows, last)` is called. Returns (blob names, rows written), or None on failure.
+    """
+    tpt_script_filename = f"tpt_job_{run_uuid}.tpt"
+    tpt_log_filename = f"tpt_log_{run_uuid}.log"
     tpt_succeeded = False
+    local_files = []
     try:
-        with open(tpt_script_filename, 'w', encoding='utf-8') as f: f.write(tpt_script_content)
+        with open(tpt_script_filename, 'w', encoding='utf-8') as f:
+            f.write(_tpt_export_script(config, table_name.lower(), full_table_name, select_where, local_filename, instances))
 
-        log_func(f"  [TPT] Executing TPT job. Log will be in '{tpt_log_filename}'")
-        tpt_command = ['tbuild', '-f', tpt_script_filename, '-l', tpt_log_filename]
-        result = subprocess.run(tpt_command, capture_output=True, text=True)
+        log_func(f"  [TPT] Executing TPT job with {instances} instance(s). Log will be in '{tpt_log_filename}'")
+        # The parts of a table run as concurrent jobs, so each gets its own job name (and checkpoint files)
+        tpt_command = ['tbuild', '-f', tpt_script_filename, '-l', tpt_log_filename, f"{table_name.lower()}_{run_uuid}"]
+        if instances > 1:
+            tpt_command.insert(-1, '-C')  # without it rows go to whichever consumer instance is free, so files skew badly
+        with stage_slot(config, 'export'), timer.span('export', blob_prefix) as span:
+            result = subprocess.run(tpt_command, capture_output=True, text=True)
+            local_files = sorted(glob.glob(glob.escape(local_filename) + '*'), key=lambda f: _tpt_instance_number(local_filename, f))
+            span['bytes'] = sum(os.path.getsize(f) for f in local_files)
 
         if result.returncode > 8:
             raise subprocess.CalledProcessError(returncode=result.returncode, cmd=result.args, output=result.stdout, stderr=result.stderr)
 
         log_func(f"  [TPT] TPT job finished with exit code: {result.returncode} (0=Success).")
-        if not os.path.exists(local_filename):
+        if not local_files:
             raise FileNotFoundError(f"TPT failed to create output file: {local_filename}")
 
         tpt_succeeded = True
-        log_func(f"  [AZ] Uploading '{local_filename}' to blob '{azure_blob_name}'...")
-        blob_service_client = BlobServiceClient.from_connection_string(config['AZURE']['CONN_STR'])
-        blob_client = blob_service_client.get_blob_client(container=config['AZURE']['CONTAINER'], blob=azure_blob_name)
-        with open(local_filename, "rb") as data:
-            blob_client.upload_blob(data, overwrite=True)
-
-        log_func(f"[SUCCESS] Finished exporting {rows_to_export} rows to {azure_blob_name}")
-        return True, new_max_watermark, rows_to_export
+        file_rows = [_count_lines(f) for f in local_files]  # Delimited format: one record per line
+        if len(local_files) == 1:
+            blob_names = [f"{blob_prefix}{suffix}"]
+        else:
+            blob_names = [f"{blob_prefix}_part{k:04d}{suffix}" for k in range(len(local_files))]
+        with ThreadPoolExecutor(max_workers=len(local_files)) as uploader:
+            uploads = [uploader.submit(_upload_export_file, config, container_client, local, blob, log_func, timer,
+                                       on_uploaded and functools.partial(on_uploaded, k, blob, rows, k == len(local_files) - 1))
+                       for k, (local, blob, rows) in enumerate(zip(local_files, blob_names, file_rows))]
+            for upload in uploads:
+                upload.result()
+        return blob_names, sum(file_rows)
 
     except Exception as e:
         log_func(f"[ERROR] An unexpected error occurred during the TPT process: {e}")
-        return False, None, 0
+        return None
     finally:
-        log_func("  [SYS] Cleaning up local temporary files...")
         if not tpt_succeeded and os.path.exists(tpt_log_filename):
             log_func(f"  [DEBUG] TPT failed. Log file '{tpt_log_filename}' has been kept for inspection.")
         else:
-            for f in [local_filename, tpt_script_filename, tpt_log_filename]:
+            for f in [*local_files, tpt_script_filename, tpt_log_filename]:
                 if os.path.exists(f):
                     try: os.remove(f)
                     except OSError as e: log_func(f"  [WARN] Could not remove temporary file {f}: {e}")
 
 
-def migrate_table(config, table_name, database_name, sf_cursor, log_func, migration_details):
+def _csv_value(value, binary_format):
+    """Text of one fetched value as the Snowflake file format parses it; csv.writer would write str(value)."""
+    if isinstance(value, (bytes, bytearray)):
+        # Snowflake's BINARY_FORMAT: HEX (its default) or BASE64
+        return base64.b64encode(value).decode('ascii') if binary_format == 'BASE64' else value.hex().upper()
+    if isinstance(value, decimal.Decimal):
+        return format(value, 'f')  # str() switches to exponent notation, e.g. 1E+2, which NUMBER columns reject
+    return value
+
+
+class _CsvChunkWriter:
+    extension = '.csv'
+
+    def __init__(self, path, description, binary_format='HEX'):
+        self._out = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._out, lineterminator='\n')
+        self._binary_format = binary_format.upper()
+        # str() of dates, times and timestamps is already ISO ('2024-01-31 12:00:00.5+01:00'),
+        # which Snowflake's AUTO formats parse; only bytes and decimals need converting
+        self._convert = [i for i, d in enumerate(description or []) if d[1] in (bytes, bytearray, decimal.Decimal)]
+
+    @property
+    def size(self):
+        return self._out.tell()
+
+    def write(self, rows):
+        if self._convert:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i in self._convert:
+                    row[i] = _csv_value(row[i], self._binary_format)
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._out.close()
+
+
+def _arrow_type(type_code, precision, scale):
+    """Arrow type for a teradatasql result column; anything without a typed mapping is written as text."""
+    if type_code is int:
+        return pa.int64()
+    if type_code is float:
+        return pa.float64()
+    if type_code is decimal.Decimal and precision and precision <= 38:
+        return pa.decimal128(precision, scale or 0)
+    if type_code is datetime.datetime:
+        return pa.timestamp('us')
+    if type_code is datetime.date:
+        return pa.date32()
+    if type_code is datetime.time:
+        return pa.time64('us')
+    if type_code is bytes:
+        return pa.binary()
+    return pa.string()
+
+
+class _ParquetChunkWriter:
+    """Writes fetched row batches as row groups of one Parquet file, typed from the cursor description."""
+    extension = '.parquet'
+
+    def __init__(self, path, description, binary_format=None):
+        if pq is None:
+            raise ImportError("EXPORT_FORMAT = parquet requires pyarrow (pip install pyarrow).")
+        self._schema = pa.schema([(d[0], _arrow_type(d[1], d[4], d[5])) for d in description])
+        self._writer = pq.ParquetWriter(path, self._schema, compression='snappy')
+        self.size = 0  # uncompressed bytes, comparable to the CSV chunk size
+
+    def write(self, rows):
+        arrays = []
+        for field, values in zip(self._schema, zip(*rows)):
+            if field.type == pa.string():
+                values = [None if v is None else str(v) for v in values]
+            arrays.append(pa.array(values, type=field.type))
+        batch = pa.Table.from_arrays(arrays, schema=self._schema)
+        self._writer.write_table(batch)
+        self.size += batch.nbytes
+
+    def close(self):
+        self._writer.close()
+
+
+def _export_and_upload_part_python(config, container_client, full_table_name, select_where,
+                                   local_prefix, blob_prefix, suffix, log_func, timer, on_uploaded=None):
+    """
+    Exports one part through teradatasql instead of TPT: rows are fetched in batches of
+    [MIGRATOR] EXPORT_FETCH_ROWS (FastExport when the query allows it) and written as CSV
+    (or, for a '.parquet' suffix, Parquet) chunk files of about EXPORT_CHUNK_MB of data each.
+    In CSV, BYTE/VARBYTE values are written in [MIGRATOR] EXPORT_BINARY_FORMAT (HEX, the default,
+    or BASE64), which must match the BINARY_FORMAT of the Snowflake file format.
+    Every finished chunk is uploaded as '<blob_prefix>_chunkNNNN<suffix>' in the background
+    while the next one is being written, then `on_uploaded(chunk number, blob name, rows, last)`
+    is called (once with blob name None if the part has no rows).
+    Returns (uploaded blob names, rows written), or None on failure.
+    """
+    fetch_rows = int(config.get('MIGRATOR', 'EXPORT_FETCH_ROWS', fallback=10000))
+    chunk_bytes = int(float(config.get('MIGRATOR', 'EXPORT_CHUNK_MB', fallback=256)) * 1024 * 1024)
+    writer_class = _ParquetChunkWriter if suffix == '.parquet' else _CsvChunkWriter
+    binary_format = config.get('MIGRATOR', 'EXPORT_BINARY_FORMAT', fallback='HEX')
+    uploads, blob_names, local_files = [], [], []
+    rows_written = 0
+    try:
+        with ThreadPoolExecutor(max_workers=2) as uploader:
+            with stage_slot(config, 'export'), timer.span('export', blob_prefix) as span, \
+                    teradatasql.connect(host=config['TERADATA']['HOST'], user=config['TERADATA']['USER'],
+                                        password=config['TERADATA']['PASS']) as conn, \
+                    conn.cursor() as cur:
+                cur.execute(f"{{fn teradata_try_fastexport}}SELECT * FROM {full_table_name}{select_where}")
+                chunk, writer, chunk_rows = 0, None, 0
+                rows = cur.fetchmany(fetch_rows)
+                while rows:
+                    next_rows = cur.fetchmany(fetch_rows)  # read ahead, so the last chunk is known as the last one
+                    if writer is None:
+                        local_filename = f"{local_prefix}_chunk{chunk:04d}{writer_class.extension}"
+                        local_files.append(local_filename)
+                        writer = writer_class(local_filename, cur.description, binary_format)
+                    writer.write(rows)
+                    chunk_rows += len(rows)
+                    rows_written += len(rows)
+                    span['rows'] = rows_written
+                    if not next_rows or writer.size >= chunk_bytes:
+                        span['bytes'] = (span['bytes'] or 0) + writer.size
+                        writer.close()
+                        writer = None
+                        blob_names.append(f"{blob_prefix}_chunk{chunk:04d}{suffix}")
+                        uploads.append(uploader.submit(_upload_export_file, config, container_client, local_filename, blob_names[-1],
+                                                       log_func, timer, on_uploaded and functools.partial(
+                                                           on_uploaded, chunk, blob_names[-1], chunk_rows, not next_rows)))
+                        chunk, chunk_rows = chunk + 1, 0
+                    rows = next_rows
+            for upload in uploads:
+                upload.result()
+        if not uploads and on_uploaded is not None:
+            on_uploaded(0, None, 0, True)
+        log_func(f"  [PY] Exported {rows_written} rows in {len(uploads)} chunk(s) to '{blob_prefix}_chunk*{suffix}'.")
+        return blob_names, rows_written
+    except Exception as e:
+        log_func(f"[ERROR] An unexpected error occurred during the Python export: {e}")
+        return None
+    finally:
+        for f in local_files:
+            if os.path.exists(f):
+                try: os.remove(f)
+                except OSError as e: log_func(f"  [WARN] Could not remove temporary file {f}: {e}")
+
+
+def export_engine(config, migration_details, log_func=None):
+    """
+    The export engine for a job: migration_details['export_engine'] ('tpt' or 'python', default
+    'tpt'). Falls back to 'python' when the TPT 'tbuild' binary is not on the PATH, and for
+    Parquet exports, which only the Python exporter writes.
+    """
+    engine = migration_details.get('export_engine', 'tpt')
+    if engine == 'tpt' and sf_ops.export_format(config) == 'parquet':
+        if log_func:
+            log_func("  [INFO] Parquet exports are written by the Python exporter; not using TPT.")
+        return 'python'
+    if engine == 'tpt' and shutil.which('tbuild') is None:
+        if log_func:
+            log_func("  [WARN] TPT 'tbuild' was not found on the PATH; exporting through teradatasql instead.")
+        return 'python'
+    return engine
+
+
+def _checkpointing_enabled(config):
+    return config.getboolean('MIGRATOR', 'CHUNK_CHECKPOINTS', fallback=True)
+
+
+def _clear_chunk_checkpoints(config, sf_cursor, table_name, log_func):
+    # With checkpoints off the control table may not exist at all
+    if _checkpointing_enabled(config):
+        sf_ops.clear_chunk_checkpoints(sf_cursor, table_name, log_func)
+
+
+def _mark_chunk_checkpoints_loaded(config, sf_cursor, table_name, log_func):
+    if _checkpointing_enabled(config):
+        sf_ops.mark_chunk_checkpoints_loaded(sf_cursor, table_name, log_func)
+
+
+def _plan_export(config, engine, catalog_entry, full_table_name, select_where, rows_to_export, log_func):
+    """The parts of a new export: {"key": range column or None, "bounds": range boundaries, "instances": TPT instances}."""
+    partitions, key_column = plan_export_partitions(config, catalog_entry, rows_to_export)
+    if partitions > 1 and key_column:
+        try:
+            bounds = _plan_key_ranges(config, full_table_name, key_column, select_where, partitions)
+        except Exception as e:
+            log_func(f"  [TD WARN] Could not read the range of {key_column}; not splitting on it: {e}")
+            bounds = []
+        if bounds:
+            return {"key": key_column, "bounds": bounds, "instances": 1}
+    # FastExport through teradatasql is one session stream, so only TPT gets instances
+    return {"key": None, "bounds": [], "instances": partitions if engine == 'tpt' else 1}
+
+
+def run_teradata_to_azure_tpt(config, table_name, database_name, log_func, migration_details, last_watermark=None,
+                              catalog_entry=None, sf_cursor=None, timer=None):
+    """
+    Exports Teradata data using TPT to local files and uploads them to Azure, gzip-compressed
+    on the fly in parallel blocks unless [AZURE] UPLOAD_COMPRESSION = none. Each local file
+    is deleted as soon as it is uploaded.
+
+    Large exports (see plan_export_partitions, sized from the rows actually exported) are split
+    into ranges of the table's integer primary index column, exported by parallel TPT jobs and
+    each uploaded as '<table>_partNNNN.csv.gz' as soon as it is written, so Snowflake can load
+    them in parallel. A table without such a column gets one TPT job with several instances
+    instead, whose rows tbuild -C deals out over the part files. A single file keeps the
+    '<table>.csv.gz' blob name.
+
+    With the 'python' export engine (see export_engine) each range is read through teradatasql
+    and uploaded as '<table>[_partNNNN]_chunkNNNN.csv.gz' chunks instead.
+
+    Given `sf_cursor` (and unless [MIGRATOR] CHUNK_CHECKPOINTS = false), every file is
+    checkpointed in MIGRATION_CONTROL.CHUNK_CHECKPOINTS right after its upload, with the ranges
+    of the export. A rerun of the same export within [MIGRATOR] CHUNK_CHECKPOINT_MAX_AGE_HOURS
+    (default 24) keeps those ranges and the completely uploaded parts with their row counts, and
+    exports only the other parts; a part cut off partway starts over, since an export's rows come
+    in no order to resume from. A delta rerun also reuses the checkpointed upper watermark, and
+    every delta part is bounded by it so the parts form one consistent range.
+
+    Returns (success, new watermark, rows exported, loaded), `loaded` being True when an earlier
+    run already loaded this export (see migrate_table) and nothing was exported.
+    """
+    db_name_lower = database_name.lower()
+    table_name_lower = table_name.lower()
+
+    log_func(f"[TPT] Starting export for table '{table_name}'")
+
+    where_clause = ""
+    tracking_col = None
+    if migration_details['type'] == 'Delta Load (Incremental)' and last_watermark:
+        tracking_col = migration_details['tracking_column']
+        where_clause = f" WHERE {tracking_col} > '{last_watermark}'"
+
+    timer = timer or StageTimer(table_name)
+    log_func("  [TD] Getting row count and new watermark...")
+    with timer.span('count') as span:
+        rows_to_export, potential_new_watermark = get_teradata_query_details(config, database_name, table_name, where_clause, tracking_col)
+        span['rows'] = rows_to_export
+
+    if rows_to_export == 0:
+        log_func("[SUCCESS] No new rows found to export. Task is complete.")
+        return True, last_watermark, 0, False
+
+    new_max_watermark = potential_new_watermark or last_watermark
+    log_func(f"  [TD] Found {rows_to_export} rows to export.")
+
+    full_table_name = f"{database_name}.{table_name}"
+    suffix = sf_ops.export_file_suffix(config)
+    engine = export_engine(config, migration_details, log_func)
+
+    checkpointing = sf_cursor is not None and _checkpointing_enabled(config)
+    done_parts, export_plan, loaded = {}, None, False
+    if checkpointing:
+        run_key = hashlib.md5(repr((migration_details['type'], where_clause, engine, suffix)).encode('utf-8')).hexdigest()
+        max_age_hours = float(config.get('MIGRATOR', 'CHUNK_CHECKPOINT_MAX_AGE_HOURS', fallback=24))
+        done_parts, checkpointed_watermark, export_plan, loaded = sf_ops.get_chunk_checkpoints(sf_cursor, table_name, run_key,
+                                                                                               log_func, max_age_hours)
+        if done_parts and tracking_col and checkpointed_watermark is not None:
+            new_max_watermark = checkpointed_watermark
+    if loaded:
+        rows_loaded = sum(part_rows for _, part_rows in done_parts.values())
+        log_func(f"  [RESUME] An earlier run exported and loaded these {rows_loaded} rows; not exporting them again.")
+        return True, new_max_watermark, rows_loaded, True
+    if tracking_col and new_max_watermark is not None:
+        where_clause += f" AND {tracking_col} <= '{new_max_watermark}'"
+    # A resumed export keeps its ranges: recomputed from today's MIN/MAX they would not line up with the uploaded parts
+    plan = json.loads(export_plan) if done_parts else _plan_export(config, engine, catalog_entry, full_table_name, where_clause,
+                                                                    rows_to_export if tracking_col else None, log_func)
+
+    blob_prefix = f"{db_name_lower}/{table_name_lower}"
+    if plan["key"]:
+        joiner = " AND " if where_clause else " WHERE "
+        parts = [(f"{where_clause}{joiner}{_key_range_predicate(plan['key'], plan['bounds'], k)}", f"{blob_prefix}_part{k:04d}")
+                 for k in range(len(plan["bounds"]) + 1)]
+        log_func(f"  [TD] Splitting the export into {len(parts)} ranges of {plan['key']} at {plan['bounds']}.")
+    else:
+        parts = [(where_clause, blob_prefix)]
+
+    try:
+        block_size = int(float(config.get('AZURE', 'UPLOAD_BLOCK_SIZE_MB', fallback=8)) * 1024 * 1024)
+        blob_service_client = BlobServiceClient.from_connection_string(
+            config['AZURE']['CONN_STR'], max_block_size=block_size, max_single_put_size=block_size)
+        container_client = blob_service_client.get_container_client(config['AZURE']['CONTAINER'])
+        # File names are only known once written, so every earlier file except the checkpointed parts goes
+        keep = {blob for blob_names, _ in done_parts.values() for blob in blob_names}
+        _remove_stale_export_blobs(container_client, database_name, table_name, keep, log_func)
+    except Exception as e:
+        log_func(f"[ERROR] Could not prepare the Azure container for the export: {e}")
+        return False, None, 0, False
+
+    checkpoint_lock = threading.Lock()  # the uploads of all parts checkpoint through the one sf_cursor
+
+    def checkpoint(part_id, chunk_id, blob_name, rows, last):
+        with checkpoint_lock:
+            sf_ops.save_chunk_checkpoint(sf_cursor, table_name, run_key, part_id, chunk_id, blob_name, new_max_watermark, log_func,
+                                         rows_exported=rows, last_chunk=last, export_plan=json.dumps(plan))
+
+    def export_part(part_id, part):
+        select_where, part_prefix = part
+        run_uuid = str(uuid.uuid4())
+        local_filename = f"{db_name_lower}_{table_name_lower}_{run_uuid}.csv"
+        on_uploaded = functools.partial(checkpoint, part_id) if checkpointing else None
+        if engine == 'python':
+            return _export_and_upload_part_python(config, container_client, full_table_name, select_where,
+                                                  local_filename[:-len('.csv')], part_prefix, suffix, log_func, timer, on_uploaded)
+        return _export_and_upload_part(config, container_client, table_name, full_table_name, select_where,
+                                       local_filename, part_prefix, suffix, run_uuid, log_func, timer, plan["instances"], on_uploaded)
+
+    remaining = [(k, part) for k, part in enumerate(parts) if k not in done_parts]
+    if done_parts:
+        log_func(f"  [RESUME] {len(done_parts)} of {len(parts)} part(s) were uploaded by an earlier run; "
+                 f"exporting the other {len(remaining)}.")
+    exported, failed = dict(done_parts), 0
+    with ThreadPoolExecutor(max_workers=max(1, len(remaining))) as pool:
+        futures = {pool.submit(export_part, k, part): k for k, part in remaining}
+        for future in as_completed(futures):
+            part_result = future.result()
+            if part_result is None:
+                failed += 1
+            else:
+                exported[futures[future]] = part_result
+    log_func("  [SYS] Cleaned up local temporary files.")
+    if failed:
+        log_func(f"[ERROR] {failed} of {len(parts)} export part(s) failed for '{table_name}'.")
+        return False, None, 0, False
+    if done_parts:
+        # The reused parts hold the rows of the earlier export, not today's count
+        rows_to_export = sum(part_rows for _, part_rows in exported.values())
+
+    log_func(f"[SUCCESS] Finished exporting {rows_to_export} rows in {len(parts)} part(s) under {db_name_lower}/")
+    return True, new_max_watermark, rows_to_export, False
+
+
+_VALIDATION_INTEGER_TYPES = ('I1', 'I2', 'I', 'I8')
+
+
+def _validation_measures(columns):
+    """
+    Portable per-column aggregates as (label, Teradata expression, Snowflake expression,
+    float-tolerant) tuples. Character values are compared right-trimmed with empty strings as
+    NULL, since a CSV round trip does not keep either distinction; NUMBER columns without a
+    declared scale are only counted, because they load as NUMBER(38,0).
+    """
+    measures = [("rows", "COUNT(*)", "COUNT(*)", False)]
+    for name, td_type, *details in columns:
+        code = td_type.strip()
+        td_col, sf_col = f'"{name.strip()}"', f'"{name.strip().upper()}"'
+        if code in ('CF', 'CV', 'CO'):
+            td_val, sf_val = f"NULLIF(TRIM(TRAILING FROM {td_col}), '')", f"NULLIF(RTRIM({sf_col}), '')"
+            measures += [(f"{name}.count", f"COUNT({td_val})", f"COUNT({sf_val})", False),
+                         (f"{name}.length_sum", f"SUM(CAST(CHARACTER_LENGTH({td_val}) AS DECIMAL(38,0)))", f"SUM(LENGTH({sf_val}))", False)]
+            continue
+        measures.append((f"{name}.count", f"COUNT({td_col})", f"COUNT({sf_col})", False))
+        scale = None
+        if code in _VALIDATION_INTEGER_TYPES:
+            scale = 0
+        elif code == 'D' and len(details) >= 3 and details[1] is not None:
+            scale = details[2] or 0
+        if scale is not None or code == 'F':
+            td_sum = f"SUM(CAST({td_col} AS DECIMAL(38,{scale})))" if scale is not None else f"SUM({td_col})"
+            measures.append((f"{name}.sum", td_sum, f"SUM({sf_col})", code == 'F'))
+        if scale is not None or code in ('F', 'DA', 'TS'):
+            measures += [(f"{name}.min", f"MIN({td_col})", f"MIN({sf_col})", code == 'F'),
+                         (f"{name}.max", f"MAX({td_col})", f"MAX({sf_col})", code == 'F')]
+    return measures
+
+
+def _same_value(a, b, tolerant):
+    if a is None or b is None:
+        return a is None and b is None
+    if tolerant:
+        return math.isclose(float(a), float(b), rel_tol=1e-9, abs_tol=1e-9)
+    return a == b
+
+
+def validate_table(config, sf_cursor, table_name, database_name, columns, key_columns, log_func):
+    """
+    Compares a migrated table between Teradata and Snowflake without moving its data: both
+    sides compute the same aggregates (row count, per-column non-null counts, sums, min/max,
+    character lengths) in pushdown SQL, and, given an integer key column, the exact ones again
+    per bucket of key MOD [MIGRATOR] VALIDATION_BUCKETS (default 16) to narrow down where rows
+    differ. The two systems share no hash function, so the bucket digest is built from these
+    arithmetic aggregates. Returns {"status": "PASSED"|"FAILED"|"ERROR", "checks", "mismatches", ...}.
+    """
+    measures = _validation_measures(columns)
+    types = {name.strip().upper(): td_type.strip() for name, td_type, *_ in columns}
+    key = next((k for k in key_columns or [] if types.get(k.strip().upper()) in _VALIDATION_INTEGER_TYPES), None)
+    buckets = int(config.get('MIGRATOR', 'VALIDATION_BUCKETS', fallback=16)) if key else 0
+    exact = [m for m in measures if not m[3]]
+    full_table_name = f"{database_name}.{table_name}"
+    td_sql = f"SELECT {', '.join(m[1] for m in measures)} FROM {full_table_name};"
+    if buckets:
+        td_bucket_sql = (f'SELECT ("{key.strip()}" MOD {buckets}) AS bucket_id, {", ".join(m[1] for m in exact)} '
+                         f"FROM {full_table_name} GROUP BY 1;")
+    try:
+        log_func(f"  [VALIDATE] Computing {len(measures)} aggregates{f' and {buckets} key buckets' if buckets else ''} on both sides...")
+        with get_teradata_pool(config).connection() as conn, conn.cursor() as cur:
+            cur.execute(td_sql)
+            td_totals = cur.fetchone()
+            if buckets:
+                cur.execute(td_bucket_sql)
+                td_buckets = {row[0]: row[1:] for row in cur.fetchall()}
+        sf_totals = sf_ops.validation_aggregates(config, sf_cursor, table_name, [m[2] for m in measures])
+        if buckets:
+            sf_buckets = sf_ops.validation_aggregates(config, sf_cursor, table_name, [m[2] for m in exact],
+                                                      bucket_expr=f'MOD("{key.strip().upper()}", {buckets})')
+    except Exception as e:
+        log_func(f"  [VALIDATE ERROR] Could not compute the validation aggregates: {e}")
+        return {"status": "ERROR", "checks": 0, "mismatches": [], "error": str(e)[:1000]}
+
+    mismatches = [f"{label}: teradata={td!s} snowflake={sf!s}"
+                  for (label, _, _, tolerant), td, sf in zip(measures, td_totals, sf_totals) if not _same_value(td, sf, tolerant)]
+    checks = len(measures)
+    if buckets:
+        for bucket in sorted(set(td_buckets) | set(sf_buckets), key=str):
+            td_row, sf_row = td_buckets.get(bucket), sf_buckets.get(bucket)
+            checks += len(exact)
+            if td_row is None or sf_row is None:
+                mismatches.append(f"bucket {bucket}: only in {'snowflake' if td_row is None else 'teradata'}")
+                continue
+            mismatches += [f"bucket {bucket} {label}: teradata={td!s} snowflake={sf!s}"
+                           for (label, _, _, _), td, sf in zip(exact, td_row, sf_row) if not _same_value(td, sf, False)]
+    status = "FAILED" if mismatches else "PASSED"
+    log_func(f"  [VALIDATE] {status}: {checks} checks, {len(mismatches)} mismatch(es).")
+    for mismatch in mismatches[:10]:
+        log_func(f"    [VALIDATE] {mismatch}")
+    return {"status": status, "checks": checks, "key": key, "buckets": buckets, "mismatches": mismatches[:50]}
+
+
+def _validation_enabled(config, migration_details):
+    if 'validate' in migration_details:
+        return bool(migration_details['validate'])
+    return config.getboolean('MIGRATOR', 'VALIDATION', fallback=False)
+
+
+def _validate_full_load(config, sf_cursor, table_name, database_name, migration_details, columns, catalog, timer, result, log_func):
+    """Runs validate_table if the job asks for it; returns False only for a FAILED validation."""
+    if not _validation_enabled(config, migration_details):
+        return True
+    key_columns = list((catalog or {}).get(table_name, {}).get("primary_index") or [])
+    if migration_details.get('primary_key_column'):
+        key_columns.append(migration_details['primary_key_column'])
+    with timer.span('validate'):
+        result["validation"] = validate_table(config, sf_cursor, table_name, database_name, columns, key_columns, log_func)
+    return result["validation"]["status"] != "FAILED"
+
+
+def migrate_table(config, table_name, database_name, sf_cursor, log_func, migration_details, catalog=None, load_watcher=None,
+                  control=None):
+    """
+    Migrates one table end to end. With migration_details['validate'] a full load is then
+    checked with validate_table; a failed validation fails the table, and the outcome is
+    returned as result["validation"] for the audit log.
+    """
     log_func(f"[DEBUG] Current Working Directory is: {os.getcwd()}")
     log_func("\n" + "=" * 70)
     log_func(f"             Processing Table: {table_name.upper()}")
     log_func(f"             Mode: {migration_details['type']}")
     log_func("=" * 70)
 
-    result = {"success": False, "rows_processed": 0, "watermark_start": None, "watermark_end": None}
+    timer = StageTimer(table_name)
+    result = {"success": False, "rows_processed": 0, "watermark_start": None, "watermark_end": None,
+              "stage_timings": timer.spans}
     migration_type = migration_details['type']
 
+    catalog_entry = (catalog or {}).get(table_name)
+
     if migration_type == 'Full Load (Replaces table)':
-        success, _, rows_processed = run_teradata_to_azure_tpt(config, table_name, database_name, log_func, migration_details)
+        success, _, rows_processed, loaded = run_teradata_to_azure_tpt(config, table_name, database_name, log_func, migration_details,
+                                                                       catalog_entry=catalog_entry,
+                                                                       sf_cursor=sf_cursor, timer=timer)
         result["rows_processed"] = rows_processed
         if not success: return result
         if rows_processed == 0:
@@ -205,29 +1003,57 @@ def migrate_table(config, table_name, database_name, sf_cursor, log_func, migrat
             result["success"] = True
             return result
 
-        log_func("  [TD] Getting source table schema with data types...")
-        teradata_columns_with_types = get_teradata_columns(config, database_name, table_name)
+        if catalog and table_name in catalog:
+            log_func("  [TD] Using prefetched source table schema with data types.")
+            teradata_columns_with_types = catalog[table_name]["columns"]
+        else:
+            log_func("  [TD] Getting source table schema with data types...")
+            teradata_columns_with_types = get_teradata_columns(config, database_name, table_name)
         if not teradata_columns_with_types:
             log_func(f"[ERROR] Could not retrieve column names and types for '{table_name}'. Aborting.")
             return result
 
-        pipe_name = sf_ops.create_table_and_pipe(config, sf_cursor, table_name, database_name, teradata_columns_with_types, log_func)
-        if not pipe_name: return result
+        if loaded:
+            log_func("  [RESUME] Not loading again: an earlier run's load of this export was confirmed.")
+        elif migration_details.get('full_load_method') == 'copy':
+            with stage_slot(config, 'load'), timer.span('load_wait', 'COPY INTO (incl. CREATE TABLE)') as span:
+                copied, rows_loaded = sf_ops.create_table_and_copy(config, sf_cursor, table_name, database_name,
+                                                                    teradata_columns_with_types, rows_processed, log_func)
+                span['rows'] = rows_loaded
+            if not copied: return result
+            result["rows_processed"] = rows_loaded  # exact count from the COPY result
+        else:
+            with stage_slot(config, 'load'):
+                with timer.span('create'):
+                    pipe_name = sf_ops.create_table_and_pipe(config, sf_cursor, table_name, database_name, teradata_columns_with_types, log_func)
+                if not pipe_name: return result
 
-        pipe_success = sf_ops.refresh_and_verify_pipe(config, sf_cursor, pipe_name, table_name, database_name, rows_processed, log_func)
-        if not pipe_success:
-            log_func(f"[ERROR] Data ingestion via Snowpipe for '{table_name}' failed or timed out.")
-            return result
+                with timer.span('load_wait', 'Snowpipe') as span:
+                    pipe_success = sf_ops.refresh_and_verify_pipe(config, sf_cursor, pipe_name, table_name, database_name, rows_processed, log_func,
+                                                                  load_watcher=load_watcher)
+                    span['rows'] = rows_processed if pipe_success else None
+            if not pipe_success:
+                log_func(f"[ERROR] Data ingestion via Snowpipe for '{table_name}' failed or timed out.")
+                return result
 
-        result["success"] = True
+        _mark_chunk_checkpoints_loaded(config, sf_cursor, table_name, log_func)
+        result["success"] = _validate_full_load(config, sf_cursor, table_name, database_name, migration_details,
+                                                teradata_columns_with_types, catalog, timer, result, log_func)
+        # Validation compares with the live source, so after a failed one the rerun exports again too
+        _clear_chunk_checkpoints(config, sf_cursor, table_name, log_func)
         return result
 
     elif migration_type == 'Delta Load (Incremental)':
-        last_watermark = sf_ops.get_last_watermark(sf_cursor, table_name, log_func)
+        if control is not None:
+            last_watermark = control.get_watermark(table_name, log_func)
+        else:
+            last_watermark = sf_ops.get_last_watermark(sf_cursor, table_name, log_func)
         result["watermark_start"] = last_watermark
         log_func(f"[DELTA] Current watermark for '{table_name}' is: {last_watermark}")
 
-        success, new_watermark, rows_processed = run_teradata_to_azure_tpt(config, table_name, database_name, log_func, migration_details, last_watermark)
+        success, new_watermark, rows_processed, loaded = run_teradata_to_azure_tpt(config, table_name, database_name, log_func, migration_details,
+                                                                                   last_watermark, catalog_entry=catalog_entry,
+                                                                                   sf_cursor=sf_cursor, timer=timer)
         result["rows_processed"] = rows_processed
         if not success: return result
 
@@ -238,10 +1064,29 @@ def migrate_table(config, table_name, database_name, sf_cursor, log_func, migrat
             return result
 
         result["watermark_end"] = new_watermark
-        merge_success, _ = sf_ops.load_and_merge_delta(config, sf_cursor, table_name, database_name, log_func, migration_details)
-        if not merge_success: return result
+        if _validation_enabled(config, migration_details):
+            log_func("  [VALIDATE] Skipped for delta loads: deletes and rows changed since the watermark are not carried over, "
+                     "so the two tables are not expected to match.")
+        if loaded:
+            log_func("  [RESUME] Not merging again: an earlier run's load of this delta was confirmed; writing its watermark.")
+        else:
+            with stage_slot(config, 'load'), timer.span('merge', 'COPY + MERGE') as span:
+                merge_success, span['rows'] = sf_ops.load_and_merge_delta(config, sf_cursor, table_name, database_name, log_func, migration_details)
+            if not merge_success: return result
+            _mark_chunk_checkpoints_loaded(config, sf_cursor, table_name, log_func)
 
-        sf_ops.update_watermark(sf_cursor, table_name, new_watermark, log_func)
+        with timer.span('watermark'):
+            if control is not None:
+                # A rerun from the old watermark would INSERT the batch twice, so append-only tables do not wait for the batch flush
+                watermark_written = control.update_watermark(table_name, new_watermark, log_func, sync=bool(migration_details.get('append_only')))
+            else:
+                watermark_written = sf_ops.update_watermark(sf_cursor, table_name, new_watermark, log_func)
+        if not watermark_written and migration_details.get('append_only'):
+            # The checkpoints stay, marked loaded, so the rerun writes the watermark without inserting again
+            log_func("[ERROR] Rows were inserted but the watermark was not saved; rerun the table to write it "
+                     "(with CHUNK_CHECKPOINTS off, a rerun would insert the rows again).")
+            return result
+        _clear_chunk_checkpoints(config, sf_cursor, table_name, log_func)
         result["success"] = True
         return result
 
@@ -0,0 +1,88 @@
+import sys
+
+import snowflake.connector
+
+import Teradata_Migration.metrics as metrics
+import Teradata_Migration.migrator as migrator
+import Teradata_Migration.snowflake_operations_1 as sf_ops
+
+# Worker-side code shared by the Streamlit app and the headless CLI; nothing here may import streamlit.
+
+
+def connect_to_snowflake(config):
+    try:
+        sf_conn = snowflake.connector.connect(
+            user=config['SNOWFLAKE']['USER'],
+            password=config['SNOWFLAKE']['PASSWORD'],
+            account=config['SNOWFLAKE']['ACCOUNT'],
+            warehouse=config['SNOWFLAKE']['WAREHOUSE'],
+            database=config['SNOWFLAKE']['DATABASE'],
+            schema=config['SNOWFLAKE']['SCHEMA'],
+            role=config['SNOWFLAKE']['ROLE']
+        )
+        return sf_conn, sf_conn.cursor()
+    except Exception as e:
+        print(f"Failed to connect to Snowflake: {e}", file=sys.stderr)
+        return None, None
+
+
+def run_table(config, table_name, database_name, log_func, migration_details, job_id, catalog=None, load_watcher=None,
+              control=None):
+    """
+    Migrates one table on a worker thread with its own Snowflake connection, recording the run
+    in the audit log (through `control` when given). Returns the migrate_table result, with
+    "success" and "error_message" always set.
+    """
+    log_func(f"[{table_name}] Wrapper started.")
+
+    sf_conn, sf_cursor = None, None
+    audit_id = None
+    migration_result = {}
+    error_message = None
+
+    try:
+        sf_conn, sf_cursor = connect_to_snowflake(config)
+        if not sf_conn:
+            raise Exception("Failed to establish Snowflake connection inside the thread.")
+
+        if control is not None:
+            audit_id = control.start_audit(job_id, table_name, migration_details['type'])
+        else:
+            watermark_value = sf_ops.get_last_watermark(sf_cursor, table_name, log_func) if migration_details['type'] == 'Delta Load (Incremental)' else None
+            audit_id = sf_ops.start_audit_log(sf_cursor, job_id, table_name, migration_details['type'], watermark_value)
+
+        migration_result = migrator.migrate_table(config, table_name, database_name, sf_cursor, log_func=log_func, migration_details=migration_details,
+                                                  catalog=catalog, load_watcher=load_watcher, control=control)
+        log_func(f"[{table_name}] Wrapper finished with success={migration_result.get('success', False)}.")
+
+    except Exception as e:
+        error_message = str(e)
+        log_func(f"[{table_name}] CRITICAL ERROR IN WRAPPER: {e}")
+        print(f"[{table_name}] Unhandled exception in wrapper: {e}", file=sys.stderr)
+
+    finally:
+        final_status_for_audit = "SUCCESS" if migration_result.get("success", False) else "FAILED"
+        stage_timings = migration_result.get("stage_timings")
+        if stage_timings:
+            log_func(metrics.summarize_spans(stage_timings))
+        if control is not None and audit_id is not None:
+            control.finish_audit(audit_id, final_status_for_audit, migration_result.get("rows_processed", 0), error_message,
+                                 stage_timings=stage_timings, validation=migration_result.get("validation"))
+        elif sf_cursor:
+            sf_ops.finish_audit_log(
+                sf_cursor,
+                audit_id=audit_id,
+                status=final_status_for_audit,
+                rows_processed=migration_result.get("rows_processed", 0),
+                watermark_end=None,
+                error_message=error_message,
+                stage_timings=stage_timings,
+                validation=migration_result.get("validation")
+            )
+        if sf_cursor:
+            sf_cursor.close()
+        if sf_conn:
+            sf_conn.close()
+        log_func(f"[{table_name}] Snowflake connection closed.")
+
+    return {**migration_result, "success": migration_result.get("success", False), "error_message": error_message}
@@ -2,7 +2,11 @@ import snowflake.connector
 from azure.storage.blob import BlobServiceClient
 import sys
 import datetime
+import itertools
+import json
+import threading
 import time
+import uuid
 
 def get_snowflake_type(teradata_type_code):
     """Maps Teradata data type codes to their Snowflake equivalents."""
@@ -10,29 +14,68 @@ def get_snowflake_type(teradata_type_code):
     mapping = { 'CF': 'VARCHAR', 'CV': 'VARCHAR', 'CO': 'VARCHAR', 'CG': 'VARCHAR', 'VG': 'VARCHAR', 'I1': 'TINYINT', 'I2': 'SMALLINT', 'I': 'INTEGER', 'I8': 'BIGINT', 'D': 'DECIMAL', 'N': 'NUMBER', 'F': 'FLOAT', 'DA': 'DATE', 'AT': 'TIME', 'TZ': 'TIME', 'TS': 'TIMESTAMP_NTZ', 'SZ': 'TIMESTAMP_TZ', 'YR': 'VARCHAR', 'YM': 'VARCHAR', 'MO': 'VARCHAR', 'DY': 'VARCHAR', 'DH': 'VARCHAR', 'DM': 'VARCHAR', 'DS': 'VARCHAR', 'HR': 'VARCHAR', 'HM': 'VARCHAR', 'HS': 'VARCHAR', 'MI': 'VARCHAR', 'MS': 'VARCHAR', 'SC': 'VARCHAR', 'BF': 'BINARY', 'BV': 'BINARY', 'BO': 'BINARY', 'BC': 'BINARY', 'GS': 'GEOGRAPHY', 'MB': 'GEOMETRY', 'JN': 'VARIANT', 'XM': 'VARCHAR', 'AV': 'VARIANT', 'PD': 'VARCHAR', 'PT': 'VARCHAR', 'PZ': 'VARCHAR', 'PS': 'VARCHAR', 'PM': 'VARCHAR', 'A1': 'VARIANT', 'AN': 'VARIANT'}
     return mapping.get(clean_type_code, 'STRING')
 
-def create_table_and_pipe(config, sf_cursor, table_name, database_name, teradata_columns, log_func):
-    """Creates a Snowflake table and a pipe for FULL LOADS."""
-    db_name = config['SNOWFLAKE']['DATABASE']
-    sf_schema = config['SNOWFLAKE']['SCHEMA']
-    stage_name = config['SNOWFLAKE']['STAGE_NAME']
-    file_format_name = config['SNOWFLAKE']['FILE_FORMAT_NAME']
+def export_compression(config):
+    """Compression of the exported files: 'GZIP' (default) or 'NONE', from [AZURE] UPLOAD_COMPRESSION."""
+    return 'NONE' if config.get('AZURE', 'UPLOAD_COMPRESSION', fallback='gzip').strip().lower() == 'none' else 'GZIP'
 
-    table_name_upper = table_name.upper()
-    db_name_upper = db_name.upper()
-    schema_upper = sf_schema.upper()
-    table_fqn = f'"{db_name_upper}"."{schema_upper}"."{table_name_upper}"'
-    pipe_name = f'"{table_name.lower()}_pipe"'
-    pipe_fqn = f'"{db_name_upper}"."{schema_upper}".{pipe_name}'
+def export_format(config):
+    """Intermediate file format of the exports: 'csv' (default) or 'parquet', from [MIGRATOR] EXPORT_FORMAT."""
+    return 'parquet' if config.get('MIGRATOR', 'EXPORT_FORMAT', fallback='csv').strip().lower() == 'parquet' else 'csv'
+
+def export_file_suffix(config):
+    if export_format(config) == 'parquet':
+        return '.parquet'  # compressed inside the file, per column chunk
+    return '.csv.gz' if export_compression(config) == 'GZIP' else '.csv'
 
+def export_file_name_regex(table_name):
+    """
+    Regex for a table's export file name(s): '<table>.csv' or, for a split export,
+    '<table>_partNNNN.csv', with a '_chunkNNNN' suffix for files written by the Python
+    exporter, and optionally gzipped ('.csv.gz') - or '.parquet' for Parquet exports.
+    """
+    return f"{table_name.lower()}(_part[0-9]{{4}})?(_chunk[0-9]{{4}})?[.](csv([.]gz)?|parquet)"
+
+def _file_format_clause(config, file_format_name):
+    """File format (and column mapping) of the pipe and COPY statements for the configured export format."""
+    if export_format(config) == 'parquet':
+        parquet_format_name = config.get('SNOWFLAKE', 'PARQUET_FILE_FORMAT_NAME', fallback=None)
+        file_format = f"FORMAT_NAME = '{parquet_format_name}'" if parquet_format_name else "TYPE = PARQUET"
+        return f"FILE_FORMAT = ({file_format}) MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE"
+    return f"FILE_FORMAT = (FORMAT_NAME = '{file_format_name}', SKIP_HEADER = 0, COMPRESSION = {export_compression(config)})"
+
+def export_file_regex(teradata_db, table_name):
+    """Regex for the blob path(s) of a table's export within the container/stage."""
+    return f"{teradata_db.lower()}/{export_file_name_regex(table_name)}"
+
+def _create_table_sql(config, table_name, teradata_columns, log_func):
+    """Returns (table_fqn, CREATE OR REPLACE TABLE statement) for a full load's target table."""
+    db_name = config['SNOWFLAKE']['DATABASE']
+    sf_schema = config['SNOWFLAKE']['SCHEMA']
+    table_fqn = f'"{db_name.upper()}"."{sf_schema.upper()}"."{table_name.upper()}"'
     log_func(f"  [SF] Source columns and types found: {teradata_columns}")
 
     col_defs_list = []
-    for col_name, td_type in teradata_columns:
+    for col_name, td_type, *details in teradata_columns:
         sf_type = get_snowflake_type(td_type)
+        # Prefetched catalog rows also carry (length, precision, scale, ...): keep DECIMAL scale
+        if sf_type == 'DECIMAL' and len(details) >= 3 and details[1] is not None:
+            sf_type = f"NUMBER({details[1]},{details[2] or 0})"
         col_defs_list.append(f'"{col_name.upper()}" {sf_type}')
     col_defs = ", ".join(col_defs_list)
     create_table_sql = f"CREATE OR REPLACE TABLE {table_fqn} ({col_defs});"
     log_func(f"  [DEBUG] Generated CREATE TABLE SQL: {create_table_sql}")
+    return table_fqn, create_table_sql
+
+def create_table_and_pipe(config, sf_cursor, table_name, database_name, teradata_columns, log_func):
+    """Creates a Snowflake table and a pipe for FULL LOADS."""
+    db_name = config['SNOWFLAKE']['DATABASE']
+    sf_schema = config['SNOWFLAKE']['SCHEMA']
+    stage_name = config['SNOWFLAKE']['STAGE_NAME']
+    file_format_name = config['SNOWFLAKE']['FILE_FORMAT_NAME']
+
+    pipe_name = f'"{table_name.lower()}_pipe"'
+    pipe_fqn = f'"{db_name.upper()}"."{sf_schema.upper()}".{pipe_name}'
+    table_fqn, create_table_sql = _create_table_sql(config, table_name, teradata_columns, log_func)
 
     stage_path = f"@{stage_name}/{database_name.lower()}"
     create_pipe_sql = f"""
@@ -40,8 +83,8 @@ def create_table_and_pipe(config, sf_cursor, table_name, database_name, teradata
     AUTO_INGEST = FALSE AS
     COPY INTO {table_fqn}
     FROM {stage_path}
-    FILE_FORMAT = (FORMAT_NAME = '{file_format_name}', SKIP_HEADER = 0)
-    PATTERN = '.*{table_name.lower()}.csv';
+    {_file_format_clause(config, file_format_name)}
+    PATTERN = '(.*/)?{export_file_name_regex(table_name)}';
     """
     try:
         log_func(f"  [SF] Executing CREATE TABLE for {table_fqn}...")
@@ -53,8 +96,235 @@ def create_table_and_pipe(config, sf_cursor, table_name, database_name, teradata
         log_func(f"  [SF ERROR] Could not create objects for {table_fqn}: {e}")
         return None
 
-def refresh_and_verify_pipe(config, sf_cursor, pipe_name_fqn, table_name, teradata_db, expected_rows, log_func, timeout_seconds=600):
-    """Refreshes a Snowpipe and verifies completion."""
+def _copy_result_rows_loaded(sf_cursor, results):
+    """Sums rows_loaded over a COPY INTO result; returns (rows_loaded, [(file, first_error) of failed files])."""
+    columns = [d[0].lower() for d in sf_cursor.description or []]
+    if 'rows_loaded' not in columns:  # "Copy executed with 0 files processed."
+        return 0, []
+    file_idx, status_idx, rows_idx = columns.index('file'), columns.index('status'), columns.index('rows_loaded')
+    error_idx = columns.index('first_error') if 'first_error' in columns else None
+    failed = [(row[file_idx], row[error_idx] if error_idx is not None else None)
+              for row in results if str(row[status_idx]).upper() in ('LOAD_FAILED', 'PARTIALLY_LOADED')]
+    return sum(row[rows_idx] or 0 for row in results), failed
+
+def create_table_and_copy(config, sf_cursor, table_name, database_name, teradata_columns, expected_rows, log_func):
+    """
+    Creates a Snowflake table and loads it for FULL LOADS with one synchronous COPY INTO from
+    the stage, instead of a pipe. Snowflake loads the export's files in parallel; the loaded
+    row count comes straight from the COPY result, so nothing is polled.
+    [MIGRATOR] COPY_PURGE (default false) removes the files from the stage after a successful
+    load; COPY_FORCE (default true) reloads files even if their names were loaded before.
+    Returns (success, rows_loaded).
+    """
+    stage_name = config['SNOWFLAKE']['STAGE_NAME']
+    file_format_name = config['SNOWFLAKE']['FILE_FORMAT_NAME']
+    purge = config.getboolean('MIGRATOR', 'COPY_PURGE', fallback=False)
+    force = config.getboolean('MIGRATOR', 'COPY_FORCE', fallback=True)
+
+    table_fqn, create_table_sql = _create_table_sql(config, table_name, teradata_columns, log_func)
+    copy_sql = (f"COPY INTO {table_fqn} FROM '@{stage_name}/{database_name.lower()}/' "
+                f"PATTERN = '(.*/)?{export_file_name_regex(table_name)}' {_file_format_clause(config, file_format_name)} "
+                f"ON_ERROR = ABORT_STATEMENT PURGE = {str(purge).upper()} FORCE = {str(force).upper()};")
+    try:
+        log_func(f"  [SF] Executing CREATE TABLE for {table_fqn}...")
+        sf_cursor.execute(create_table_sql)
+        log_func(f"  [SF] Loading {table_fqn} with COPY INTO (PURGE = {purge}, FORCE = {force})...")
+        sf_cursor.execute(copy_sql)
+        rows_loaded, failed = _copy_result_rows_loaded(sf_cursor, sf_cursor.fetchall())
+    except snowflake.connector.errors.ProgrammingError as e:
+        log_func(f"  [SF ERROR] Could not load {table_fqn}: {e}")
+        return False, 0
+    if failed:
+        log_func(f"  [SF ERROR] COPY INTO failed for {failed[0][0]}. Reason: {failed[0][1]}")
+        return False, rows_loaded
+    if rows_loaded < expected_rows:
+        log_func(f"  [SF ERROR] COPY INTO loaded {rows_loaded} rows, expected {expected_rows}.")
+        return False, rows_loaded
+    log_func(f"  [SF SUCCESS] COPY INTO loaded {rows_loaded} rows.")
+    return True, rows_loaded
+
+def validation_aggregates(config, sf_cursor, table_name, expressions, bucket_expr=None):
+    """
+    Computes validation aggregates over a migrated table in Snowflake: one row of `expressions`,
+    or with `bucket_expr` {bucket: row} grouped by it.
+    """
+    table_fqn = f'"{config["SNOWFLAKE"]["DATABASE"].upper()}"."{config["SNOWFLAKE"]["SCHEMA"].upper()}"."{table_name.upper()}"'
+    if bucket_expr is None:
+        sf_cursor.execute(f"SELECT {', '.join(expressions)} FROM {table_fqn};")
+        return sf_cursor.fetchone()
+    sf_cursor.execute(f"SELECT {bucket_expr} AS BUCKET_ID, {', '.join(expressions)} FROM {table_fqn} GROUP BY 1;")
+    return {row[0]: row[1:] for row in sf_cursor.fetchall()}
+
+class PendingLoad:
+    """One pipe load registered with a PipeLoadWatcher; `wait()` blocks until it is resolved."""
+
+    def __init__(self, load_id, pipe_fqn, history_table, table_fqn, file_regex, expected_rows, start_time, log_func):
+        self.load_id = load_id
+        self.pipe_fqn = pipe_fqn
+        self.history_table = history_table
+        self.table_fqn = table_fqn
+        self.file_regex = file_regex
+        self.expected_rows = expected_rows
+        self.start_time = start_time
+        self.log_func = log_func
+        self.registered_at = time.monotonic()
+        self.status = None  # 'LOADED' or 'LOAD_FAILED' once resolved
+        self.message = None
+        self.pipe_state = None
+        self._done = threading.Event()
+
+    def resolve(self, status, message):
+        self.status, self.message = status, message
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Returns True once the load is resolved, False if `timeout` seconds pass first."""
+        return self._done.wait(timeout)
+
+
+class PipeLoadWatcher:
+    """
+    Shared watcher for the Snowpipe loads of a migration job.
+
+    Table workers register their load with `watch()` and block on the returned PendingLoad.
+    A single background thread polls COPY_HISTORY and SYSTEM$PIPE_STATUS for every pending
+    load in one UNION ALL query, starting ~1 s after a new load is registered and backing off
+    exponentially up to [MIGRATOR] LOAD_POLL_MAX_SECONDS, and wakes each worker as soon as its
+    files are LOADED or LOAD_FAILED. Loads still missing from the history after
+    LOAD_COUNT_FALLBACK_SECONDS are also checked with a COUNT(*) of the target table in the
+    same query, because copy_history can lag behind the data.
+
+    `connect` returns a (connection, cursor) pair used by the polling thread; the thread
+    runs (and holds the connection) only while loads are pending. A None connection is
+    left open, so a worker's own cursor can be reused for a private watcher.
+    """
+
+    def __init__(self, config, connect):
+        self.connect = connect
+        self.min_interval = float(config.get('MIGRATOR', 'LOAD_POLL_MIN_SECONDS', fallback=1))
+        self.max_interval = float(config.get('MIGRATOR', 'LOAD_POLL_MAX_SECONDS', fallback=30))
+        self.count_fallback_after = float(config.get('MIGRATOR', 'LOAD_COUNT_FALLBACK_SECONDS', fallback=15))
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._new_load = False
+
+    def watch(self, pipe_fqn, history_table, table_fqn, file_regex, expected_rows, start_time, log_func):
+        with self._cond:
+            load = PendingLoad(next(self._ids), pipe_fqn, history_table, table_fqn, file_regex,
+                               expected_rows, start_time, log_func)
+            self._pending[load.load_id] = load
+            self._new_load = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pipe-load-watcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return load
+
+    def cancel(self, load):
+        with self._cond:
+            self._pending.pop(load.load_id, None)
+            self._cond.notify()
+
+    def join(self, timeout=None):
+        """Waits for the polling thread to exit (it does once nothing is pending)."""
+        with self._cond:
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _poll_sql(self, loads):
+        now = time.monotonic()
+        parts = []
+        for load in loads:
+            parts.append(
+                f"SELECT {load.load_id} AS LOAD_ID, FILE_NAME, STATUS, ROW_COUNT, FIRST_ERROR_MESSAGE "
+                f"FROM table(information_schema.copy_history(TABLE_NAME=>'{load.history_table}', "
+                f"START_TIME=>'{load.start_time.isoformat()}'::TIMESTAMP_LTZ)) WHERE RLIKE(file_name, '{load.file_regex}')")
+            parts.append(f"SELECT {load.load_id}, NULL, 'PIPE_STATUS', NULL, SYSTEM$PIPE_STATUS('{load.pipe_fqn}')")
+            if now - load.registered_at > self.count_fallback_after:
+                parts.append(f"SELECT {load.load_id}, NULL, 'ROW_COUNT', COUNT(*), NULL FROM {load.table_fqn}")
+        return "\nUNION ALL\n".join(parts) + ";"
+
+    def _check(self, load, rows):
+        """Resolves `load` from its rows of the poll result, if they settle it."""
+        history = [(name, (status or '').upper().replace(' ', '_'), row_count, error_msg)
+                   for _, name, status, row_count, error_msg in rows if status not in ('PIPE_STATUS', 'ROW_COUNT')]
+        failed = [(name, error_msg) for name, status, _, error_msg in history if status == 'LOAD_FAILED']
+        if failed:
+            load.resolve('LOAD_FAILED', f"copy_history reported LOAD_FAILED for {failed[0][0]}. Reason: {failed[0][1]}")
+            return
+        loaded_rows = sum(row_count or 0 for _, status, row_count, _ in history if status == 'LOADED')
+        if history:
+            load.log_func(f"    [SF] Load status from history: {len(history)} file(s), Rows Loaded: {loaded_rows}")
+        if loaded_rows >= load.expected_rows:
+            load.resolve('LOADED', "copy_history confirmed LOADED.")
+            return
+        for _, _, kind, value, detail in rows:
+            if kind == 'ROW_COUNT' and value is not None and value >= load.expected_rows:
+                load.resolve('LOADED', f"Fallback row count check passed ({value} of {load.expected_rows} rows).")
+                return
+            if kind == 'PIPE_STATUS' and detail:
+                state = json.loads(detail).get('executionState')
+                if state != load.pipe_state:
+                    load.log_func(f"    [SF] Pipe execution state: {state}")
+                    load.pipe_state = state
+                if state and state != 'RUNNING':
+                    load.resolve('LOAD_FAILED', f"Pipe {load.pipe_fqn} is not running (executionState {state}).")
+                    return
+
+    def _run(self):
+        conn, cursor = None, None
+        try:
+            conn, cursor = self.connect()
+            if cursor is None:
+                raise RuntimeError("Could not open a Snowflake connection for the load watcher.")
+            interval = self.min_interval
+            while True:
+                with self._cond:
+                    if not self._new_load:
+                        self._cond.wait(interval)
+                    if self._new_load:
+                        self._new_load = False
+                        interval = self.min_interval
+                        self._cond.wait(interval)  # give a just-refreshed pipe a moment before the first poll
+                    loads = list(self._pending.values())
+                    if not loads:
+                        self._thread = None
+                        return
+                try:
+                    cursor.execute(self._poll_sql(loads))
+                    rows_by_load = {}
+                    for row in cursor.fetchall():
+                        rows_by_load.setdefault(row[0], []).append(row)
+                    for load in loads:
+                        self._check(load, rows_by_load.get(load.load_id, []))
+                except Exception as e:
+                    for load in loads:
+                        load.log_func(f"  [SF WARN] Could not check load status, will retry... Error: {e}")
+                with self._cond:
+                    for load in loads:
+                        if load.status is not None:
+                            self._pending.pop(load.load_id, None)
+                interval = min(interval * 2, self.max_interval)
+        except Exception as e:
+            with self._cond:
+                loads, self._pending, self._thread = list(self._pending.values()), {}, None
+            for load in loads:
+                load.resolve('LOAD_FAILED', f"Load watcher stopped: {e}")
+        finally:
+            if conn is not None:
+                try: conn.close()
+                except Exception: pass
+
+
+def refresh_and_verify_pipe(config, sf_cursor, pipe_name_fqn, table_name, teradata_db, expected_rows, log_func,
+                            timeout_seconds=600, load_watcher=None):
+    """
+    Refreshes a Snowpipe and waits until `load_watcher` (the job's shared PipeLoadWatcher,
+    or a private one polling on `sf_cursor`) sees the load finish.
+    """
     sf_db = config['SNOWFLAKE']['DATABASE']
     sf_schema = config['SNOWFLAKE']['SCHEMA']
 
@@ -67,50 +337,24 @@ def refresh_and_verify_pipe(config, sf_cursor, pipe_name_fqn, table_name, terada
         log_func(f"  [SF ERROR] Could not refresh pipe {pipe_name_fqn}: {e}")
         return False
 
-    start_time_for_timeout = time.time()
     table_fqn_for_sql = f'"{sf_db.upper()}"."{sf_schema.upper()}"."{table_name.upper()}"'
     table_fqn_for_history_func = f"{sf_db.upper()}.{sf_schema.upper()}.{table_name.upper()}"
-    blob_path_for_history = f"{teradata_db.lower()}/{table_name.lower()}.csv"
-    fallback_check_triggered = False
-
-    while time.time() - start_time_for_timeout < timeout_seconds:
-        time.sleep(20)
-        if not fallback_check_triggered and (time.time() - start_time_for_timeout) > 15:
-            log_func("    [SF] copy_history is slow to update. Triggering row count fallback check.")
-            fallback_check_triggered = True
-            try:
-                sf_cursor.execute(f'SELECT COUNT(*) FROM {table_fqn_for_sql};')
-                current_rows = sf_cursor.fetchone()[0]
-                log_func(f"    [SF Fallback] Expected rows: {expected_rows}, Found in table: {current_rows}")
-                if current_rows >= expected_rows:
-                    log_func(f"  [SF SUCCESS] Fallback check PASSED. Row count matches.")
-                    return True
-            except Exception as e:
-                log_func(f"    [SF WARN] Fallback check failed: {e}")
-
-        try:
-            history_query = f"""
-            SELECT STATUS, ROW_COUNT, FIRST_ERROR_MESSAGE
-            FROM table(information_schema.copy_history(TABLE_NAME=>'{table_fqn_for_history_func}', START_TIME=>'{start_time_utc_for_query.isoformat()}'::TIMESTAMP_LTZ))
-            WHERE file_name LIKE '%{blob_path_for_history}' ORDER BY last_load_time DESC LIMIT 1;
-            """
-            sf_cursor.execute(history_query)
-            result = sf_cursor.fetchone()
-            if result:
-                status, row_count, error_msg = result
-                log_func(f"    [SF] Load status from history: {status}, Rows Loaded: {row_count}")
-                if status == 'LOADED':
-                    log_func(f"  [SF SUCCESS] copy_history confirmed LOADED.")
-                    return True
-                elif status == 'LOAD_FAILED':
-                    log_func(f"  [SF ERROR] copy_history reported LOAD_FAILED. Reason: {error_msg}")
-                    return False
-            else:
-                log_func("    [SF] No load history found for the file yet. Waiting...")
-        except Exception as e:
-            log_func(f"  [SF WARN] Could not check copy history, will retry... Error: {e}")
-    log_func(f"  [SF ERROR] Pipe refresh verification timed out after {timeout_seconds} seconds.")
-    return False
+    blob_regex_for_history = f"(.*/)?{export_file_regex(teradata_db, table_name)}"
+
+    watcher = load_watcher or PipeLoadWatcher(config, lambda: (None, sf_cursor))
+    load = watcher.watch(pipe_name_fqn, table_fqn_for_history_func, table_fqn_for_sql, blob_regex_for_history,
+                         expected_rows, start_time_utc_for_query, log_func)
+    if not load.wait(timeout_seconds):
+        watcher.cancel(load)
+        if load_watcher is None:
+            watcher.join()  # the private watcher polls on sf_cursor, which the caller uses next
+        log_func(f"  [SF ERROR] Pipe refresh verification timed out after {timeout_seconds} seconds.")
+        return False
+    if load.status != 'LOADED':
+        log_func(f"  [SF ERROR] {load.message}")
+        return False
+    log_func(f"  [SF SUCCESS] {load.message}")
+    return True
 
 def get_last_watermark(sf_cursor, table_name, log_func):
     """Fetches the last successful watermark value from the control table."""
@@ -124,7 +368,7 @@ def get_last_watermark(sf_cursor, table_name, log_func):
         return None
 
 def update_watermark(sf_cursor, table_name, new_watermark, log_func):
-    """Updates (or inserts) the watermark value for a table."""
+    """Updates (or inserts) the watermark value for a table. Returns True if it was written."""
     log_func(f"  [SF] Updating watermark for '{table_name}' to '{new_watermark}'")
     try:
         watermark_str = new_watermark.strftime('%Y-%m-%d %H:%M:%S.%f') if isinstance(new_watermark, datetime.datetime) else str(new_watermark)
@@ -137,11 +381,110 @@ def update_watermark(sf_cursor, table_name, new_watermark, log_func):
         """
         sf_cursor.execute(query, (table_name.upper(), watermark_str))
         log_func(f"  [SF] Watermark updated successfully.")
+        return True
     except Exception as e:
         log_func(f"  [SF ERROR] Failed to update watermark for {table_name}: {e}")
+        return False
+
+def get_chunk_checkpoints(sf_cursor, table_name, run_key, log_func, max_age_hours=24):
+    """
+    Returns ({part_id: (blob names, rows exported)}, watermark_end, export_plan, loaded) for the
+    parts of this table's export (`run_key`) that an earlier, unfinished run uploaded completely,
+    with the plan (key ranges) they were cut by; `loaded` is True once a load of all of them was
+    confirmed. The files of a part cut off partway are forgotten: the part is exported again.
+    Checkpoints of any other export of the table, or older than `max_age_hours`, are obsolete and
+    deleted: a full export has no upper bound, so an old one would load an old snapshot of the table.
+    """
+    try:
+        sf_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS MIGRATION_CONTROL.CHUNK_CHECKPOINTS (
+            TABLE_NAME VARCHAR, RUN_KEY VARCHAR, PART_ID INTEGER, CHUNK_ID INTEGER, LAST_CHUNK BOOLEAN, STATUS VARCHAR,
+            BLOB_NAMES VARCHAR, WATERMARK_END VARCHAR, ROWS_EXPORTED NUMBER, EXPORT_PLAN VARCHAR,
+            UPDATED_AT TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP()
+        );
+        """)
+        for column, column_type in (("ROWS_EXPORTED", "NUMBER"), ("EXPORT_PLAN", "VARCHAR"), ("CHUNK_ID", "INTEGER"),
+                                    ("LAST_CHUNK", "BOOLEAN")):
+            sf_cursor.execute(f"ALTER TABLE MIGRATION_CONTROL.CHUNK_CHECKPOINTS ADD COLUMN IF NOT EXISTS {column} {column_type};")
+        sf_cursor.execute("DELETE FROM MIGRATION_CONTROL.CHUNK_CHECKPOINTS WHERE TABLE_NAME = %s "
+                          "AND (RUN_KEY <> %s OR UPDATED_AT < DATEADD(MINUTE, -%s, CURRENT_TIMESTAMP()) OR CHUNK_ID IS NULL)",
+                          (table_name.upper(), run_key, int(max_age_hours * 60)))
+        sf_cursor.execute("SELECT PART_ID, CHUNK_ID, LAST_CHUNK, STATUS, BLOB_NAMES, WATERMARK_END, ROWS_EXPORTED, EXPORT_PLAN "
+                          "FROM MIGRATION_CONTROL.CHUNK_CHECKPOINTS WHERE TABLE_NAME = %s AND RUN_KEY = %s ORDER BY PART_ID, CHUNK_ID",
+                          (table_name.upper(), run_key))
+        rows = sf_cursor.fetchall()
+        chunks = {}
+        for part_id, chunk_id, last_chunk, _, blob_name, _, rows_exported, _ in rows:
+            chunks.setdefault(part_id, {})[chunk_id] = (blob_name, rows_exported, last_chunk)
+        parts, partial = {}, []
+        for part_id, part_chunks in chunks.items():
+            last = [chunk_id for chunk_id, (_, _, last_chunk) in part_chunks.items() if last_chunk]
+            if last and set(part_chunks) == set(range(last[0] + 1)):
+                parts[part_id] = ([part_chunks[c][0] for c in sorted(part_chunks) if part_chunks[c][0]],
+                                  sum(part_chunks[c][1] or 0 for c in part_chunks))
+            else:
+                partial.append(part_id)
+        if partial:
+            sf_cursor.execute(f"DELETE FROM MIGRATION_CONTROL.CHUNK_CHECKPOINTS WHERE TABLE_NAME = %s AND RUN_KEY = %s "
+                              f"AND PART_ID IN ({', '.join(['%s'] * len(partial))})", (table_name.upper(), run_key, *partial))
+        loaded = bool(rows) and not partial and all(row[3] == 'LOADED' for row in rows)
+        return parts, (rows[0][5] if rows else None), (rows[0][7] if rows else None), loaded
+    except Exception as e:
+        log_func(f"  [SF WARN] Could not read chunk checkpoints for {table_name}; exporting every part: {e}")
+        return {}, None, None, False
+
+def save_chunk_checkpoint(sf_cursor, table_name, run_key, part_id, chunk_id, blob_name, watermark_end, log_func, rows_exported=None,
+                          last_chunk=False, export_plan=None):
+    """
+    Records that one file of a part of the export plan is uploaded (`blob_name` None for a part
+    without rows); once the `last_chunk` and every file before it are in, a restarted run skips the part.
+    """
+    try:
+        watermark_str = watermark_end.strftime('%Y-%m-%d %H:%M:%S.%f') if isinstance(watermark_end, datetime.datetime) else watermark_end
+        sf_cursor.execute("""
+        MERGE INTO MIGRATION_CONTROL.CHUNK_CHECKPOINTS c
+        USING (SELECT %s AS name, %s AS run_key, %s AS part_id, %s AS chunk_id, %s::BOOLEAN AS last_chunk, %s AS blobs,
+                      %s AS watermark, %s::NUMBER AS rows_exported, %s AS export_plan) v
+        ON c.TABLE_NAME = v.name AND c.RUN_KEY = v.run_key AND c.PART_ID = v.part_id AND c.CHUNK_ID = v.chunk_id
+        WHEN MATCHED THEN UPDATE SET c.STATUS = 'UPLOADED', c.LAST_CHUNK = v.last_chunk, c.BLOB_NAMES = v.blobs,
+            c.WATERMARK_END = v.watermark, c.ROWS_EXPORTED = v.rows_exported, c.EXPORT_PLAN = v.export_plan,
+            c.UPDATED_AT = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (TABLE_NAME, RUN_KEY, PART_ID, CHUNK_ID, LAST_CHUNK, STATUS, BLOB_NAMES, WATERMARK_END,
+                                      ROWS_EXPORTED, EXPORT_PLAN)
+            VALUES (v.name, v.run_key, v.part_id, v.chunk_id, v.last_chunk, 'UPLOADED', v.blobs, v.watermark, v.rows_exported,
+                    v.export_plan);
+        """, (table_name.upper(), run_key, part_id, chunk_id, last_chunk, blob_name,
+              None if watermark_str is None else str(watermark_str), rows_exported, export_plan))
+    except Exception as e:
+        log_func(f"  [SF WARN] Could not save the checkpoint of part {part_id} file {chunk_id} for {table_name}: {e}")
+
+def mark_chunk_checkpoints_loaded(sf_cursor, table_name, log_func):
+    """
+    Records that the uploaded files of a table were loaded (the COPY or pipe confirmed them), so a
+    rerun after a later step failed neither exports nor loads them again.
+    """
+    try:
+        sf_cursor.execute("UPDATE MIGRATION_CONTROL.CHUNK_CHECKPOINTS SET STATUS = 'LOADED', UPDATED_AT = CURRENT_TIMESTAMP() "
+                          "WHERE TABLE_NAME = %s", (table_name.upper(),))
+    except Exception as e:
+        log_func(f"  [SF WARN] Could not mark the chunk checkpoints of {table_name} as loaded: {e}")
+
+def clear_chunk_checkpoints(sf_cursor, table_name, log_func):
+    """Drops a table's checkpoints once its migration is done; the next run starts a new export."""
+    try:
+        sf_cursor.execute("DELETE FROM MIGRATION_CONTROL.CHUNK_CHECKPOINTS WHERE TABLE_NAME = %s", (table_name.upper(),))
+    except Exception as e:
+        log_func(f"  [SF WARN] Could not clear chunk checkpoints for {table_name}: {e}")
 
 def load_and_merge_delta(config, sf_cursor, table_name, teradata_db_name, log_func, migration_details):
-    """Loads delta data into a transient table and merges it."""
+    """
+    Loads delta data into a transient table and merges it.
+
+    The staged rows are deduplicated by primary key, keeping the latest version by the tracking
+    column, and a matched row is only updated when the HASH of its non-key columns differs, so
+    unchanged rows do not rewrite micro-partitions. With migration_details['append_only'] the
+    MERGE is replaced by a plain INSERT of the staged rows.
+    """
     sf_db = config['SNOWFLAKE']['DATABASE']
     sf_schema = config['SNOWFLAKE']['SCHEMA']
     stage_name = config['SNOWFLAKE']['STAGE_NAME']
@@ -157,30 +500,51 @@ def load_and_merge_delta(config, sf_cursor, table_name, teradata_db_name, log_fu
         log_func(f"  [SF] Creating transient staging table: {temp_table_fqn}")
         sf_cursor.execute(f"CREATE OR REPLACE TRANSIENT TABLE {temp_table_fqn} LIKE {target_table_fqn};")
 
-        stage_path = f"@{stage_name}/{teradata_db_name.lower()}/{table_name.lower()}.csv"
-        copy_sql = f"COPY INTO {temp_table_fqn} FROM '{stage_path}' FILE_FORMAT = (FORMAT_NAME = '{file_format_name}', SKIP_HEADER = 0);"
+        stage_path = f"@{stage_name}/{teradata_db_name.lower()}/"
+        copy_sql = (f"COPY INTO {temp_table_fqn} FROM '{stage_path}' PATTERN = '(.*/)?{export_file_name_regex(table_name)}' "
+                    f"{_file_format_clause(config, file_format_name)};")
         log_func(f"  [SF] Copying delta data from stage into transient table...")
         sf_cursor.execute(copy_sql)
-        rows_copied = sf_cursor.rowcount
+        # One result row per file: rowcount would count the export's parts/chunks, not rows
+        rows_copied, failed = _copy_result_rows_loaded(sf_cursor, sf_cursor.fetchall())
+        if failed:
+            raise Exception(f"COPY INTO failed for {len(failed)} file(s), e.g. {failed[0][0]}: {failed[0][1]}")
         log_func(f"  [SF] Copied {rows_copied} rows into transient table.")
 
-        log_func(f"  [SF] Merging data into target table: {target_table_fqn}")
-
         sf_cursor.execute(f"DESC TABLE {target_table_fqn}")
         columns = [row[0] for row in sf_cursor.fetchall()]
         pk_col_upper = pk_col.upper()
-
-        update_set_clause = ", ".join([f'target."{col}" = source."{col}"' for col in columns if col.upper() != pk_col_upper])
         insert_cols_clause = ", ".join([f'"{col}"' for col in columns])
+
+        if migration_details.get('append_only'):
+            log_func(f"  [SF] Append-only table: inserting staged rows into {target_table_fqn}")
+            sf_cursor.execute(f"INSERT INTO {target_table_fqn} ({insert_cols_clause}) SELECT {insert_cols_clause} FROM {temp_table_fqn};")
+            log_func(f"  [SF] Insert complete. {sf_cursor.rowcount} rows inserted.")
+            return True, rows_copied
+
+        log_func(f"  [SF] Merging data into target table: {target_table_fqn}")
+        value_cols = [col for col in columns if col.upper() != pk_col_upper]
+        update_set_clause = ", ".join([f'target."{col}" = source."{col}"' for col in value_cols])
         insert_values_clause = ", ".join([f'source."{col}"' for col in columns])
-        if not update_set_clause:
-            update_set_clause = f'target."{pk_col}" = source."{pk_col}"'
+        if update_set_clause:
+            # HASH() treats NULLs as equal values, so a NULL -> NULL column is not seen as a change
+            target_hash = "HASH(" + ", ".join(f'target."{col}"' for col in value_cols) + ")"
+            source_hash = "HASH(" + ", ".join(f'"{col}"' for col in value_cols) + ")"
+            when_matched = f"WHEN MATCHED AND {target_hash} <> source.__ROW_HASH THEN UPDATE SET {update_set_clause}"
+        else:
+            source_hash = "0"
+            when_matched = ""  # nothing besides the key to update
+        tracking_col = migration_details.get('tracking_column')
+        latest_first = f'"{tracking_col.upper()}" DESC NULLS LAST' if tracking_col and tracking_col.upper() in columns else "1"
 
         merge_sql = f"""
         MERGE INTO {target_table_fqn} AS target
-        USING {temp_table_fqn} AS source
-        ON target."{pk_col.upper()}" = source."{pk_col.upper()}"
-        WHEN MATCHED THEN UPDATE SET {update_set_clause}
+        USING (
+            SELECT *, {source_hash} AS __ROW_HASH FROM {temp_table_fqn}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY "{pk_col_upper}" ORDER BY {latest_first}) = 1
+        ) AS source
+        ON target."{pk_col_upper}" = source."{pk_col_upper}"
+        {when_matched}
         WHEN NOT MATCHED THEN INSERT ({insert_cols_clause}) VALUES ({insert_values_clause});
         """
         sf_cursor.execute(merge_sql)
@@ -199,6 +563,174 @@ def load_and_merge_delta(config, sf_cursor, table_name, teradata_db_name, log_fu
 
 # (Keep all other functions in this file as they are)
 
+# VARIANT columns added to MIGRATION_AUDIT_LOG after its original DDL
+AUDIT_DETAIL_COLUMNS = ('STAGE_TIMINGS', 'VALIDATION_RESULT')
+
+class ControlPlaneWriter:
+    """
+    Batches a job's MIGRATION_CONTROL traffic instead of single-row statements per table.
+
+    Watermarks are read for all of a job's tables in one query (`load_watermarks`) and served
+    from memory; watermark updates and audit rows are queued and written by a background
+    thread every [MIGRATOR] CONTROL_FLUSH_SECONDS (default 10) as one multi-row MERGE per
+    table, and once more on `close()`. Audit handles are UUIDs generated client-side, so starting
+    an audit needs no round trip; the handle is written as the row's AUDIT_ID and rows are merged
+    on it, so a table retried under the same job gets a row per attempt. Failed flushes are
+    retried on the next interval.
+
+    A queued watermark is lost if the process dies before the next flush, and the rerun exports
+    from the old watermark again. MERGE loads absorb that, append-only loads would duplicate the
+    batch, so their watermark is written synchronously (`update_watermark(..., sync=True)`).
+
+    `connect` returns a (connection, cursor) pair, opened on first use.
+    """
+
+    def __init__(self, config, connect):
+        self.connect = connect
+        self.flush_interval = float(config.get('MIGRATOR', 'CONTROL_FLUSH_SECONDS', fallback=10))
+        self._lock = threading.Lock()     # guards the queues and caches
+        self._io_lock = threading.Lock()  # serializes use of the connection
+        self._conn = self._cursor = None
+        self._watermarks = {}
+        self._pending_watermarks = {}
+        self._audit_rows = {}
+        self._pending_audits = set()
+        self._detail_columns = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="control-plane-writer", daemon=True)
+        self._thread.start()
+
+    def _execute(self, sql, params=None):
+        with self._io_lock:
+            if self._cursor is None:
+                self._conn, self._cursor = self.connect()
+                if self._cursor is None:
+                    raise RuntimeError("Could not open a Snowflake connection for the control tables.")
+            self._cursor.execute(sql, params)
+            return self._cursor.fetchall() if self._cursor.description else []
+
+    def load_watermarks(self, table_names):
+        """Reads the watermarks of `table_names` in one query; tables without one cache as None."""
+        names = [t.upper() for t in table_names]
+        if not names:
+            return
+        rows = self._execute("SELECT TABLE_NAME, LAST_WATERMARK_VALUE FROM MIGRATION_CONTROL.WATERMARKS "
+                             f"WHERE TABLE_NAME IN ({', '.join(['%s'] * len(names))})", tuple(names))
+        with self._lock:
+            self._watermarks.update(dict.fromkeys(names))
+            self._watermarks.update({name: value for name, value in rows})
+
+    def get_watermark(self, table_name, log_func):
+        with self._lock:
+            if table_name.upper() in self._watermarks:
+                return self._watermarks[table_name.upper()]
+        try:
+            self.load_watermarks([table_name])
+        except Exception as e:
+            log_func(f"  [SF ERROR] Could not retrieve watermark for {table_name}: {e}")
+            return None
+        with self._lock:
+            return self._watermarks.get(table_name.upper())
+
+    def update_watermark(self, table_name, new_watermark, log_func, sync=False):
+        """
+        Queues a watermark update; with `sync` it is written before returning (with whatever else
+        is queued). Returns False only if a synchronous write failed; it stays queued for retry.
+        """
+        watermark_str = new_watermark.strftime('%Y-%m-%d %H:%M:%S.%f') if isinstance(new_watermark, datetime.datetime) else str(new_watermark)
+        with self._lock:
+            self._watermarks[table_name.upper()] = watermark_str
+            self._pending_watermarks[table_name.upper()] = watermark_str
+        if not sync:
+            log_func(f"  [SF] Queued watermark update for '{table_name}' to '{watermark_str}'")
+            return True
+        if self.flush():
+            log_func(f"  [SF] Watermark for '{table_name}' updated to '{watermark_str}'")
+            return True
+        log_func(f"  [SF ERROR] Failed to write watermark for {table_name}; it stays queued for retry.")
+        return False
+
+    def start_audit(self, job_id, table_name, migration_type):
+        audit_id = str(uuid.uuid4())
+        with self._lock:
+            self._audit_rows[audit_id] = [audit_id, job_id, table_name.upper(), migration_type,
+                                          datetime.datetime.now(datetime.timezone.utc), None, 'IN_PROGRESS', None, None, None, None]
+            self._pending_audits.add(audit_id)
+        return audit_id
+
+    def finish_audit(self, audit_id, status, rows_processed, error_message=None, stage_timings=None, validation=None):
+        with self._lock:
+            row = self._audit_rows.get(audit_id)
+            if row is None:
+                print(f"[AUDIT ERROR] Cannot finish unknown audit {audit_id}.", file=sys.stderr)
+                return
+            row[5:] = [datetime.datetime.now(datetime.timezone.utc), status, rows_processed,
+                       str(error_message)[:1000] if error_message else None,
+                       json.dumps(stage_timings) if stage_timings is not None else None,
+                       json.dumps(validation) if validation is not None else None]
+            self._pending_audits.add(audit_id)
+
+    def flush(self):
+        with self._lock:
+            watermarks, self._pending_watermarks = self._pending_watermarks, {}
+            audit_ids, self._pending_audits = self._pending_audits, set()
+            audits = [list(self._audit_rows[a]) for a in audit_ids]
+        try:
+            if watermarks:
+                self._execute(f"""
+                MERGE INTO MIGRATION_CONTROL.WATERMARKS w
+                USING (SELECT column1 AS name, column2 AS val FROM VALUES {', '.join(['(%s, %s)'] * len(watermarks))}) v
+                ON w.TABLE_NAME = v.name
+                WHEN MATCHED THEN UPDATE SET w.LAST_WATERMARK_VALUE = v.val, w.LAST_UPDATED_AT = CURRENT_TIMESTAMP()
+                WHEN NOT MATCHED THEN INSERT (TABLE_NAME, LAST_WATERMARK_VALUE) VALUES (v.name, v.val);
+                """, tuple(x for item in watermarks.items() for x in item))
+                watermarks = {}
+            if audits:
+                if not self._detail_columns:
+                    for column in AUDIT_DETAIL_COLUMNS:
+                        self._execute(f"ALTER TABLE MIGRATION_CONTROL.MIGRATION_AUDIT_LOG ADD COLUMN IF NOT EXISTS {column} VARIANT;")
+                    self._detail_columns = True
+                self._execute(f"""
+                MERGE INTO MIGRATION_CONTROL.MIGRATION_AUDIT_LOG a
+                USING (SELECT column1 AS audit_id, column2 AS job_id, column3 AS table_name, column4 AS migration_type,
+                              column5::TIMESTAMP_LTZ AS start_time, column6::TIMESTAMP_LTZ AS end_time, column7 AS status,
+                              column8::NUMBER AS rows_processed, column9::VARCHAR AS error_message,
+                              TRY_PARSE_JSON(column10::VARCHAR) AS stage_timings, TRY_PARSE_JSON(column11::VARCHAR) AS validation_result
+                       FROM VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(audits))}) v
+                ON a.AUDIT_ID = v.audit_id
+                WHEN MATCHED THEN UPDATE SET a.END_TIME = v.end_time, a.STATUS = v.status, a.ROWS_PROCESSED = v.rows_processed,
+                    a.ERROR_MESSAGE = v.error_message, a.STAGE_TIMINGS = v.stage_timings, a.VALIDATION_RESULT = v.validation_result,
+                    a.LAST_UPDATED_AT = CURRENT_TIMESTAMP()
+                WHEN NOT MATCHED THEN INSERT (AUDIT_ID, JOB_ID, TABLE_NAME, MIGRATION_TYPE, START_TIME, END_TIME, STATUS, ROWS_PROCESSED,
+                                              ERROR_MESSAGE, STAGE_TIMINGS, VALIDATION_RESULT)
+                    VALUES (v.audit_id, v.job_id, v.table_name, v.migration_type, v.start_time, v.end_time, v.status, v.rows_processed, v.error_message,
+                            v.stage_timings, v.validation_result);
+                """, tuple(x for row in audits for x in row))
+        except Exception as e:
+            print(f"[AUDIT ERROR] Failed to flush control-table updates, will retry: {e}", file=sys.stderr)
+            with self._lock:  # requeue what was not written; newer values win
+                self._pending_watermarks = {**watermarks, **self._pending_watermarks}
+                self._pending_audits |= audit_ids
+            return False
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stops the periodic flush, writes everything still queued and closes the connection."""
+        self._stop.set()
+        self._thread.join()
+        ok = self.flush()
+        with self._io_lock:
+            if self._conn is not None:
+                try: self._conn.close()
+                except Exception: pass
+            self._conn = self._cursor = None
+        return ok
+
+
 def start_audit_log(sf_cursor, job_id, table_name, migration_type, watermark_start):
     """Creates a new row in the audit table with status 'IN_PROGRESS' and returns the AUDIT_ID."""
     try:
@@ -236,8 +768,13 @@ def start_audit_log(sf_cursor, job_id, table_name, migration_type, watermark_sta
         print(f"[AUDIT ERROR] Failed to start audit log for {table_name}: {e}", file=sys.stderr)
         return None
     
-def finish_audit_log(sf_cursor, audit_id, status, rows_processed, watermark_end, error_message=None):
-    """Updates an existing audit log row with the final outcome of the migration."""
+def _ensure_audit_detail_columns(sf_cursor):
+    for column in AUDIT_DETAIL_COLUMNS:
+        sf_cursor.execute(f"ALTER TABLE MIGRATION_CONTROL.MIGRATION_AUDIT_LOG ADD COLUMN IF NOT EXISTS {column} VARIANT;")
+
+def finish_audit_log(sf_cursor, audit_id, status, rows_processed, watermark_end, error_message=None, stage_timings=None,
+                     validation=None):
+    """Updates an existing audit log row with the final outcome of the migration (and its stage spans and validation result, if given)."""
     if audit_id is None:
         print(f"[AUDIT ERROR] Cannot finish audit log because audit_id is None.", file=sys.stderr)
         return
@@ -255,6 +792,11 @@ def finish_audit_log(sf_cursor, audit_id, status, rows_processed, watermark_end,
         params = (end_time, status, rows_processed, error_msg_safe, audit_id)
         
         sf_cursor.execute(sql, params)
+        if stage_timings is not None or validation is not None:
+            _ensure_audit_detail_columns(sf_cursor)
+            sf_cursor.execute("UPDATE MIGRATION_CONTROL.MIGRATION_AUDIT_LOG SET STAGE_TIMINGS = PARSE_JSON(%s), VALIDATION_RESULT = PARSE_JSON(%s) "
+                              "WHERE AUDIT_ID = %s",
+                              (json.dumps(stage_timings), json.dumps(validation), audit_id))
     except Exception as e:
         print(f"[AUDIT ERROR] Failed to finish audit log for ID {audit_id}: {e}", file=sys.stderr)
 
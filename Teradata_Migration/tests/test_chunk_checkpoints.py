@@ -0,0 +1,139 @@
+import configparser
+import re
+import subprocess
+
+import pytest
+
+import Teradata_Migration.migrator as migrator
+import Teradata_Migration.snowflake_operations_1 as sf_ops
+
+CATALOG_ENTRY = {"columns": [("ID", "I", 4, None, None, "N"), ("NAME", "CV", 20, None, None, "Y")],
+                 "primary_index": ["ID"], "size_bytes": 3 * 1024 ** 3}
+FULL_LOAD = {"type": "Full Load (Replaces table)"}
+
+
+class CheckpointCursor:
+    """Keeps MIGRATION_CONTROL.CHUNK_CHECKPOINTS in memory, for the statements sf_ops sends."""
+
+    def __init__(self):
+        self.rows = {}
+        self.result = []
+
+    def execute(self, sql, params=None):
+        sql = sql.strip()
+        self.result = []
+        if sql.startswith("MERGE INTO MIGRATION_CONTROL.CHUNK_CHECKPOINTS"):
+            table, run_key, part_id, chunk_id, last_chunk, blob_name, watermark, rows, plan = params
+            self.rows[(table, run_key, part_id, chunk_id)] = [last_chunk, "UPLOADED", blob_name, watermark, rows, plan]
+        elif sql.startswith("SELECT PART_ID, CHUNK_ID"):
+            self.result = [(key[2], key[3], *row) for key, row in sorted(self.rows.items()) if key[:2] == params]
+        elif sql.startswith("DELETE") and "PART_ID IN" in sql:
+            table, run_key, *part_ids = params
+            self.rows = {key: row for key, row in self.rows.items() if not (key[:2] == (table, run_key) and key[2] in part_ids)}
+        elif sql.startswith("UPDATE MIGRATION_CONTROL.CHUNK_CHECKPOINTS"):
+            for key, row in self.rows.items():
+                if key[0] == params[0]:
+                    row[1] = "LOADED"
+
+    def fetchall(self):
+        return self.result
+
+
+class Container:
+    def __init__(self):
+        self.blobs = {}
+
+    def list_blobs(self, name_starts_with):
+        return [type("Blob", (), {"name": name}) for name in list(self.blobs) if name.startswith(name_starts_with)]
+
+    def delete_blob(self, name):
+        del self.blobs[name]
+
+    def upload_blob(self, name, data, overwrite, max_concurrency):
+        self.blobs[name] = data.read()
+
+
+class KeyRangeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        pass
+
+    def fetchone(self):
+        return 1, 90
+
+
+class FakeTbuild:
+    """Writes one line per ID of the part's range, failing the parts whose SELECT contains `fail`."""
+
+    def __init__(self):
+        self.selects = []
+        self.fail = None
+
+    def __call__(self, command, capture_output, text):
+        with open(command[2]) as f:
+            script = f.read()
+        select = re.search(r"SelectStmt\s+= '(.*)'", script).group(1)
+        self.selects.append(select)
+        if self.fail and self.fail in select:
+            return subprocess.CompletedProcess(command, 12, "", "")
+        low = int((re.search(r"ID >= (\d+)", select) or [0, 1])[1])
+        high = int((re.search(r"ID < (\d+)", select) or [0, 91])[1])
+        with open(re.search(r"FileName\s+= '([^']+)'", script).group(1), "w") as f:
+            f.writelines(f"{i},name{i}\n" for i in range(low, high))
+        return subprocess.CompletedProcess(command, 0, "", "")
+
+
+@pytest.fixture
+def export_env(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    container = Container()
+    client = type("Client", (), {"get_container_client": lambda self, name: container})()
+    monkeypatch.setattr(migrator.BlobServiceClient, "from_connection_string", lambda *a, **k: client, raising=False)
+    monkeypatch.setattr(migrator, "get_teradata_query_details", lambda *a, **k: (90, None))
+    monkeypatch.setattr(migrator, "get_teradata_pool", lambda config: type("Pool", (), {"connection": lambda self: KeyRangeCursor()})())
+    monkeypatch.setattr(migrator.shutil, "which", lambda name: "/usr/bin/tbuild")
+    tbuild = FakeTbuild()
+    monkeypatch.setattr(migrator.subprocess, "run", tbuild)
+    config = configparser.ConfigParser()
+    config.read_dict({"TERADATA": {"HOST": "td", "USER": "u", "PASS": "p"}, "AZURE": {"CONN_STR": "cs", "CONTAINER": "c"},
+                      "MIGRATOR": {"EXPORT_PARTITION_GB": "1"}})
+    return config, container, tbuild
+
+
+def export(config, sf_cursor):
+    return migrator.run_teradata_to_azure_tpt(config, "ORDERS", "SALES", lambda message: None, FULL_LOAD,
+                                              catalog_entry=CATALOG_ENTRY, sf_cursor=sf_cursor)
+
+
+def test_rerun_after_a_failed_part_exports_only_that_part(export_env):
+    config, container, tbuild = export_env
+    checkpoints = CheckpointCursor()
+
+    tbuild.fail = "ID >= 31 AND ID < 61"
+    assert export(config, checkpoints) == (False, None, 0, False)
+    assert sorted(container.blobs) == ["sales/orders_part0000.csv.gz", "sales/orders_part0002.csv.gz"]
+    assert sorted(key[2] for key in checkpoints.rows) == [0, 2]
+
+    tbuild.fail, tbuild.selects = None, []
+    assert export(config, checkpoints) == (True, None, 90, False)
+    assert tbuild.selects == ["SELECT * FROM SALES.ORDERS WHERE ID >= 31 AND ID < 61;"]
+    assert sorted(container.blobs) == [f"sales/orders_part{k:04d}.csv.gz" for k in range(3)]
+
+
+def test_confirmed_load_is_neither_exported_nor_loaded_again(export_env):
+    config, container, tbuild = export_env
+    checkpoints = CheckpointCursor()
+    assert export(config, checkpoints) == (True, None, 90, False)
+    sf_ops.mark_chunk_checkpoints_loaded(checkpoints, "ORDERS", lambda message: None)
+
+    tbuild.selects = []
+    assert export(config, checkpoints) == (True, None, 90, True)
+    assert tbuild.selects == []